@@ -0,0 +1,6 @@
+import asyncio
+
+from nyt_crossword_solver.solve import main
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,18 +1,77 @@
+import contextlib
+import functools
+import time
+from typing import AsyncGenerator, AsyncIterator, Callable, Literal, Sequence
+
 from autogen_agentchat.agents import AssistantAgent
-from autogen_ext.models.openai import OpenAIChatCompletionClient
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage
+from autogen_core import CancellationToken
 from pydantic import BaseModel
 
+from nyt_crossword_solver.clients import get_client, register_client
+from nyt_crossword_solver.scheduler import ScheduledChatCompletionClient
 from nyt_crossword_solver.tools import answer_len, ask_oracle, get_nth_character
+from nyt_crossword_solver.tracing import get_metrics, get_tracer
+
+AGENT_MODEL = "gpt-4o"
+MAX_IDLE_AGENTS = 64  # Per kind of agent. More agents than this are only needed in bursts and are dropped after use.
+KEEPALIVE_SECONDS = 60.0  # Long enough to keep the connections open while the search runs between model calls.
+
+
+def _make_http_client():
+    """Create the HTTP client shared by the OpenAI clients of all agents, so that they reuse one pool of
+    keep-alive connections."""
+    import httpx
+    from openai import DefaultAsyncHttpxClient
+
+    return DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=1000, max_keepalive_connections=100, keepalive_expiry=KEEPALIVE_SECONDS)
+    )
+
+
+register_client("openai_http", _make_http_client)
+
+
+def _make_model_client(name: str, response_format: type[BaseModel]) -> ScheduledChatCompletionClient:
+    """Create the scheduled OpenAI client of an agent.
+
+    Args:
+        name (str): The name of the agent.
+        response_format (type[BaseModel]): The structured output format of the agent.
+
+    Returns:
+        ScheduledChatCompletionClient: The client.
+    """
+    # Imported here since the OpenAI SDK is slow to import and only needed once a model is called.
+    from autogen_ext.models.openai import OpenAIChatCompletionClient
+
+    client = OpenAIChatCompletionClient(
+        model=AGENT_MODEL, response_format=response_format, http_client=get_client("openai_http")
+    )
+    return ScheduledChatCompletionClient(client, model=AGENT_MODEL, name=name)
+
+
+class TracedAssistantAgent(AssistantAgent):
+    """Assistant agent that records a span and a latency metric for each run."""
+
+    async def on_messages_stream(
+        self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken
+    ) -> AsyncGenerator[BaseAgentEvent | BaseChatMessage | Response, None]:
+        start = time.perf_counter()
+        async for message in super().on_messages_stream(messages, cancellation_token):
+            if isinstance(message, Response):
+                # Callers may stop iterating at the response, so the run is recorded before it is handed over.
+                get_tracer().record("agent", start, agent=self.name)
+                get_metrics().observe("agent_run_seconds", time.perf_counter() - start, agent=self.name)
+            yield message
 
 
 class ContextFormat(BaseModel):
     context: str
 
 
-context_model_client = OpenAIChatCompletionClient(
-    model="gpt-4o",
-    response_format=ContextFormat,
-)
+register_client("context", functools.partial(_make_model_client, "context", ContextFormat))
 context_system_prompt = (
     """Analyze the clue and using the `ask_oracle` tool, generate a summary of relevant context that can be used """
     """to answer a crossword clue. Make sure to provide information that is very current or is unlikely to be """
@@ -23,28 +82,33 @@ context_system_prompt = (
 
 def context_agent_factory():
     """Create a context agent."""
-    return AssistantAgent(
+    return TracedAssistantAgent(
         name="context",
-        model_client=context_model_client,
+        model_client=get_client("context"),
         tools=[ask_oracle],
         system_message=context_system_prompt,
         reflect_on_tool_use=True,
     )
 
 
+class CandidateFormat(BaseModel):
+    answer: str
+    confidence: float
+
+
 class CandidatesGeneratorFormat(BaseModel):
-    candidates: list[str]
+    candidates: list[CandidateFormat]
 
 
-candidates_generator_model_client = OpenAIChatCompletionClient(
-    model="gpt-4o",
-    response_format=CandidatesGeneratorFormat,
+register_client(
+    "candidates_generator", functools.partial(_make_model_client, "candidates_generator", CandidatesGeneratorFormat)
 )
 candidates_generator_system_prompt = (
     """Generate a list of candidate answers for the crossword clue of given length. If the clue ends in a question """
     """mark, it's  tricky clue that needs out-of-the-box thinking to answer, such as interpreting a word(s) in the """
     """clue literally. Replace any accented characters with their unaccented equivalents (e.g., e instead of é)."""
-    """Answer may contain multiple words."""
+    """Answer may contain multiple words. For each candidate, give your confidence between 0 and 1 that it is the """
+    """answer."""
     """Available tools:\n"""
     """`answer_len`: Determine the length of a candidate answer. If the output of this tool does not match the """
     """given length, try to generate other more appropriate candidates and filter out the candidates with """
@@ -55,23 +119,53 @@ candidates_generator_system_prompt = (
 
 def candidates_generator_factory():
     """Create a candidates generator agent."""
-    return AssistantAgent(
+    return TracedAssistantAgent(
         name="candidates_generator",
-        model_client=candidates_generator_model_client,
+        model_client=get_client("candidates_generator"),
         tools=[answer_len, get_nth_character],
         system_message=candidates_generator_system_prompt,
         reflect_on_tool_use=True,
     )
 
 
+class ClueCandidatesFormat(BaseModel):
+    id: str
+    candidates: list[CandidateFormat]
+
+
+class BatchCandidatesGeneratorFormat(BaseModel):
+    # A list keyed by the id of each clue, since structured outputs do not allow objects with arbitrary keys.
+    clues: list[ClueCandidatesFormat]
+
+
+register_client(
+    "batch_candidates_generator",
+    functools.partial(_make_model_client, "batch_candidates_generator", BatchCandidatesGeneratorFormat),
+)
+batch_candidates_generator_system_prompt = (
+    """Generate a list of candidate answers for each of the numbered crossword clues, whose answers have the given """
+    """lengths. If a clue ends in a question mark, it's  tricky clue that needs out-of-the-box thinking to answer, """
+    """such as interpreting a word(s) in the clue literally. Replace any accented characters with their unaccented """
+    """equivalents (e.g., e instead of é). Answers may contain multiple words, and only their letters count """
+    """towards the length. For each candidate, give your confidence between 0 and 1 that it is the answer. Return """
+    """the candidates of every clue under the number of the clue as its id."""
+)
+
+
+def batch_candidates_generator_factory():
+    """Create a candidates generator agent that answers several clues in a single call, without tools."""
+    return TracedAssistantAgent(
+        name="batch_candidates_generator",
+        model_client=get_client("batch_candidates_generator"),
+        system_message=batch_candidates_generator_system_prompt,
+    )
+
+
 class CorrectnessFormat(BaseModel):
     is_correct: bool
 
 
-correctness_model_client = OpenAIChatCompletionClient(
-    model="gpt-4o",
-    response_format=CorrectnessFormat,
-)
+register_client("correctness", functools.partial(_make_model_client, "correctness", CorrectnessFormat))
 correctness_system_prompt = (
     """Determine if the candidate answer to a crossword clue is likely to be correct. If the clue ends in a """
     """question  mark, it's  tricky clue that needs out-of-the-box thinking to answer, such as interpreting a """
@@ -81,8 +175,95 @@ correctness_system_prompt = (
 
 def correctness_agent_factory():
     """Create a correctness agent."""
-    return AssistantAgent(
+    return TracedAssistantAgent(
         name="correctness",
-        model_client=correctness_model_client,
+        model_client=get_client("correctness"),
         system_message=correctness_system_prompt,
     )
+
+
+class ExtractedClueFormat(BaseModel):
+    orientation: Literal["across", "down"]
+    number: int
+    clue: str
+
+
+class ExtractedCluesFormat(BaseModel):
+    clues: list[ExtractedClueFormat]
+
+
+register_client("clue_extractor", functools.partial(_make_model_client, "clue_extractor", ExtractedCluesFormat))
+clue_extractor_system_prompt = (
+    """Transcribe the clues shown in the image of a crossword puzzle. For every clue, give its orientation (across """
+    """or down), the number printed before it and its text without the number. The numbers of the clues to """
+    """transcribe are listed in the message; transcribe exactly these clues."""
+)
+
+
+def clue_extractor_factory():
+    """Create an agent that reads the clues from an image of a crossword puzzle."""
+    return TracedAssistantAgent(
+        name="clue_extractor",
+        model_client=get_client("clue_extractor"),
+        system_message=clue_extractor_system_prompt,
+    )
+
+
+class AgentPool:
+    """Pool of agents of one kind, reused across tasks instead of being created for every clue.
+
+    An agent is reset when it is released, so every task starts from an empty conversation. Agents keep the model
+    client they were created with, so the pool must be cleared after replacing that client with `set_client`.
+
+    Args:
+        factory (Callable[[], AssistantAgent]): Creates a new agent when no idle one is left.
+        max_idle (int, optional): The maximum number of idle agents kept. Defaults to `MAX_IDLE_AGENTS`.
+    """
+
+    def __init__(self, factory: Callable[[], AssistantAgent], max_idle: int = MAX_IDLE_AGENTS):
+        self.factory = factory
+        self.max_idle = max_idle
+        self.created = 0
+        self._idle: list[AssistantAgent] = []
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[AssistantAgent]:
+        """Borrow an agent for one task.
+
+        Yields:
+            AssistantAgent: An agent with an empty conversation.
+        """
+        if self._idle:
+            agent = self._idle.pop()
+        else:
+            agent = self.factory()
+            self.created += 1
+        try:
+            yield agent
+        finally:
+            await agent.on_reset(CancellationToken())
+            if len(self._idle) < self.max_idle:
+                self._idle.append(agent)
+
+    def clear(self):
+        """Drop the idle agents."""
+        self._idle.clear()
+
+
+context_agents = AgentPool(context_agent_factory)
+candidates_generators = AgentPool(candidates_generator_factory)
+batch_candidates_generators = AgentPool(batch_candidates_generator_factory)
+correctness_agents = AgentPool(correctness_agent_factory)
+clue_extractors = AgentPool(clue_extractor_factory)
+
+
+def clear_agent_pools():
+    """Drop the idle agents of all pools, e.g. after replacing their model clients."""
+    for pool in (
+        context_agents,
+        candidates_generators,
+        batch_candidates_generators,
+        correctness_agents,
+        clue_extractors,
+    ):
+        pool.clear()
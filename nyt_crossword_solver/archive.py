@@ -0,0 +1,316 @@
+import argparse
+import gc
+import glob
+import json
+import math
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from nyt_crossword_solver.crossword import MiniCrossword
+
+MANIFEST_FILE = "archive.json"
+FORMAT_VERSION = 1
+LOAD_CHUNK_SIZE = 1024  # Puzzles decoded at once when iterating over an archive.
+STRING_COLUMNS = ("ids", "grids", "clues", "answers")
+ARRAY_COLUMNS = (
+    "grid_widths",
+    "clue_offsets",
+    "num_across",
+    "clue_positions",
+    "clue_lengths",
+    "clue_scores",
+    "has_answer",
+)
+# Every string column is stored as its concatenated UTF-8 bytes and the offsets of its strings.
+COLUMNS = ARRAY_COLUMNS + tuple(f"{column}_{part}" for column in STRING_COLUMNS for part in ("data", "offsets"))
+
+
+def find_puzzles(inputs: list[str]) -> list[Path]:
+    """Find the puzzle files given as paths, directories or glob patterns.
+
+    Args:
+        inputs (list[str]): The puzzle JSON files, directories containing them or glob patterns.
+
+    Returns:
+        list[Path]: The sorted puzzle paths, without duplicates.
+    """
+    paths = set()
+    for pattern in inputs:
+        path = Path(pattern)
+        if path.is_dir():
+            paths.update(path.glob("*.json"))
+        elif path.is_file():
+            paths.add(path)
+        else:
+            paths.update(Path(match) for match in glob.glob(pattern, recursive=True))
+    return sorted(paths)
+
+
+def read_puzzles(paths: Iterable[Path]) -> Iterator[tuple[str, MiniCrossword]]:
+    """Read puzzles in the JSON schema of `MiniCrossword`, validating them.
+
+    Args:
+        paths (Iterable[Path]): Puzzle JSON files, whose id is their file name without extension, or JSONL results
+            files written by `batch.py`, whose solved puzzles keep the id of their record.
+
+    Yields:
+        tuple[str, MiniCrossword]: The id and the crossword of every puzzle. Failed results are skipped.
+    """
+    for path in paths:
+        with open(path) as f:
+            if path.suffix == ".jsonl":
+                for line in f:
+                    record = json.loads(line)
+                    if record.get("solution") is not None:
+                        yield record["puzzle"], MiniCrossword(**record["solution"])
+            else:
+                yield path.stem, MiniCrossword(**json.load(f))
+
+
+def _pack_strings(strings: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Concatenate strings into UTF-8 bytes, with the offsets of every string and the end."""
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(data) for data in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class PuzzleArchive:
+    """Columnar archive of crosswords, with random access by puzzle id.
+
+    Puzzles and solutions are stored in flat arrays: the grids and the clue texts and answers as concatenated UTF-8
+    bytes with offsets, and the positions, lengths and consistency scores of all clues as one array each, with the
+    offsets of the clues of every puzzle. The arrays are stored as `.npy` files in a directory and memory-mapped when
+    loaded, so opening an archive is instant and a lookup only reads the pages of the puzzle. Loading skips parsing
+    JSON and builds the crosswords from values of the right types.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        with open(self.directory / MANIFEST_FILE) as f:
+            manifest = json.load(f)
+        if manifest["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported puzzle archive version {manifest['version']} in {self.directory}.")
+        self.num_puzzles = manifest["num_puzzles"]
+        self._arrays = {name: np.load(self.directory / f"{name}.npy", mmap_mode="r") for name in COLUMNS}
+        self._index: Optional[dict[str, int]] = None
+
+    @classmethod
+    def build(cls, puzzles: Iterable[tuple[str, MiniCrossword]], directory: Path) -> "PuzzleArchive":
+        """Build an archive of puzzles and save it to a directory, replacing any archive in it.
+
+        Args:
+            puzzles (Iterable[tuple[str, MiniCrossword]]): The id and the crossword of every puzzle. Later puzzles
+                replace earlier ones with the same id.
+            directory (Path): The directory to save the archive to.
+
+        Returns:
+            PuzzleArchive: The loaded archive.
+        """
+        puzzles = dict(puzzles)
+        grids, grid_widths, num_across, clue_offsets = [], [], [], [0]
+        clues = [clue for crossword in puzzles.values() for clue in crossword.across + crossword.down]
+        for crossword in puzzles.values():
+            grids.append("".join(crossword.grid))
+            grid_widths.append(len(crossword.grid[0]) if crossword.grid else 0)
+            num_across.append(len(crossword.across))
+            clue_offsets.append(clue_offsets[-1] + len(crossword.across) + len(crossword.down))
+
+        columns = {
+            "grid_widths": np.array(grid_widths, dtype=np.int32),
+            "clue_offsets": np.array(clue_offsets, dtype=np.int64),
+            "num_across": np.array(num_across, dtype=np.int32),
+            "clue_positions": np.array([clue.position for clue in clues], dtype=np.int32).reshape(len(clues), 2),
+            "clue_lengths": np.array([clue.length for clue in clues], dtype=np.int32),
+            "clue_scores": np.array(
+                [math.nan if clue.consistency_score is None else clue.consistency_score for clue in clues], dtype=float
+            ),
+            "has_answer": np.array([clue.answer is not None for clue in clues], dtype=bool),
+        }
+        strings = {
+            "ids": list(puzzles),
+            "grids": grids,
+            "clues": [clue.clue for clue in clues],
+            "answers": [clue.answer or "" for clue in clues],
+        }
+        for column, values in strings.items():
+            columns[f"{column}_data"], columns[f"{column}_offsets"] = _pack_strings(values)
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, array in columns.items():
+            np.save(directory / f"{name}.npy", array)
+        with open(directory / MANIFEST_FILE, "w") as f:
+            json.dump({"version": FORMAT_VERSION, "num_puzzles": len(puzzles), "num_clues": len(clues)}, f)
+        return cls(directory)
+
+    def _strings(self, column: str, start: int, stop: int) -> list[str]:
+        """Decode the strings of a column from index `start` up to `stop` at once."""
+        offsets = np.array(self._arrays[f"{column}_offsets"][start : stop + 1])
+        data = self._arrays[f"{column}_data"][offsets[0] : offsets[-1]].tobytes()
+        offsets -= offsets[0]
+        return [data[begin:end].decode("utf-8") for begin, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    @property
+    def ids(self) -> list[str]:
+        """The ids of the puzzles, in the order they were added."""
+        return self._strings("ids", 0, self.num_puzzles)
+
+    def index(self, puzzle_id: str) -> int:
+        """Get the position of a puzzle in the archive.
+
+        Args:
+            puzzle_id (str): The id of the puzzle.
+
+        Returns:
+            int: The position of the puzzle.
+        """
+        if self._index is None:
+            self._index = {puzzle_id: i for i, puzzle_id in enumerate(self.ids)}
+        if puzzle_id not in self._index:
+            raise KeyError(f"No puzzle with id {puzzle_id!r} in the archive {self.directory}.")
+        return self._index[puzzle_id]
+
+    def load_range(self, start: int, stop: int) -> list[MiniCrossword]:
+        """Load the puzzles from position `start` up to `stop`, decoding every column once for all of them.
+
+        The columns already hold values of the right types, so every puzzle is checked by a single `model_validate`
+        call on plain values, which with pydantic 2 is several times faster than `model_construct` of every clue. The
+        garbage collector is paused meanwhile, since the many new objects would trigger full collections that take
+        longer than loading and cannot free anything.
+
+        Args:
+            start (int): The position of the first puzzle.
+            stop (int): The position after the last puzzle.
+
+        Returns:
+            list[MiniCrossword]: The crosswords, with the answers and consistency scores they were archived with.
+        """
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            arrays = self._arrays
+            clue_offsets = arrays["clue_offsets"][start : stop + 1].tolist()
+            first, last = clue_offsets[0], clue_offsets[-1]
+            grids = self._strings("grids", start, stop)
+            widths = arrays["grid_widths"][start:stop].tolist()
+            num_across = arrays["num_across"][start:stop].tolist()
+            positions = arrays["clue_positions"][first:last].tolist()
+            lengths = arrays["clue_lengths"][first:last].tolist()
+            scores = arrays["clue_scores"][first:last].tolist()
+            has_answer = arrays["has_answer"][first:last].tolist()
+            texts = self._strings("clues", first, last)
+            answers = self._strings("answers", first, last)
+            clues = [
+                {
+                    "position": position,
+                    "clue": text,
+                    "length": length,
+                    "answer": answer if answered else None,
+                    "consistency_score": None if math.isnan(score) else score,
+                }
+                for position, text, length, answer, answered, score in zip(
+                    positions, texts, lengths, answers, has_answer, scores
+                )
+            ]
+            crosswords = []
+            for i, (grid, width) in enumerate(zip(grids, widths)):
+                puzzle_clues = clues[clue_offsets[i] - first : clue_offsets[i + 1] - first]
+                crossword = {
+                    "grid": [grid[row : row + width] for row in range(0, len(grid), width)] if width else [],
+                    "across": puzzle_clues[: num_across[i]],
+                    "down": puzzle_clues[num_across[i] :],
+                }
+                crosswords.append(MiniCrossword.model_validate(crossword))
+        finally:
+            if collecting:
+                gc.enable()
+        return crosswords
+
+    def load(self, i: int) -> MiniCrossword:
+        """Load the puzzle at a position of the archive.
+
+        Args:
+            i (int): The position of the puzzle.
+
+        Returns:
+            MiniCrossword: The crossword, with the answers and consistency scores it was archived with.
+        """
+        return self.load_range(i, i + 1)[0]
+
+    def __getitem__(self, puzzle_id: str) -> MiniCrossword:
+        return self.load(self.index(puzzle_id))
+
+    def __contains__(self, puzzle_id: str) -> bool:
+        try:
+            self.index(puzzle_id)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return self.num_puzzles
+
+    def items(self) -> Iterator[tuple[str, MiniCrossword]]:
+        """Iterate over the id and the crossword of every puzzle, in the order they were added."""
+        ids = self.ids
+        for start in range(0, self.num_puzzles, LOAD_CHUNK_SIZE):
+            yield from zip(ids[start:], self.load_range(start, min(start + LOAD_CHUNK_SIZE, self.num_puzzles)))
+
+    def export_json(self, directory: Path, ids: Optional[list[str]] = None) -> list[Path]:
+        """Write puzzles to JSON files named after their id, in the schema of `MiniCrossword`.
+
+        Args:
+            directory (Path): The directory to write the files to.
+            ids (Optional[list[str]], optional): The ids of the puzzles to export. Defaults to None, in which case all
+                puzzles are exported.
+
+        Returns:
+            list[Path]: The paths of the written files.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for puzzle_id in self.ids if ids is None else ids:
+            path = directory / f"{puzzle_id}.json"
+            with open(path, "w") as f:
+                json.dump(self[puzzle_id].model_dump(), f, indent=4)
+            paths.append(path)
+        return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between puzzle JSON files and a puzzle archive.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build an archive from puzzle JSON files and batch results.")
+    build_parser.add_argument(
+        "inputs",
+        type=str,
+        nargs="+",
+        help="The puzzle JSON files, directories containing them, glob patterns or JSONL results of batch.py.",
+    )
+    build_parser.add_argument("archive_dir", type=str, help="The directory to save the archive to.")
+    export_parser = subparsers.add_parser("export", help="Export the puzzles of an archive to JSON files.")
+    export_parser.add_argument("archive_dir", type=str, help="The directory of the archive.")
+    export_parser.add_argument("output_dir", type=str, help="The directory to write the JSON files to.")
+    export_parser.add_argument(
+        "--ids", type=str, nargs="*", default=None, help="The ids of the puzzles to export. Defaults to all."
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        paths = find_puzzles(args.inputs)
+        if not paths:
+            parser.error("No puzzles found.")
+        archive = PuzzleArchive.build(read_puzzles(paths), Path(args.archive_dir))
+        print(f"Archived {len(archive)} puzzles in {args.archive_dir}.")
+    else:
+        paths = PuzzleArchive(Path(args.archive_dir)).export_json(Path(args.output_dir), ids=args.ids)
+        print(f"Exported {len(paths)} puzzles to {args.output_dir}.")
+
+
+if __name__ == "__main__":
+    main()
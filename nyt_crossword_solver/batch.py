@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+
+from tqdm import tqdm
+
+from nyt_crossword_solver.archive import PuzzleArchive, find_puzzles
+from nyt_crossword_solver.cache import CandidateCache
+from nyt_crossword_solver.candidates import MAX_CANDIDATES
+from nyt_crossword_solver.crossword import MiniCrossword
+from nyt_crossword_solver.lexicon import Lexicon
+from nyt_crossword_solver.solve import add_solver_arguments, solve_crossword
+from nyt_crossword_solver.tracing import Tracer, get_metrics, get_tracer, set_tracer
+
+
+async def solve_puzzle(
+    path: Path | str,
+    max_improvements: int,
+    semaphore: asyncio.Semaphore,
+    cache: CandidateCache = None,
+    max_in_flight: int = None,
+    search_time_limit: float = None,
+    executor: Executor = None,
+    lexicon: Lexicon = None,
+    beam_width: int = None,
+    confidence_weight: float = 1.0,
+    top_k: int = 1,
+    batch_clues: int = None,
+    neighborhood_size: int = None,
+    improvements_per_round: int = 1,
+    search_workers: int = None,
+    max_candidates: int = MAX_CANDIDATES,
+    archive: PuzzleArchive = None,
+) -> dict:
+    """Solve a puzzle file, catching errors so that one failure does not stop the batch.
+
+    Args:
+        path (Path | str): The path to the crossword puzzle JSON file, or the id of the puzzle in `archive`.
+        max_improvements (int): The maximum number of improvements to make.
+        semaphore (asyncio.Semaphore): Limits the number of puzzles solved at once.
+        cache (CandidateCache, optional): The cache to look up and store candidates in. Defaults to None.
+        max_in_flight (int, optional): The maximum number of clues of the puzzle queried for candidates at once.
+            Defaults to None, for no limit.
+        search_time_limit (float, optional): The maximum time in seconds to spend searching for the best solution in
+            each improvement step. Defaults to None.
+        executor (Executor, optional): The executor to run the search in. Defaults to None.
+        lexicon (Lexicon, optional): The lexicon used to check and fill answers. Defaults to None.
+        beam_width (int, optional): If given, use a beam search of this width instead of the exact search.
+            Defaults to None.
+        confidence_weight (float, optional): The weight of candidate confidences in the beam search. Defaults to 1.0.
+        top_k (int, optional): The number of best grids kept by the beam search. Defaults to 1.
+        batch_clues (int, optional): If given, ask for the initial candidates of up to this many clues in a single
+            request. Defaults to None.
+        neighborhood_size (int, optional): If given, use a neighborhood search that re-solves this many crossing clues
+            at a time. Defaults to None, in which case large puzzles use the default size.
+        improvements_per_round (int, optional): The number of clues improved concurrently in each improvement step.
+            Defaults to 1.
+        search_workers (int, optional): If given, split each search across this many of the search processes.
+            Defaults to None.
+        max_candidates (int, optional): The maximum number of candidates kept per clue. Defaults to `MAX_CANDIDATES`.
+        archive (PuzzleArchive, optional): If given, load the puzzle from this archive. Defaults to None.
+
+    Returns:
+        dict: The result record of the puzzle, with its solution, score, the other grids kept by the beam search and
+            timings in seconds, or the error.
+    """
+    if archive is None:
+        result = {"puzzle": Path(path).stem, "path": str(path)}
+    else:
+        result = {"puzzle": path, "path": str(archive.directory)}
+    timings = {}
+    last_solution = {}
+
+    def listen(event: dict):
+        if event["event"] == "solution":
+            last_solution.update(event)
+
+    async with semaphore:
+        start = time.perf_counter()
+        with get_tracer().span("puzzle", puzzle=result["puzzle"]) as span:
+            try:
+                if archive is None:
+                    with open(path) as f:
+                        crossword = MiniCrossword(**json.load(f))
+                else:
+                    crossword = archive[path]
+                solved = await solve_crossword(
+                    crossword,
+                    max_improvements,
+                    cache=cache,
+                    max_in_flight=max_in_flight,
+                    search_time_limit=search_time_limit,
+                    executor=executor,
+                    timings=timings,
+                    lexicon=lexicon,
+                    beam_width=beam_width,
+                    confidence_weight=confidence_weight,
+                    top_k=top_k,
+                    batch_clues=batch_clues,
+                    neighborhood_size=neighborhood_size,
+                    improvements_per_round=improvements_per_round,
+                    search_workers=search_workers,
+                    max_candidates=max_candidates,
+                    listener=listen,
+                )
+                result["solution"] = solved.model_dump()
+                result["score"] = sum(clue.consistency_score for clue in solved.across + solved.down)
+                result["alternatives"] = last_solution.get("alternatives", [])
+                result["error"] = None
+            except Exception as error:
+                result["solution"] = None
+                result["score"] = None
+                result["alternatives"] = []
+                result["error"] = "".join(traceback.format_exception_only(error)).strip()
+                span.set(error=type(error).__name__)
+        timings["total"] = time.perf_counter() - start
+        get_metrics().increment("puzzles_total", outcome="failed" if result["error"] else "solved")
+    result["timings"] = timings
+    return result
+
+
+async def solve_batch(
+    paths: list[Path | str],
+    output_path: Path,
+    max_improvements: int,
+    max_concurrency: int = 4,
+    workers: int = None,
+    cache: CandidateCache = None,
+    max_in_flight: int = None,
+    search_time_limit: float = None,
+    lexicon: Lexicon = None,
+    beam_width: int = None,
+    confidence_weight: float = 1.0,
+    top_k: int = 1,
+    batch_clues: int = None,
+    neighborhood_size: int = None,
+    improvements_per_round: int = 1,
+    search_workers: int = None,
+    max_candidates: int = MAX_CANDIDATES,
+    archive: PuzzleArchive = None,
+) -> int:
+    """Solve many puzzles concurrently on one event loop, writing a JSONL record per puzzle as it finishes.
+
+    Model clients, agents and the rate limits of the shared scheduler are set up once for the whole batch, and the
+    CPU-bound search runs in a process pool so that it does not block the model calls of other puzzles.
+
+    Args:
+        paths (list[Path | str]): The paths to the crossword puzzle JSON files, or the ids of the puzzles in
+            `archive`.
+        output_path (Path): The path to the JSONL results file.
+        max_improvements (int): The maximum number of improvements to make per puzzle.
+        max_concurrency (int, optional): The maximum number of puzzles solved at once. Defaults to 4.
+        workers (int, optional): The number of search processes. Defaults to the number of CPUs.
+        cache (CandidateCache, optional): The cache to look up and store candidates in. Defaults to None.
+        max_in_flight (int, optional): The maximum number of clues per puzzle queried for candidates at once.
+            Defaults to None, for no limit.
+        search_time_limit (float, optional): The maximum time in seconds to spend searching for the best solution in
+            each improvement step. Defaults to None.
+        lexicon (Lexicon, optional): The lexicon used to check and fill answers. Defaults to None.
+        beam_width (int, optional): If given, use a beam search of this width instead of the exact search.
+            Defaults to None.
+        confidence_weight (float, optional): The weight of candidate confidences in the beam search. Defaults to 1.0.
+        top_k (int, optional): The number of best grids kept by the beam search. Defaults to 1.
+        batch_clues (int, optional): If given, ask for the initial candidates of up to this many clues in a single
+            request. Defaults to None.
+        neighborhood_size (int, optional): If given, use a neighborhood search that re-solves this many crossing clues
+            at a time. Defaults to None, in which case large puzzles use the default size.
+        improvements_per_round (int, optional): The number of clues improved concurrently in each improvement step.
+            Defaults to 1.
+        search_workers (int, optional): If given, split each search across this many of the search processes.
+            Defaults to None.
+        max_candidates (int, optional): The maximum number of candidates kept per clue. Defaults to `MAX_CANDIDATES`.
+        archive (PuzzleArchive, optional): If given, load the puzzles from this archive. Defaults to None.
+
+    Returns:
+        int: The number of puzzles that failed.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    num_failed = 0
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # Worker processes are spawned so that they do not inherit the event loop and open clients of this process.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        tasks = [
+            solve_puzzle(
+                path,
+                max_improvements,
+                semaphore,
+                cache=cache,
+                max_in_flight=max_in_flight,
+                search_time_limit=search_time_limit,
+                executor=executor,
+                lexicon=lexicon,
+                beam_width=beam_width,
+                confidence_weight=confidence_weight,
+                top_k=top_k,
+                batch_clues=batch_clues,
+                neighborhood_size=neighborhood_size,
+                improvements_per_round=improvements_per_round,
+                search_workers=search_workers,
+                max_candidates=max_candidates,
+                archive=archive,
+            )
+            for path in paths
+        ]
+        with open(output_path, "w") as f:
+            for task in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Solving puzzles"):
+                result = await task
+                num_failed += result["error"] is not None
+                f.write(json.dumps(result) + "\n")
+                f.flush()
+    return num_failed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Solve a batch of crossword puzzles.")
+    parser.add_argument(
+        "inputs",
+        type=str,
+        nargs="*",
+        help="The puzzle JSON files, directories containing them or glob patterns, or puzzle ids with --archive.",
+    )
+    parser.add_argument(
+        "--archive",
+        type=str,
+        default=None,
+        help="Solve puzzles from this puzzle archive, all of them unless their ids are given as inputs.",
+    )
+    parser.add_argument("--output", type=str, default="results.jsonl", help="The path to the JSONL results file.")
+    parser.add_argument(
+        "--max_improvements", type=int, default=10, help="The maximum number of improvements to make per puzzle."
+    )
+    parser.add_argument("--max_concurrency", type=int, default=4, help="The maximum number of puzzles solved at once.")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="The number of search processes. Defaults to the number of CPUs."
+    )
+    add_solver_arguments(parser)
+
+    args = parser.parse_args()
+
+    archive = None
+    if args.archive is not None:
+        archive = PuzzleArchive(Path(args.archive))
+        paths = args.inputs or archive.ids
+    else:
+        paths = find_puzzles(args.inputs)
+    if not paths:
+        parser.error("No puzzles found.")
+    cache = None if args.no_cache else CandidateCache(args.cache_dir, ttl=args.cache_ttl, offline=args.offline)
+    lexicon = None if args.lexicon is None else Lexicon(args.lexicon)
+    if args.trace is not None:
+        set_tracer(Tracer())
+
+    num_failed = await solve_batch(
+        paths,
+        Path(args.output),
+        args.max_improvements,
+        max_concurrency=args.max_concurrency,
+        workers=args.workers,
+        cache=cache,
+        max_in_flight=args.max_in_flight,
+        search_time_limit=args.search_time_limit,
+        lexicon=lexicon,
+        beam_width=args.beam_width,
+        confidence_weight=args.confidence_weight,
+        top_k=args.top_k,
+        batch_clues=args.batch_clues,
+        neighborhood_size=args.neighborhood_size,
+        improvements_per_round=args.improvements_per_round,
+        search_workers=args.search_workers,
+        max_candidates=args.max_candidates,
+        archive=archive,
+    )
+    print(f"Solved {len(paths) - num_failed} of {len(paths)} puzzles. Results written to {args.output}.")
+    if cache is not None:
+        print(f"Candidate cache: {cache.hits} hits, {cache.misses} misses.")
+    if args.trace is not None:
+        get_tracer().dump(args.trace, metrics=get_metrics())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
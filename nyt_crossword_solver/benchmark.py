@@ -0,0 +1,735 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import random
+import re
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator, Callable, Optional, Sequence
+
+from autogen_core import FunctionCall
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    ModelInfo,
+    RequestUsage,
+)
+from pydantic import BaseModel
+
+from nyt_crossword_solver import agents, tools
+from nyt_crossword_solver.cache import CandidateCache
+from nyt_crossword_solver.clients import reset_clients, set_client
+from nyt_crossword_solver.crossword import (
+    Clue,
+    MiniCrossword,
+    consistency_score,
+    get_clue_slots,
+    get_spanning_cells,
+    score_assignment,
+)
+from nyt_crossword_solver.scheduler import (
+    PRIORITY_IMPROVEMENT,
+    ModelScheduler,
+    ScheduledChatCompletionClient,
+    get_request_priority,
+    get_scheduler,
+    set_scheduler,
+)
+from nyt_crossword_solver.search import PARTS_PER_WORKER, CrosswordSearch, parallel_search
+from nyt_crossword_solver.solve import solve_crossword
+
+BLACK_SQUARE_RATIO = 0.15
+NUM_SCORED_ASSIGNMENTS = 200
+
+# Metrics compared against a baseline, with +1 if higher values are worse and -1 if lower values are worse.
+METRICS = {"wall_time": 1, "nodes": 1, "peak_memory": 1, "model_calls": 1, "score": -1, "accuracy": -1}
+MIN_TIME_REGRESSION = 0.05  # Seconds. Smaller differences in wall time are noise.
+
+
+def seeded_random(*parts: Any) -> random.Random:
+    """Create a random number generator seeded by the given values, independent of the hash seed of the process."""
+    digest = hashlib.sha256(json.dumps(parts).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+class BenchmarkPuzzle(BaseModel):
+    name: str
+    crossword: MiniCrossword
+    answers: dict[str, str]  # Clue -> answer.
+
+
+def make_puzzle(name: str, crossword: MiniCrossword, seed: int) -> BenchmarkPuzzle:
+    """Fill a crossword with random letters to get a known solution.
+
+    Args:
+        name (str): The name of the puzzle.
+        crossword (MiniCrossword): The crossword puzzle. Answers it already has are kept.
+        seed (int): The seed of the random letters.
+
+    Returns:
+        BenchmarkPuzzle: The puzzle with an answer for every clue.
+    """
+    rng = seeded_random("puzzle", name, seed)
+    letters = {}
+    for orientation in ("across", "down"):
+        for clue in getattr(crossword, orientation):
+            for pos, cell in enumerate(get_spanning_cells(clue, orientation)):
+                if clue.answer is not None and len(clue.answer) == clue.length:
+                    letters[cell] = clue.answer[pos]
+    answers = {}
+    for orientation in ("across", "down"):
+        for clue in getattr(crossword, orientation):
+            cells = get_spanning_cells(clue, orientation)
+            answers[clue.clue] = "".join(letters.setdefault(cell, rng.choice(string.ascii_uppercase)) for cell in cells)
+    return BenchmarkPuzzle(name=name, crossword=crossword, answers=answers)
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    """Parse the size of a synthetic grid, given as `<rows>x<columns>` or as a single number for a square grid."""
+    rows, _, cols = size.lower().partition("x")
+    return int(rows), int(cols or rows)
+
+
+def synthetic_crossword(size: tuple[int, int], seed: int) -> MiniCrossword:
+    """Generate a grid with rotationally symmetric black squares and placeholder clues.
+
+    Args:
+        size (tuple[int, int]): The number of rows and columns.
+        seed (int): The seed of the black squares.
+
+    Returns:
+        MiniCrossword: The crossword puzzle.
+    """
+    rows, cols = size
+    name = f"{rows}x{cols}"
+    # Square grids keep the seed they had before rectangular grids were supported, so that baselines stay comparable.
+    rng = seeded_random("grid", rows, seed) if rows == cols else seeded_random("grid", rows, cols, seed)
+    squares = [["_"] * cols for _ in range(rows)]
+    for i in range(rows):
+        for j in range(cols):
+            if (i, j) <= (rows - 1 - i, cols - 1 - j) and rng.random() < BLACK_SQUARE_RATIO:
+                squares[i][j] = squares[rows - 1 - i][cols - 1 - j] = "#"
+    grid = ["".join(row) for row in squares]
+    across, down = get_clue_slots(grid)
+    return MiniCrossword(
+        grid=grid,
+        across=[
+            Clue(position=position, clue=f"{name} across {idx}", length=length)
+            for idx, (position, length) in enumerate(across)
+        ],
+        down=[
+            Clue(position=position, clue=f"{name} down {idx}", length=length)
+            for idx, (position, length) in enumerate(down)
+        ],
+    )
+
+
+def load_puzzles(puzzles_dir: Path, sizes: list[tuple[int, int]], seed: int) -> list[BenchmarkPuzzle]:
+    """Load the extracted puzzles and generate synthetic ones.
+
+    Args:
+        puzzles_dir (Path): The directory of extracted puzzle JSON files.
+        sizes (list[tuple[int, int]]): The numbers of rows and columns of the synthetic grids.
+        seed (int): The seed of the synthetic grids and solutions.
+
+    Returns:
+        list[BenchmarkPuzzle]: The puzzles.
+    """
+    puzzles = []
+    for path in sorted(puzzles_dir.glob("*.json")):
+        with open(path) as f:
+            puzzles.append(make_puzzle(path.stem, MiniCrossword(**json.load(f)), seed))
+    for rows, cols in sizes:
+        puzzles.append(make_puzzle(f"synthetic-{rows}x{cols}", synthetic_crossword((rows, cols), seed), seed))
+    return puzzles
+
+
+def synthesize_candidates(
+    answer: str, num_candidates: int, accuracy: float, rng: random.Random, exclude: Sequence[str] = ()
+) -> dict[str, float]:
+    """Generate candidates like a model would: the answer most of the time, and near misses that share some letters.
+
+    Args:
+        answer (str): The correct answer.
+        num_candidates (int): The number of candidates.
+        accuracy (float): The probability that the answer is among the candidates.
+        rng (random.Random): The random number generator.
+        exclude (Sequence[str], optional): The candidates to leave out. Defaults to ().
+
+    Returns:
+        dict[str, float]: The candidates and their confidences. The answer tends to get a higher confidence.
+    """
+    exclude = set(exclude)
+    candidates = {}
+    if answer not in exclude and rng.random() < accuracy:
+        candidates[answer] = rng.uniform(0.5, 1.0)
+    for _ in range(10 * num_candidates):
+        if len(candidates) >= num_candidates:
+            break
+        word = list(answer)
+        for pos in rng.sample(range(len(word)), k=rng.randint(1, max(1, len(word) // 2))):
+            word[pos] = rng.choice(string.ascii_uppercase)
+        word = "".join(word)
+        if word != answer and word not in exclude:
+            candidates.setdefault(word, rng.uniform(0.0, 0.7))
+    return candidates
+
+
+def _text(message: LLMMessage) -> str:
+    if isinstance(message.content, list):  # Multimodal messages mix text and images.
+        return " ".join(part for part in message.content if isinstance(part, str))
+    return message.content if isinstance(message.content, str) else ""
+
+
+class FakeModelBackend:
+    """Deterministic stand-in for the models and the oracle, answering from the known solutions of the puzzles.
+
+    Calls are counted per phase of the solver (generating the initial candidates or improving the solution, told
+    apart by the priority of the request) and per role. Each call can be delayed to simulate network latency.
+    """
+
+    def __init__(
+        self,
+        answers: dict[str, str],
+        num_candidates: int = 10,
+        accuracy: float = 0.8,
+        seed: int = 0,
+        latency: float = 0.0,
+    ):
+        self.answers = answers
+        self.num_candidates = num_candidates
+        self.accuracy = accuracy
+        self.seed = seed
+        self.latency = latency
+        self.calls: dict[str, dict[str, int]] = {}
+
+    def _count(self, role: str):
+        phase = "improvements" if get_request_priority() == PRIORITY_IMPROVEMENT else "candidates"
+        self.calls.setdefault(phase, {}).setdefault(role, 0)
+        self.calls[phase][role] += 1
+
+    def respond(self, role: str, messages: Sequence[LLMMessage]) -> str | list[FunctionCall]:
+        """Respond to a model call.
+
+        Args:
+            role (str): The agent making the call: "context", "candidates_generator", "batch_candidates_generator",
+                "correctness" or "clue_extractor".
+            messages (Sequence[LLMMessage]): The messages of the call.
+
+        Returns:
+            str | list[FunctionCall]: The content of the response.
+        """
+        self._count(role)
+        texts = [_text(message) for message in messages]
+        if role == "correctness":
+            match = re.search(r"Clue: (.*) Candidate: (\w*)$", texts[-1], re.DOTALL)
+            return json.dumps({"is_correct": match is not None and self.answers.get(match[1]) == match[2]})
+
+        if role == "clue_extractor":
+            # The image cannot be read, so every clue listed in the message gets a placeholder text.
+            clues = []
+            for orientation in ("across", "down"):
+                match = re.search(rf"{orientation.capitalize()} clues: ([\d, ]*)\.", texts[-1])
+                for number in match[1].split(", ") if match and match[1] else []:
+                    clues.append({"orientation": orientation, "number": int(number), "clue": f"{number} {orientation}"})
+            return json.dumps({"clues": clues})
+
+        if role == "batch_candidates_generator":
+            clues = []
+            for line in texts[-1].splitlines():
+                match = re.match(r"(\d+)\. (Clue: (.*), Length: (\d+)\..*)", line)
+                if match:
+                    candidates = self._candidates(match[2], match[3], int(match[4]))
+                    clues.append({"id": match[1], "candidates": candidates})
+            return json.dumps({"clues": clues})
+
+        instruction = next((text for text in texts if text.startswith("Clue: ")), "")
+        match = re.match(r"Clue: (.*), Length: (\d+)\.", instruction, re.DOTALL)
+        clue, length = (match[1], int(match[2])) if match else ("", 0)
+        if role == "context":
+            if isinstance(messages[-1], FunctionExecutionResultMessage):
+                return json.dumps({"context": f"Nothing notable about {clue}."})
+            arguments = json.dumps({"query": f"What is the answer to the crossword clue {clue}?"})
+            return [FunctionCall(id="oracle", name="ask_oracle", arguments=arguments)]
+
+        return json.dumps({"candidates": self._candidates(instruction, clue, length)})
+
+    def _candidates(self, instruction: str, clue: str, length: int) -> list[dict]:
+        match = re.search(r"Exclude the following candidates: (.*)\.$", instruction)
+        exclude = match[1].split(", ") if match else []
+        answer = self.answers.get(clue) or "".join(seeded_random("answer", clue, self.seed).choices("ABC", k=length))
+        rng = seeded_random("candidates", instruction, self.seed)
+        candidates = synthesize_candidates(answer, self.num_candidates, self.accuracy, rng, exclude=exclude)
+        return [{"answer": answer, "confidence": confidence} for answer, confidence in candidates.items()]
+
+    async def query_oracle(self, query: str) -> str:
+        """Stand-in for the oracle queried by `ask_oracle`."""
+        self._count("oracle")
+        await asyncio.sleep(self.latency)
+        return "No further information."
+
+    @property
+    def num_calls(self) -> int:
+        return sum(sum(roles.values()) for roles in self.calls.values())
+
+
+class FakeChatCompletionClient(ChatCompletionClient):
+    """Chat completion client answered by a `FakeModelBackend` in the role of one of the agents."""
+
+    def __init__(self, backend: FakeModelBackend, role: str):
+        self.backend = backend
+        self.role = role
+
+    async def create(self, messages: Sequence[LLMMessage], **kwargs: Any) -> CreateResult:
+        content = self.backend.respond(self.role, messages)
+        await asyncio.sleep(self.backend.latency)
+        return CreateResult(
+            finish_reason="function_calls" if isinstance(content, list) else "stop",
+            content=content,
+            usage=RequestUsage(prompt_tokens=0, completion_tokens=0),
+            cached=False,
+        )
+
+    async def create_stream(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> AsyncGenerator[str | CreateResult, None]:
+        yield await self.create(messages, **kwargs)
+
+    async def close(self) -> None:
+        pass
+
+    def actual_usage(self) -> RequestUsage:
+        return RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    def total_usage(self) -> RequestUsage:
+        return RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    def count_tokens(self, messages: Sequence[LLMMessage], **kwargs: Any) -> int:
+        return 0
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], **kwargs: Any) -> int:
+        return 1 << 20
+
+    @property
+    def capabilities(self):
+        return self.model_info
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return ModelInfo(vision=True, function_calling=True, json_output=True, family="unknown", structured_output=True)
+
+
+class FakeOracleClient:
+    """Stand-in for the Google GenAI client of the oracle, answered by a `FakeModelBackend`."""
+
+    def __init__(self, backend: FakeModelBackend):
+        self.backend = backend
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self.generate_content))
+
+    async def generate_content(self, model: str, contents: str, config: Any = None) -> SimpleNamespace:
+        text = await self.backend.query_oracle(contents)
+        content = SimpleNamespace(parts=[SimpleNamespace(text=text)])
+        return SimpleNamespace(candidates=[SimpleNamespace(content=content)], usage_metadata=None)
+
+
+def install_fake_backend(backend: FakeModelBackend) -> Callable[[], None]:
+    """Route the calls of all agents and the oracle to a fake backend, with a fresh scheduler.
+
+    Args:
+        backend (FakeModelBackend): The fake backend.
+
+    Returns:
+        Callable[[], None]: Undoes the installation, so that the clients are created from their factories again on
+            next use and the previous scheduler is restored.
+    """
+    for role in ("context", "candidates_generator", "batch_candidates_generator", "correctness", "clue_extractor"):
+        client = FakeChatCompletionClient(backend, role)
+        set_client(role, ScheduledChatCompletionClient(client, model=agents.AGENT_MODEL, name=role))
+    set_client("oracle", FakeOracleClient(backend))
+    agents.clear_agent_pools()
+    tools.clear_oracle_memo()
+    previous_scheduler = get_scheduler()
+    set_scheduler(ModelScheduler())
+
+    def uninstall():
+        reset_clients()
+        agents.clear_agent_pools()
+        tools.clear_oracle_memo()
+        set_scheduler(previous_scheduler)
+
+    return uninstall
+
+
+def measure(
+    function: Callable[[Any], Any], setup: Callable[[], Any] = lambda: None, memory: bool = True
+) -> tuple[Any, float, Optional[int]]:
+    """Call a function, measuring its wall time and the peak memory it allocates.
+
+    Tracing allocations slows allocation-heavy code down several times, so the wall time is measured in a call without
+    tracing and the peak memory in a second, traced call.
+
+    Args:
+        function (Callable[[Any], Any]): The function, called with the result of `setup`.
+        setup (Callable[[], Any], optional): Prepares the argument of each call, e.g. a fresh search, outside of the
+            measurements. Defaults to no argument (None).
+        memory (bool, optional): Whether to measure the peak memory, which takes the second call. Defaults to True.
+
+    Returns:
+        tuple[Any, float, Optional[int]]: The result of the timed call, the wall time in seconds and the peak memory in
+            bytes, or None if `memory` is False.
+    """
+    argument = setup()
+    start = time.perf_counter()
+    result = function(argument)
+    wall_time = time.perf_counter() - start
+    if not memory:
+        return result, wall_time, None
+    argument = setup()
+    tracemalloc.start()
+    try:
+        function(argument)
+        return result, wall_time, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_search(
+    puzzle: BenchmarkPuzzle,
+    num_candidates: int,
+    accuracy: float,
+    seed: int,
+    time_limit: float = None,
+    beam_width: int = 64,
+    executor: Executor = None,
+    search_workers: int = None,
+) -> list[dict]:
+    """Benchmark the exact search, the beam search and the scoring functions on synthetic candidate lists.
+
+    Args:
+        puzzle (BenchmarkPuzzle): The puzzle.
+        num_candidates (int): The number of candidates per clue.
+        accuracy (float): The probability that the answer is among the candidates of a clue.
+        seed (int): The seed of the candidates.
+        time_limit (float, optional): The time limit of the exact search in seconds. Defaults to None.
+        beam_width (int, optional): The width of the beam search. Defaults to 64.
+        executor (Executor, optional): If given, also benchmark the parallel search in this process pool. Defaults to
+            None.
+        search_workers (int, optional): The number of processes of `executor`. Defaults to None.
+
+    Returns:
+        list[dict]: The result records.
+    """
+    crossword = puzzle.crossword
+    rng = seeded_random("search", puzzle.name, seed)
+    across_candidates = [
+        synthesize_candidates(puzzle.answers[clue.clue], num_candidates, accuracy, rng) for clue in crossword.across
+    ]
+    down_candidates = [
+        synthesize_candidates(puzzle.answers[clue.clue], num_candidates, accuracy, rng) for clue in crossword.down
+    ]
+    records = []
+
+    def new_search() -> CrosswordSearch:
+        return CrosswordSearch(crossword, across_candidates, down_candidates)
+
+    (solution, search), wall_time, peak_memory = measure(
+        lambda search: (search.search(time_limit=time_limit), search), new_search
+    )
+    records.append(
+        {
+            "benchmark": "search",
+            "puzzle": puzzle.name,
+            "wall_time": wall_time,
+            "nodes": search.nodes,
+            "peak_memory": peak_memory,
+            "complete": search.complete,
+            "score": solution.score,
+        }
+    )
+
+    if executor is not None:
+        num_parts = PARTS_PER_WORKER * search_workers
+        (solution, search), wall_time, peak_memory = measure(
+            lambda search: parallel_search(search, executor, num_parts=num_parts, time_limit=time_limit), new_search
+        )
+        records.append(
+            {
+                "benchmark": "parallel_search",
+                "puzzle": puzzle.name,
+                "wall_time": wall_time,
+                "nodes": search.nodes,
+                "peak_memory": peak_memory,
+                "complete": search.complete,
+                "score": solution.score,
+            }
+        )
+
+    (solution, search), wall_time, peak_memory = measure(
+        lambda search: (search.neighborhood_search(time_limit=time_limit), search), new_search
+    )
+    records.append(
+        {
+            "benchmark": "neighborhood_search",
+            "puzzle": puzzle.name,
+            "wall_time": wall_time,
+            "nodes": search.nodes,
+            "peak_memory": peak_memory,
+            "score": solution.score,
+        }
+    )
+
+    solutions, wall_time, peak_memory = measure(lambda search: search.beam_search(beam_width=beam_width), new_search)
+    records.append(
+        {
+            "benchmark": "beam_search",
+            "puzzle": puzzle.name,
+            "wall_time": wall_time,
+            "peak_memory": peak_memory,
+            "score": solutions[0].score,
+        }
+    )
+
+    assignments = [
+        (
+            [rng.choice(list(candidates)) for candidates in across_candidates],
+            [rng.choice(list(c)) for c in down_candidates],
+        )
+        for _ in range(NUM_SCORED_ASSIGNMENTS)
+    ]
+    _, wall_time, _ = measure(
+        lambda _: [score_assignment(crossword, *assignment) for assignment in assignments], memory=False
+    )
+    records.append({"benchmark": "score_assignment", "puzzle": puzzle.name, "wall_time": wall_time})
+
+    scored = crossword.model_copy(deep=True)
+
+    def score_clues(_):
+        for across_answers, down_answers in assignments:
+            for clue, answer in zip(scored.across + scored.down, across_answers + down_answers):
+                clue.answer = answer
+            for orientation in ("across", "down"):
+                for idx in range(len(getattr(scored, orientation))):
+                    consistency_score(scored, orientation, idx)
+
+    _, wall_time, _ = measure(score_clues, memory=False)
+    records.append({"benchmark": "consistency_score", "puzzle": puzzle.name, "wall_time": wall_time})
+    return records
+
+
+def benchmark_solve(
+    puzzle: BenchmarkPuzzle,
+    max_improvements: int,
+    num_candidates: int,
+    accuracy: float,
+    seed: int,
+    search_time_limit: float = None,
+    cache: CandidateCache = None,
+    latency: float = 0.0,
+    batch_clues: int = None,
+    improvements_per_round: int = 1,
+) -> dict:
+    """Benchmark the whole solver against the fake backend.
+
+    Args:
+        puzzle (BenchmarkPuzzle): The puzzle.
+        max_improvements (int): The maximum number of improvements to make.
+        num_candidates (int): The number of candidates the fake models return per call.
+        accuracy (float): The probability that the answer is among the candidates of a call.
+        seed (int): The seed of the fake models.
+        search_time_limit (float, optional): The time limit of each search in seconds. Defaults to None.
+        cache (CandidateCache, optional): A cache of recorded candidates to replay. Every run replays a copy of it, so
+            the cache itself is left unchanged. Defaults to None.
+        latency (float, optional): The simulated latency of each model call in seconds. Defaults to 0.0.
+        batch_clues (int, optional): If given, ask for the initial candidates of up to this many clues per call.
+            Defaults to None.
+        improvements_per_round (int, optional): The number of clues improved concurrently in each improvement step.
+            Defaults to 1.
+
+    Returns:
+        dict: The result record.
+    """
+
+    def new_run(directory: Path) -> tuple[FakeModelBackend, Optional[CandidateCache]]:
+        backend = FakeModelBackend(
+            puzzle.answers, num_candidates=num_candidates, accuracy=accuracy, seed=seed, latency=latency
+        )
+        # Each run replays its own copy of the cache, since the candidates stored by the timed run would turn the
+        # misses of the traced run into hits.
+        run_cache = None if cache is None else cache.copy(Path(tempfile.mkdtemp(dir=directory)))
+        return backend, run_cache
+
+    def solve(
+        run: tuple[FakeModelBackend, Optional[CandidateCache]],
+    ) -> tuple[MiniCrossword, FakeModelBackend, dict[str, float]]:
+        backend, run_cache = run
+        timings = {}
+        uninstall = install_fake_backend(backend)
+        try:
+            solved = asyncio.run(
+                solve_crossword(
+                    puzzle.crossword,
+                    max_improvements,
+                    cache=run_cache,
+                    search_time_limit=search_time_limit,
+                    timings=timings,
+                    batch_clues=batch_clues,
+                    improvements_per_round=improvements_per_round,
+                )
+            )
+        finally:
+            uninstall()
+            if run_cache is not None:
+                run_cache.close()
+        return solved, backend, timings
+
+    with tempfile.TemporaryDirectory() as directory:
+        (solved, backend, timings), wall_time, peak_memory = measure(solve, lambda: new_run(Path(directory)))
+    clues = solved.across + solved.down
+    return {
+        "benchmark": "solve",
+        "puzzle": puzzle.name,
+        "wall_time": wall_time,
+        "peak_memory": peak_memory,
+        "score": sum(clue.consistency_score for clue in clues),
+        "accuracy": sum(clue.answer == puzzle.answers[clue.clue] for clue in clues) / len(clues),
+        "model_calls": backend.num_calls,
+        "calls": backend.calls,
+        "timings": timings,
+    }
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """Compare results with a baseline.
+
+    Args:
+        results (list[dict]): The result records.
+        baseline (list[dict]): The result records of the baseline.
+        tolerance (float): The relative change of a metric tolerated before it counts as a regression.
+
+    Returns:
+        list[str]: A description of every regression.
+    """
+    baseline = {(record["benchmark"], record["puzzle"]): record for record in baseline}
+    regressions = []
+    for record in results:
+        previous = baseline.get((record["benchmark"], record["puzzle"]))
+        if previous is None:
+            continue
+        for metric, direction in METRICS.items():
+            if metric not in record or metric not in previous:
+                continue
+            change = (record[metric] - previous[metric]) * direction
+            if change > tolerance * abs(previous[metric]) and (metric != "wall_time" or change > MIN_TIME_REGRESSION):
+                regressions.append(
+                    f"{record['benchmark']} {record['puzzle']}: {metric} {previous[metric]:.4g} -> {record[metric]:.4g}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the solver against deterministic fake models.")
+    parser.add_argument(
+        "--puzzles", type=str, default="puzzles/extracted", help="The directory of extracted puzzle JSON files."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=parse_size,
+        nargs="*",
+        default=[parse_size(size) for size in ("5", "7", "9", "11", "13", "15", "21", "15x21")],
+        help="The sizes of the synthetic grids, as a number of rows and columns (e.g. 15x21) or one number for both.",
+    )
+    parser.add_argument("--num_candidates", type=int, default=10, help="The number of candidates per clue.")
+    parser.add_argument(
+        "--accuracy", type=float, default=0.8, help="The probability that the answer is among the candidates."
+    )
+    parser.add_argument("--max_improvements", type=int, default=5, help="The maximum number of improvements to make.")
+    parser.add_argument(
+        "--search_time_limit", type=float, default=10.0, help="The time limit of each search in seconds."
+    )
+    parser.add_argument("--beam_width", type=int, default=64, help="The width of the beam search.")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="The simulated latency of each model call in seconds."
+    )
+    parser.add_argument(
+        "--improvements_per_round", type=int, default=1, help="The number of clues improved in parallel per step."
+    )
+    parser.add_argument(
+        "--batch_clues", type=int, default=None, help="Ask for the initial candidates of this many clues per call."
+    )
+    parser.add_argument(
+        "--search_workers", type=int, default=None, help="Also benchmark the parallel search with this many processes."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the puzzles and the fake models.")
+    parser.add_argument(
+        "--cache_dir", type=str, default=None, help="A candidate cache whose recorded candidates are replayed."
+    )
+    parser.add_argument("--output", type=str, default=None, help="The path to write the results JSON to.")
+    parser.add_argument("--baseline", type=str, default=None, help="The results JSON of a baseline to compare with.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="The relative change tolerated before it counts as a regression."
+    )
+
+    args = parser.parse_args()
+
+    cache = None if args.cache_dir is None else CandidateCache(args.cache_dir)
+    executor = None
+    if args.search_workers is not None:
+        executor = ProcessPoolExecutor(args.search_workers, mp_context=multiprocessing.get_context("spawn"))
+    results = []
+    for puzzle in load_puzzles(Path(args.puzzles), args.sizes, args.seed):
+        records = benchmark_search(
+            puzzle,
+            args.num_candidates,
+            args.accuracy,
+            args.seed,
+            time_limit=args.search_time_limit,
+            beam_width=args.beam_width,
+            executor=executor,
+            search_workers=args.search_workers,
+        )
+        records.append(
+            benchmark_solve(
+                puzzle,
+                args.max_improvements,
+                args.num_candidates,
+                args.accuracy,
+                args.seed,
+                search_time_limit=args.search_time_limit,
+                cache=cache,
+                latency=args.latency,
+                batch_clues=args.batch_clues,
+                improvements_per_round=args.improvements_per_round,
+            )
+        )
+        for record in records:
+            metrics = ", ".join(f"{metric}={record[metric]:.4g}" for metric in METRICS if metric in record)
+            print(f"{record['benchmark']:>19} {record['puzzle']:<22} {metrics}", flush=True)
+        results.extend(records)
+    if executor is not None:
+        executor.shutdown()
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_DIR = Path(os.getenv("NYT_CROSSWORD_SOLVER_CACHE_DIR", Path.home() / ".cache" / "nyt_crossword_solver"))
+
+
+def candidates_key(
+    clue: str, length: int, exclude: list[str] = None, intersections: list[tuple[int, str]] = None
+) -> str:
+    """Compute the content address of a candidate generation request.
+
+    Args:
+        clue (str): The crossword clue.
+        length (int): The length of the answer.
+        exclude (list[str], optional): The list of candidates to exclude. Order and duplicates do not matter.
+            Defaults to None.
+        intersections (list[tuple[int, str]], optional): The likely characters at given positions of the answer. Order
+            does not matter. Defaults to None.
+
+    Returns:
+        str: The key of the request.
+    """
+    request = [clue, length, sorted(set(exclude or [])), sorted(tuple(i) for i in intersections or [])]
+    return hashlib.sha256(json.dumps(request).encode()).hexdigest()
+
+
+class CandidateCache:
+    """Persistent cache of generated candidates, stored in a SQLite database.
+
+    Entries older than `ttl` seconds are treated as missing, and the least recently used entries are evicted once
+    there are more than `max_entries`. In offline mode a miss raises a `LookupError` instead of letting the caller
+    query a model, so that regression runs are reproducible and free.
+    """
+
+    def __init__(
+        self,
+        directory: Path = DEFAULT_CACHE_DIR,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = 100_000,
+        offline: bool = False,
+    ):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / "candidates.sqlite3"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS candidates "
+            "(key TEXT PRIMARY KEY, candidates TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS candidates_accessed ON candidates (accessed)")
+        self._connection.commit()
+
+    def get(self, key: str) -> Optional[list[str] | dict[str, float]]:
+        """Look up the candidates of a request.
+
+        Args:
+            key (str): The key of the request, see `candidates_key`.
+
+        Returns:
+            Optional[list[str] | dict[str, float]]: The cached candidates, with their confidences if they were stored
+                with them, or None on a miss (outside of offline mode).
+        """
+        now = time.time()
+        row = self._connection.execute("SELECT candidates, created FROM candidates WHERE key = ?", (key,)).fetchone()
+        if row is not None and self.ttl is not None and row[1] + self.ttl < now:
+            self._connection.execute("DELETE FROM candidates WHERE key = ?", (key,))
+            self._connection.commit()
+            row = None
+        if row is None:
+            self.misses += 1
+            if self.offline:
+                raise LookupError(f"No cached candidates for key {key} in offline mode.")
+            return None
+        self.hits += 1
+        self._connection.execute("UPDATE candidates SET accessed = ? WHERE key = ?", (now, key))
+        self._connection.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, candidates: list[str] | dict[str, float]):
+        """Store the candidates of a request, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key (str): The key of the request, see `candidates_key`.
+            candidates (list[str] | dict[str, float]): The generated candidates, optionally with their confidences.
+        """
+        now = time.time()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO candidates (key, candidates, created, accessed) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(candidates), now, now),
+        )
+        if self.max_entries is not None:
+            self._connection.execute(
+                "DELETE FROM candidates WHERE key IN "
+                "(SELECT key FROM candidates ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        self._connection.commit()
+
+    def copy(self, directory: Path) -> "CandidateCache":
+        """Copy the cache to another directory, with the same settings.
+
+        Args:
+            directory (Path): The directory of the copy.
+
+        Returns:
+            CandidateCache: The copy, which entries stored in either cache do not reach the other.
+        """
+        copy = CandidateCache(directory, ttl=self.ttl, max_entries=self.max_entries, offline=self.offline)
+        self._connection.backup(copy._connection)
+        return copy
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
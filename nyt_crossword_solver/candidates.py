@@ -0,0 +1,111 @@
+import sys
+from typing import Iterator, Optional
+
+from nyt_crossword_solver.crossword import filter_invalid_characters
+
+DEFAULT_CONFIDENCE = 1.0  # Confidence of candidates given without one, which leaves the likelihood unchanged.
+MAX_CANDIDATES = 50  # Per clue. Generators return about ten candidates per request, so this rarely cuts good ones.
+
+
+def candidate_confidences(candidates: list[str] | dict[str, float]) -> dict[str, float]:
+    """Filter the candidates and map them to their confidence, dropping duplicates.
+
+    Args:
+        candidates (list[str] | dict[str, float]): The candidate answers, or a mapping from candidate answers to their
+            confidence between 0 and 1. Candidates given as a list get `DEFAULT_CONFIDENCE`.
+
+    Returns:
+        dict[str, float]: The filtered candidates in order of first occurrence, with the highest confidence of their
+            duplicates.
+    """
+    items = candidates.items() if isinstance(candidates, dict) else ((c, DEFAULT_CONFIDENCE) for c in candidates)
+    confidences = {}
+    for candidate, confidence in items:
+        candidate = filter_invalid_characters(candidate)
+        confidences[candidate] = max(confidence, confidences.get(candidate, confidence))
+    return confidences
+
+
+class CandidateStore:
+    """The candidates of one clue, with the stable integer id the search knows each of them by.
+
+    Candidates are normalized with `candidate_confidences` and interned, so that the many clues sharing an answer
+    share one string. Candidates of the wrong length, which can never score, and candidates the clue already has are
+    dropped when they are added, so they never multiply the search space. Ids are assigned in order of insertion and
+    never change, since the search keeps its state across improvement steps; `answers` and `confidences` are indexed
+    by id and match the candidate order of `CrosswordSearch` for the clue.
+
+    A clue whose candidates all have the wrong length keeps the most confident of them, so that it still gets an
+    answer (scoring 0) until candidates of the right length arrive.
+    """
+
+    def __init__(
+        self,
+        length: int,
+        candidates: list[str] | dict[str, float] = None,
+        max_candidates: Optional[int] = MAX_CANDIDATES,
+    ):
+        self.length = length
+        self.max_candidates = max_candidates
+        self.answers: list[str] = []
+        self.confidences: list[float] = []
+        self.ids: dict[str, int] = {}
+        self.dropped = 0  # Candidates dropped for their length or the size limit, not counting duplicates.
+        if candidates:
+            self.add(candidates)
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.answers)
+
+    def __contains__(self, candidate: str) -> bool:
+        return filter_invalid_characters(candidate) in self.ids
+
+    @property
+    def full(self) -> bool:
+        """Whether the store has reached `max_candidates`, so that adding candidates has no effect."""
+        return self.max_candidates is not None and len(self.answers) >= self.max_candidates
+
+    def items(self) -> dict[str, float]:
+        """Get the candidates in order of their ids, with their confidence."""
+        return dict(zip(self.answers, self.confidences))
+
+    def add(self, candidates: list[str] | dict[str, float]) -> dict[str, float]:
+        """Add candidates, keeping the most confident ones if they do not all fit under `max_candidates`.
+
+        Args:
+            candidates (list[str] | dict[str, float]): The candidate answers, or a mapping from candidate answers to
+                their confidence between 0 and 1. Candidates given as a list get `DEFAULT_CONFIDENCE`.
+
+        Returns:
+            dict[str, float]: The normalized candidates that were added, in order of their new ids, with their
+                confidence (the highest one of their duplicates).
+        """
+        fitting, misfits = {}, {}
+        for candidate, confidence in candidate_confidences(candidates).items():
+            if candidate not in self.ids:
+                (fitting if len(candidate) == self.length else misfits)[candidate] = confidence
+        self.dropped += len(misfits)
+        if not fitting and not self.answers and misfits:
+            best = max(misfits, key=misfits.get)
+            fitting = {best: misfits[best]}
+            self.dropped -= 1
+
+        if self.max_candidates is not None:
+            room = max(self.max_candidates - len(self.answers), 0)
+            if len(fitting) > room:
+                # The most confident candidates are kept, in the order they were given in.
+                kept = set(sorted(fitting, key=fitting.get, reverse=True)[:room])
+                self.dropped += len(fitting) - room
+                fitting = {candidate: confidence for candidate, confidence in fitting.items() if candidate in kept}
+
+        added = {}
+        for candidate, confidence in fitting.items():
+            candidate = sys.intern(candidate)
+            self.ids[candidate] = len(self.answers)
+            self.answers.append(candidate)
+            self.confidences.append(confidence)
+            added[candidate] = confidence
+        return added
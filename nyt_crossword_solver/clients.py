@@ -0,0 +1,54 @@
+import threading
+from typing import Any, Callable
+
+_factories: dict[str, Callable[[], Any]] = {}
+_clients: dict[str, Any] = {}
+_lock = threading.RLock()  # Reentrant, since factories may get the clients they depend on.
+
+
+def register_client(name: str, factory: Callable[[], Any]):
+    """Register how to create a model client. The client is only created when it is first used.
+
+    Args:
+        name (str): The name of the client.
+        factory (Callable[[], Any]): Creates the client.
+    """
+    _factories[name] = factory
+
+
+def get_client(name: str) -> Any:
+    """Get a model client, creating it on first use so that importing the solver needs neither the model SDKs nor
+    API keys.
+
+    Args:
+        name (str): The name of the client.
+
+    Returns:
+        Any: The client shared by all callers.
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                if name not in _factories:
+                    raise KeyError(f"No model client named {name!r} is registered.")
+                client = _clients[name] = _factories[name]()
+    return client
+
+
+def set_client(name: str, client: Any):
+    """Replace a model client, e.g. with a fake in tests and benchmarks.
+
+    Args:
+        name (str): The name of the client.
+        client (Any): The new client.
+    """
+    with _lock:
+        _clients[name] = client
+
+
+def reset_clients():
+    """Drop the created clients, so that they are created again on next use."""
+    with _lock:
+        _clients.clear()
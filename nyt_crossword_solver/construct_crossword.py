@@ -1,115 +1,166 @@
 import argparse
 import asyncio
 import json
-from math import sqrt
 from pathlib import Path
 from typing import Literal
 
-from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.messages import MultiModalMessage
 from autogen_core import CancellationToken, Image
-from autogen_ext.models.openai import OpenAIChatCompletionClient
 from PIL import Image as PILImage
-from pydantic import BaseModel
 
-from nyt_crossword_solver.crossword import Clue, MiniCrossword
+from nyt_crossword_solver.agents import ExtractedClueFormat, ExtractedCluesFormat, clue_extractors
+from nyt_crossword_solver.crossword import Clue, MiniCrossword, get_clue_numbers, get_clue_slots, parse_grid_structure
 
+MAX_IMAGE_SIDE = 1024  # Pixels. Clue text stays legible, and larger images only cost more tokens.
 
-class ExtractedClueFormat(BaseModel):
-    orientation: Literal["across", "down"]
-    clue: str
 
+def prepare_image(
+    image: PILImage.Image, crop: tuple[float, float, float, float] = None, max_side: int = MAX_IMAGE_SIDE
+) -> PILImage.Image:
+    """Shrink an image of a crossword puzzle before it is sent to a model.
 
-class ExtractedCluesFormat(BaseModel):
-    clues: list[ExtractedClueFormat]
-
+    Args:
+        image (PILImage.Image): The image.
+        crop (tuple[float, float, float, float], optional): The box of the clues as the left, top, right and bottom
+            edges in fractions of the width and height, e.g. `(0.5, 0, 1, 1)` for clues on the right half. Defaults to
+            None, in which case the whole image is kept.
+        max_side (int, optional): The maximum width and height in pixels. Defaults to `MAX_IMAGE_SIDE`.
 
-async def extract_clues_from_image(image: PILImage) -> list[ExtractedClueFormat]:
+    Returns:
+        PILImage.Image: A grayscale copy of the cropped image, scaled down to fit `max_side`.
+    """
+    if crop is not None:
+        left, top, right, bottom = crop
+        width, height = image.size
+        image = image.crop((round(left * width), round(top * height), round(right * width), round(bottom * height)))
+    image = image.convert("L")  # Clues are text, so colors only add to the payload.
+    image.thumbnail((max_side, max_side), PILImage.Resampling.LANCZOS)
+    return image
+
+
+async def extract_clues_from_image(
+    image: PILImage.Image, across_numbers: list[int], down_numbers: list[int]
+) -> list[ExtractedClueFormat]:
     """Extract clues from an image of a crossword puzzle.
 
     Args:
-        image (Image): The image to analyze.
+        image (PILImage.Image): The image to analyze.
+        across_numbers (list[int]): The numbers of the across clues.
+        down_numbers (list[int]): The numbers of the down clues.
 
     Returns:
         list[ExtractedClueFormat]: The extracted clues.
     """
+    numbers = f"Across clues: {', '.join(map(str, across_numbers))}. Down clues: {', '.join(map(str, down_numbers))}."
+    async with clue_extractors.acquire() as agent:
+        response = await agent.on_messages(
+            [MultiModalMessage(content=[numbers, Image(image)], source="User")], cancellation_token=CancellationToken()
+        )
+    return ExtractedCluesFormat(**json.loads(response.chat_message.content)).clues
 
-    image = Image(image)
-    model_client = OpenAIChatCompletionClient(
-        model="gpt-4o",
-        response_format=ExtractedCluesFormat,
-    )
 
-    system_message = (
-        """Analyze the image of a crossword puzzle and extract the clues including the orientation (across or down),"""
-        """ position, clue, and length of each answer. Instructions for determining the answer length:\n"""
-        """    1. Locate the grid position corresponding to the clue number.\n"""
-        """    2. Count the number of consecutive empty squares starting from this position. You must count in """
-        """the direction specified by the clue's orientation (Across → Right, Down → Downward). \n"""
-        """    3. Stop counting when reaching either a black (blocked) square or the edge of the puzzle grid."""
-    )
-    agent = AssistantAgent(name="crossword_clues_extractor", model_client=model_client, system_message=system_message)
-    response = await agent.on_messages(
-        [MultiModalMessage(content=[image], source="User")], cancellation_token=CancellationToken()
-    )
-    return ExtractedCluesFormat(**json.loads(response.chat_message.content)).clues
+def match_clues(
+    clues: list[ExtractedClueFormat], orientation: Literal["across", "down"], numbers: list[int]
+) -> list[str]:
+    """Match the extracted clues of one orientation to the answers of the grid by their number.
 
+    Args:
+        clues (list[ExtractedClueFormat]): The extracted clues.
+        orientation (Literal["across", "down"]): The orientation.
+        numbers (list[int]): The numbers of the answers of that orientation, in grid order.
 
-async def construct_from_image(image: PILImage, grid_structure: str) -> MiniCrossword:
+    Returns:
+        list[str]: The clue of every answer.
+    """
+    by_number = {clue.number: clue.clue for clue in clues if clue.orientation == orientation}
+    missing = [number for number in numbers if number not in by_number]
+    if missing:
+        raise ValueError(f"No {orientation} clue was extracted for the numbers {missing}.")
+    return [by_number[number] for number in numbers]
+
+
+async def construct_from_image(
+    image: PILImage.Image,
+    grid_structure: str,
+    width: int = None,
+    crop: tuple[float, float, float, float] = None,
+    max_side: int = MAX_IMAGE_SIDE,
+) -> MiniCrossword:
     """Construct a crossword puzzle from an image.
 
+    The answers, their numbers and their lengths are derived from the grid structure, so the model only has to read
+    the clue of every number.
+
+    Args:
+        image (PILImage.Image): The image to analyze.
+        grid_structure (str): The squares of the grid, see `parse_grid_structure`.
+        width (int, optional): The number of columns of a rectangular grid given without row separators. Defaults to
+            None.
+        crop (tuple[float, float, float, float], optional): The box of the clues in the image, see `prepare_image`.
+            Defaults to None.
+        max_side (int, optional): The maximum width and height of the image sent to the model in pixels. Defaults to
+            `MAX_IMAGE_SIDE`.
+
+    Returns:
+        MiniCrossword: The constructed crossword puzzle.
+    """
+    return await construct_from_prepared_image(prepare_image(image, crop, max_side), grid_structure, width=width)
+
+
+async def construct_from_prepared_image(image: PILImage.Image, grid_structure: str, width: int = None) -> MiniCrossword:
+    """Construct a crossword puzzle from an image already prepared with `prepare_image`, see `construct_from_image`.
+
     Args:
-        image (Image): The image to analyze.
+        image (PILImage.Image): The prepared image, sent to the model as is.
+        grid_structure (str): The squares of the grid, see `parse_grid_structure`.
+        width (int, optional): The number of columns of a rectangular grid given without row separators. Defaults to
+            None.
 
     Returns:
         MiniCrossword: The constructed crossword puzzle.
     """
+    grid = parse_grid_structure(grid_structure, width=width)
+    across_slots, down_slots = get_clue_slots(grid)
+    across_numbers, down_numbers = get_clue_numbers(grid)
+
+    clues = await extract_clues_from_image(image, across_numbers, down_numbers)
+    across_clues = match_clues(clues, "across", across_numbers)
+    down_clues = match_clues(clues, "down", down_numbers)
 
-    clues = await extract_clues_from_image(image)
-    across_clues = [clue for clue in clues if clue.orientation == "across"]
-    down_clues = [clue for clue in clues if clue.orientation == "down"]
-
-    grid_size = int(sqrt(len(grid_structure)))
-    grid = [grid_structure[i * grid_size : (i + 1) * grid_size] for i in range(grid_size)]
-
-    crossword = MiniCrossword(grid=grid, across=[], down=[])
-
-    current_across_clue_idx = 0
-    current_down_clue_idx = 0
-    for i in range(grid_size):
-        for j in range(grid_size):
-            if grid[i][j] == "#":
-                continue
-
-            if j == 0 or grid[i][j - 1] == "#":  # Potential start of an across clue
-                length_across = 0
-                while j + length_across < grid_size and grid[i][j + length_across] != "#":
-                    length_across += 1
-                if length_across > 2:  # Minimum length of a word is 3
-                    crossword.across.append(
-                        Clue(
-                            position=(i, j),
-                            clue=across_clues[current_across_clue_idx].clue,
-                            length=length_across,
-                        )
-                    )
-                    current_across_clue_idx += 1
-
-            if i == 0 or grid[i - 1][j] == "#":  # Potential start of a down clue
-                length_down = 0
-                while i + length_down < grid_size and grid[i + length_down][j] != "#":
-                    length_down += 1
-                if length_down > 2:  # Minimum length of a word is 3
-                    crossword.down.append(
-                        Clue(
-                            position=(i, j),
-                            clue=down_clues[current_down_clue_idx].clue,
-                            length=length_down,
-                        )
-                    )
-                    current_down_clue_idx += 1
-
-    return crossword
+    across = [
+        Clue(position=position, clue=clue, length=length)
+        for (position, length), clue in zip(across_slots, across_clues)
+    ]
+    down = [
+        Clue(position=position, clue=clue, length=length) for (position, length), clue in zip(down_slots, down_clues)
+    ]
+
+    # Clues are collected before constructing the crossword since its crossing table assumes a fixed layout.
+    return MiniCrossword(grid=grid, across=across, down=down)
+
+
+def parse_crop(crop: str) -> tuple[float, float, float, float]:
+    """Parse a crop box given as `left,top,right,bottom` fractions."""
+    box = tuple(float(edge) for edge in crop.split(","))
+    if len(box) != 4:
+        raise argparse.ArgumentTypeError(f"Expected left,top,right,bottom fractions, got {crop!r}.")
+    return box
+
+
+def add_image_arguments(parser: argparse.ArgumentParser):
+    """Add the arguments for preparing images to a parser."""
+    parser.add_argument(
+        "--crop",
+        type=parse_crop,
+        default=None,
+        help="The box of the clues in the image as left,top,right,bottom fractions, e.g. 0.5,0,1,1 for the right half.",
+    )
+    parser.add_argument(
+        "--max_side",
+        type=int,
+        default=MAX_IMAGE_SIDE,
+        help="The maximum width and height in pixels of the image sent to the model.",
+    )
 
 
 if __name__ == "__main__":
@@ -120,10 +171,14 @@ if __name__ == "__main__":
         type=str,
         help=(
             """Structure of the crossword grid as a string. Left to right, top to bottom."""
-            """Use '#' for black squares and _ for white squares."""
+            """Use '#' for black squares and _ for white squares. Rows may be separated by '/'."""
         ),
     )
+    parser.add_argument(
+        "--width", type=int, default=None, help="The number of columns of a rectangular grid without row separators."
+    )
     parser.add_argument("output_path", type=str, help="Path to save the constructed crossword puzzle.")
+    add_image_arguments(parser)
     args = parser.parse_args()
 
     image_path = Path(args.image_path)
@@ -131,7 +186,9 @@ if __name__ == "__main__":
     output_path = output_path / f"{image_path.stem}.json"
 
     image = PILImage.open(str(image_path))
-    crossword = asyncio.run(construct_from_image(image, args.grid_structure))
+    crossword = asyncio.run(
+        construct_from_image(image, args.grid_structure, width=args.width, crop=args.crop, max_side=args.max_side)
+    )
     crossword = crossword.model_dump()
     with open(output_path, "w") as f:
         json.dump(crossword, f, indent=4)
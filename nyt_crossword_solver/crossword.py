@@ -1,8 +1,23 @@
-from typing import Literal, Optional
+import math
+import re
+from functools import cache, cached_property
+from typing import Literal, NamedTuple, Optional
 
 from pydantic import BaseModel
 
 
+def filter_invalid_characters(answer: str) -> str:
+    """Filter out invalid characters from a candidate answer.
+
+    Args:
+        answer (str): The candidate answer.
+
+    Returns:
+        str: The filtered candidate answer.
+    """
+    return "".join(char.upper() for char in answer if char.isalpha())
+
+
 class Clue(BaseModel):
     position: tuple[int, int]
     clue: str
@@ -11,11 +26,60 @@ class Clue(BaseModel):
     consistency_score: Optional[float] = None
 
 
+class Crossing(NamedTuple):
+    cell: tuple[int, int]
+    across_idx: int
+    across_pos: int
+    down_idx: int
+    down_pos: int
+
+
 class MiniCrossword(BaseModel):
     grid: list[str]
     across: list[Clue]
     down: list[Clue]
 
+    @cached_property
+    def crossings(self) -> tuple[Crossing, ...]:
+        """
+        Get the cells shared by an across and a down clue. Computed once; the grid and the clue positions and lengths
+        must not change afterwards.
+
+        Returns:
+            tuple[Crossing, ...]: The crossings in grid order.
+        """
+        across_cells = {}
+        for across_idx, clue in enumerate(self.across):
+            for across_pos, cell in enumerate(get_spanning_cells(clue, "across")):
+                across_cells[cell] = (across_idx, across_pos)
+        crossings = []
+        for down_idx, clue in enumerate(self.down):
+            for down_pos, cell in enumerate(get_spanning_cells(clue, "down")):
+                if cell in across_cells:
+                    crossings.append(Crossing(cell, *across_cells[cell], down_idx, down_pos))
+        return tuple(sorted(crossings))
+
+    @cached_property
+    def clue_crossings(self) -> dict[str, tuple[tuple[tuple[int, int, int], ...], ...]]:
+        """
+        Get the crossings of every clue, indexed by orientation and clue index.
+
+        Returns:
+            dict[str, tuple[tuple[tuple[int, int, int], ...], ...]]: For each orientation, a tuple with one entry per
+                clue. Each entry contains the position of the crossing cell in the clue, the position of the crossing
+                cell in the crossing clue, and the index of the crossing clue, ordered by the index of the crossing
+                clue.
+        """
+        across = [[] for _ in self.across]
+        down = [[] for _ in self.down]
+        for crossing in self.crossings:
+            across[crossing.across_idx].append((crossing.across_pos, crossing.down_pos, crossing.down_idx))
+            down[crossing.down_idx].append((crossing.down_pos, crossing.across_pos, crossing.across_idx))
+        return {
+            "across": tuple(tuple(sorted(entries, key=lambda entry: entry[2])) for entries in across),
+            "down": tuple(tuple(sorted(entries, key=lambda entry: entry[2])) for entries in down),
+        }
+
 
 def get_spanning_cells(clue: Clue, orientation: Literal["across", "down"]) -> list[tuple[int, int]]:
     """
@@ -34,6 +98,93 @@ def get_spanning_cells(clue: Clue, orientation: Literal["across", "down"]) -> li
         return [(clue.position[0] + i, clue.position[1]) for i in range(clue.length)]
 
 
+def fill_grid(crossword: MiniCrossword) -> list[str]:
+    """
+    Write the answers of a crossword into its grid.
+
+    Args:
+        crossword (MiniCrossword): The crossword puzzle, with answers.
+
+    Returns:
+        list[str]: The rows of the grid, with the letters of the answers in their squares. Squares of clues without
+            an answer keep their character, and where a crossing across and down answer disagree the across answer
+            wins.
+    """
+    rows = [list(row) for row in crossword.grid]
+    for orientation in ("down", "across"):
+        for clue in getattr(crossword, orientation):
+            for (i, j), letter in zip(get_spanning_cells(clue, orientation), clue.answer or ""):
+                rows[i][j] = letter
+    return ["".join(row) for row in rows]
+
+
+def parse_grid_structure(grid_structure: str, width: Optional[int] = None) -> list[str]:
+    """
+    Split a grid structure string into the rows of the grid.
+
+    Args:
+        grid_structure (str): The squares of the grid, left to right and top to bottom, with `#` for black squares
+            and `_` for empty squares. Rows may be separated by `/`, commas or whitespace.
+        width (Optional[int], optional): The number of columns, for a structure without row separators. Defaults to
+            None, in which case such a structure must be a square grid.
+
+    Returns:
+        list[str]: The rows of the grid.
+    """
+    rows = [row for row in re.split(r"[/,\s]+", grid_structure) if row]
+    if len(rows) == 1:
+        squares = rows[0]
+        if width is None:
+            width = math.isqrt(len(squares))
+            if width * width != len(squares):
+                raise ValueError(f"A grid of {len(squares)} squares is not square; give its width.")
+        if width <= 0 or len(squares) % width:
+            raise ValueError(f"A grid of {len(squares)} squares cannot have {width} columns.")
+        rows = [squares[i : i + width] for i in range(0, len(squares), width)]
+    if len({len(row) for row in rows}) > 1:
+        raise ValueError("The rows of the grid have different lengths.")
+    return rows
+
+
+MIN_ANSWER_LENGTH = 3
+_ANSWER_RUN = re.compile(f"[^#]{{{MIN_ANSWER_LENGTH},}}")
+
+
+def get_clue_slots(grid: list[str]) -> tuple[list[tuple[tuple[int, int], int]], list[tuple[tuple[int, int], int]]]:
+    """
+    Find the answers of a grid, i.e. the runs of at least 3 empty squares.
+
+    Args:
+        grid (list[str]): The rows of the grid, with `#` for black squares.
+
+    Returns:
+        tuple[list[tuple[tuple[int, int], int]], list[tuple[tuple[int, int], int]]]: The position and length of the
+            across and the down answers, in grid order.
+    """
+    across = [((i, run.start()), len(run[0])) for i, row in enumerate(grid) for run in _ANSWER_RUN.finditer(row)]
+    columns = ["".join(column) for column in zip(*grid)]
+    down = [((run.start(), j), len(run[0])) for j, column in enumerate(columns) for run in _ANSWER_RUN.finditer(column)]
+    return across, sorted(down)
+
+
+def get_clue_numbers(grid: list[str]) -> tuple[list[int], list[int]]:
+    """
+    Number the answers of a grid like a printed crossword: the squares where an answer starts are numbered from 1 in
+    grid order, and an across and a down answer starting on the same square share its number.
+
+    Args:
+        grid (list[str]): The rows of the grid, with `#` for black squares.
+
+    Returns:
+        tuple[list[int], list[int]]: The numbers of the across and the down answers, in the order of
+            `get_clue_slots`.
+    """
+    across, down = get_clue_slots(grid)
+    starts = sorted({position for position, _ in across + down})
+    numbers = {position: number for number, position in enumerate(starts, start=1)}
+    return [numbers[position] for position, _ in across], [numbers[position] for position, _ in down]
+
+
 def get_intersecting_clues(crossword: MiniCrossword, orientation: str, idx: int) -> list[tuple[int, int, Clue]]:
     """
     Get the intersecting clues of the answer at a given position.
@@ -48,19 +199,30 @@ def get_intersecting_clues(crossword: MiniCrossword, orientation: str, idx: int)
             intersecting cell in the answer, the position of the intersecting cell in the intersecting clue, and
             the intersecting clue.
     """
-    other_orientation = "across" if orientation == "down" else "down"
-    candidate_clue: Clue = getattr(crossword, orientation)[idx]
-    candidate_spanning_cells = get_spanning_cells(candidate_clue, orientation)
-    intersecting_clues = []
-    for other_clue in getattr(crossword, other_orientation):
-        other_spanning_cells = get_spanning_cells(other_clue, other_orientation)
-        for pos, cell in enumerate(candidate_spanning_cells):
-            try:
-                other_idx = other_spanning_cells.index(cell)
-                intersecting_clues.append((pos, other_idx, other_clue))
-            except ValueError:
-                pass
-    return intersecting_clues
+    other_clues = crossword.down if orientation == "across" else crossword.across
+    return [
+        (pos, other_pos, other_clues[other_idx])
+        for pos, other_pos, other_idx in crossword.clue_crossings[orientation][idx]
+    ]
+
+
+@cache
+def clue_score(num_matches: int, length: int) -> float:
+    """
+    Calculate the consistency score of an answer of the correct length from its number of matching crossings.
+
+    Args:
+        num_matches (int): The number of crossing cells where the answer agrees with the crossing answer.
+        length (int): The length of the clue.
+
+    Returns:
+        float: The consistency score of the answer.
+    """
+    score = 0
+    delta = 1 / length
+    for _ in range(num_matches):
+        score += delta
+    return round(score, 2)
 
 
 def consistency_score(crossword: MiniCrossword, orientation: str, idx: int) -> float:
@@ -75,17 +237,52 @@ def consistency_score(crossword: MiniCrossword, orientation: str, idx: int) -> f
     Returns:
         float: The consistency score of the answer.
     """
-    score = 0
     candidate_clue: Clue = getattr(crossword, orientation)[idx]
     candidate_answer = candidate_clue.answer
     if len(candidate_answer) != candidate_clue.length:
-            return 0
-    delta = 1 / candidate_clue.length
-    intersecting_clues = get_intersecting_clues(crossword, orientation, idx)
-    for pos, other_pos, other_clue in intersecting_clues:
-            try:
-                if candidate_answer[pos] == other_clue.answer[other_pos]:
-                    score += delta
-            except IndexError:  # Answer is too short
-                pass
-    return round(score, 2)
+        return 0
+    other_clues = crossword.down if orientation == "across" else crossword.across
+    num_matches = 0
+    for pos, other_pos, other_idx in crossword.clue_crossings[orientation][idx]:
+        other_answer = other_clues[other_idx].answer
+        if other_pos < len(other_answer) and candidate_answer[pos] == other_answer[other_pos]:
+            num_matches += 1
+    return clue_score(num_matches, candidate_clue.length)
+
+
+def score_assignment(
+    crossword: MiniCrossword, across_answers: list[str], down_answers: list[str]
+) -> tuple[list[float], list[float]]:
+    """
+    Calculate the consistency scores of all answers in a single pass over the crossings.
+
+    Args:
+        crossword (MiniCrossword): The crossword puzzle.
+        across_answers (list[str]): The answers to the across clues.
+        down_answers (list[str]): The answers to the down clues.
+
+    Returns:
+        tuple[list[float], list[float]]: The consistency scores of the across and down answers, equal to
+            `consistency_score` of each answer.
+    """
+    across_matches = [0] * len(across_answers)
+    down_matches = [0] * len(down_answers)
+    for _, across_idx, across_pos, down_idx, down_pos in crossword.crossings:
+        across_answer = across_answers[across_idx]
+        down_answer = down_answers[down_idx]
+        if (
+            across_pos < len(across_answer)
+            and down_pos < len(down_answer)
+            and across_answer[across_pos] == down_answer[down_pos]
+        ):
+            across_matches[across_idx] += 1
+            down_matches[down_idx] += 1
+    across_scores = [
+        clue_score(matches, clue.length) if len(answer) == clue.length else 0
+        for clue, answer, matches in zip(crossword.across, across_answers, across_matches)
+    ]
+    down_scores = [
+        clue_score(matches, clue.length) if len(answer) == clue.length else 0
+        for clue, answer, matches in zip(crossword.down, down_answers, down_matches)
+    ]
+    return across_scores, down_scores
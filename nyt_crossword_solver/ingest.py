@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import traceback
+from pathlib import Path
+
+from PIL import Image as PILImage
+from tqdm import tqdm
+
+from nyt_crossword_solver.construct_crossword import (
+    MAX_IMAGE_SIDE,
+    add_image_arguments,
+    construct_from_prepared_image,
+    prepare_image,
+)
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+# Maps the content hash of every ingested image to the name of its puzzle file. Hidden and without a `.json` suffix,
+# since the readers of the output directory take every `*.json` file in it for a puzzle.
+INGESTED_FILE = ".ingested"
+
+
+def find_images(inputs: list[str]) -> list[Path]:
+    """Find the images given as paths or directories.
+
+    Args:
+        inputs (list[str]): The image files or directories containing them.
+
+    Returns:
+        list[Path]: The sorted image paths, without duplicates.
+    """
+    paths = set()
+    for name in inputs:
+        path = Path(name)
+        if path.is_dir():
+            paths.update(child for child in path.iterdir() if child.suffix.lower() in IMAGE_SUFFIXES)
+        else:
+            paths.add(path)
+    return sorted(paths)
+
+
+def content_hash(path: Path) -> str:
+    """Hash the content of a file, so that a renamed copy of an image is recognized."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def load_ingested(output_dir: Path) -> dict[str, str]:
+    """Load the content hashes of the images already ingested into a directory, with the names of their puzzles.
+
+    Args:
+        output_dir (Path): The directory of the puzzle files.
+
+    Returns:
+        dict[str, str]: The name of the puzzle file of every content hash whose puzzle file still exists.
+    """
+    path = output_dir / INGESTED_FILE
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        ingested = json.load(f)
+    return {digest: name for digest, name in ingested.items() if (output_dir / name).exists()}
+
+
+def save_ingested(output_dir: Path, ingested: dict[str, str]):
+    """Save the content hashes of the ingested images, replacing the file at once so that it is never left partial."""
+    path = output_dir / INGESTED_FILE
+    temporary_path = path.with_suffix(".tmp")
+    with open(temporary_path, "w") as f:
+        json.dump(ingested, f, indent=4, sort_keys=True)
+    os.replace(temporary_path, path)
+
+
+async def ingest_image(
+    path: Path,
+    grid_structure: str,
+    output_dir: Path,
+    semaphore: asyncio.Semaphore,
+    crop: tuple[float, float, float, float] = None,
+    max_side: int = MAX_IMAGE_SIDE,
+) -> dict:
+    """Construct the puzzle of an image and save it as `<image name>.json`, catching errors so that one failure does
+    not stop the batch.
+
+    Args:
+        path (Path): The path to the image.
+        grid_structure (str): The squares of the grid, see `parse_grid_structure`.
+        output_dir (Path): The directory to save the puzzle to.
+        semaphore (asyncio.Semaphore): Limits the number of images processed at once.
+        crop (tuple[float, float, float, float], optional): The box of the clues in the image, see `prepare_image`.
+            Defaults to None.
+        max_side (int, optional): The maximum width and height of the image sent to the model in pixels. Defaults to
+            `MAX_IMAGE_SIDE`.
+
+    Returns:
+        dict: The record of the image, with the path of its puzzle file or the error.
+    """
+    result = {"image": str(path), "puzzle": None, "error": None}
+    async with semaphore:
+        try:
+            # Decoding and scaling an image takes long enough to hold up the requests of the other images, so it is
+            # done once, in a thread.
+            image = await asyncio.to_thread(lambda: prepare_image(PILImage.open(path), crop, max_side))
+            crossword = await construct_from_prepared_image(image, grid_structure)
+            output_path = output_dir / f"{path.stem}.json"
+            with open(output_path, "w") as f:
+                json.dump(crossword.model_dump(), f, indent=4)
+            result["puzzle"] = str(output_path)
+        except Exception as error:
+            result["error"] = "".join(traceback.format_exception_only(error)).strip()
+    return result
+
+
+async def ingest_images(
+    paths: list[Path],
+    grid_structures: dict[str, str],
+    output_dir: Path,
+    max_concurrency: int = 4,
+    crop: tuple[float, float, float, float] = None,
+    max_side: int = MAX_IMAGE_SIDE,
+) -> dict[str, int]:
+    """Construct the puzzles of many images concurrently, skipping the images that were already ingested.
+
+    An image is skipped if an image with the same content was ingested into `output_dir` before (under any name) or
+    earlier in the same batch. The content hashes are recorded in `INGESTED_FILE` as puzzles are saved, so an
+    interrupted batch resumes where it stopped.
+
+    Args:
+        paths (list[Path]): The paths to the images.
+        grid_structures (dict[str, str]): The grid structure of every image, keyed by the image name without
+            extension, see `parse_grid_structure`.
+        output_dir (Path): The directory to save the puzzles to.
+        max_concurrency (int, optional): The maximum number of images processed at once. Defaults to 4.
+        crop (tuple[float, float, float, float], optional): The box of the clues in the images, see `prepare_image`.
+            Defaults to None.
+        max_side (int, optional): The maximum width and height of the images sent to the model in pixels. Defaults
+            to `MAX_IMAGE_SIDE`.
+
+    Returns:
+        dict[str, int]: The number of images that were ingested, skipped and failed.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    ingested = load_ingested(output_dir)
+    counts = {"ingested": 0, "skipped": 0, "failed": 0}
+    pending = {}
+    for path in paths:
+        if path.stem not in grid_structures:
+            counts["failed"] += 1
+            tqdm.write(f"Failed to ingest {path}: No grid structure given for the image.")
+            continue
+        digest = content_hash(path)
+        if digest in ingested or digest in pending:
+            counts["skipped"] += 1
+        else:
+            pending[digest] = path
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def ingest(digest: str, path: Path) -> tuple[str, dict]:
+        return digest, await ingest_image(path, grid_structures[path.stem], output_dir, semaphore, crop, max_side)
+
+    tasks = [ingest(digest, path) for digest, path in pending.items()]
+    for task in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Ingesting images"):
+        digest, result = await task
+        if result["error"] is None:
+            counts["ingested"] += 1
+            ingested[digest] = Path(result["puzzle"]).name
+            save_ingested(output_dir, ingested)
+        else:
+            counts["failed"] += 1
+            tqdm.write(f"Failed to ingest {result['image']}: {result['error']}")
+    return counts
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Construct the crossword puzzles of a directory of images.")
+    parser.add_argument("inputs", type=str, nargs="+", help="The images or directories containing them.")
+    parser.add_argument(
+        "--grids",
+        type=str,
+        required=True,
+        help=(
+            "A JSON file mapping the name of every image without extension to its grid structure, with '#' for black "
+            "squares, '_' for white squares and rows separated by '/'."
+        ),
+    )
+    parser.add_argument("--output_dir", type=str, default="puzzles/extracted", help="The directory to save puzzles to.")
+    parser.add_argument(
+        "--max_concurrency", type=int, default=4, help="The maximum number of images processed at once."
+    )
+    add_image_arguments(parser)
+
+    args = parser.parse_args()
+
+    paths = find_images(args.inputs)
+    if not paths:
+        parser.error("No images found.")
+    with open(args.grids) as f:
+        grid_structures = json.load(f)
+
+    counts = await ingest_images(
+        paths,
+        grid_structures,
+        Path(args.output_dir),
+        max_concurrency=args.max_concurrency,
+        crop=args.crop,
+        max_side=args.max_side,
+    )
+    print(
+        f"Ingested {counts['ingested']} images, skipped {counts['skipped']} already ingested and "
+        f"{counts['failed']} failed. Puzzles written to {args.output_dir}."
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
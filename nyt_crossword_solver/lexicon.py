@@ -0,0 +1,201 @@
+import argparse
+import json
+import string
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from nyt_crossword_solver.crossword import filter_invalid_characters
+
+WILDCARDS = "?_."
+MANIFEST_FILE = "lexicon.json"
+MAX_FILLS = 5  # Patterns matching more words than this are left to the models, since the lexicon cannot read clues.
+
+
+def read_word_list(path: Path) -> list[tuple[str, float]]:
+    """Read a word list with one word per line, optionally followed by a score after a `;` or a tab.
+
+    Args:
+        path (Path): The path to the word list.
+
+    Returns:
+        list[tuple[str, float]]: The words and their scores. Words without a score get a score of 0.
+    """
+    words = []
+    with open(path) as f:
+        for line in f:
+            word, _, score = line.strip().replace("\t", ";").partition(";")
+            if word:
+                words.append((word, float(score) if score.strip() else 0.0))
+    return words
+
+
+def make_pattern(length: int, intersections: list[tuple[int, str]]) -> str:
+    """Make a lexicon pattern from the known letters of an answer.
+
+    Args:
+        length (int): The length of the answer.
+        intersections (list[tuple[int, str]]): The letters at given positions of the answer.
+
+    Returns:
+        str: The pattern, with `?` at the unknown positions.
+    """
+    pattern = ["?"] * length
+    for pos, letter in intersections:
+        if pos < length:
+            pattern[pos] = letter
+    return "".join(pattern)
+
+
+class Lexicon:
+    """Index of a word list for pattern queries such as `A?P?E`.
+
+    Words are grouped by length and ranked by score. For every length there is a matrix of the words as ASCII codes
+    and a bitset of the words with each letter at each position, so a query is a few ANDs of packed bitsets. The
+    arrays are stored as `.npy` files in a directory and memory-mapped when loaded, so loading is instant and only the
+    pages of the lengths that are queried are read.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        with open(self.directory / MANIFEST_FILE) as f:
+            self.sizes = {int(length): size for length, size in json.load(f)["sizes"].items()}
+        self._words: dict[int, np.ndarray] = {}
+        self._bits: dict[int, np.ndarray] = {}
+
+    @classmethod
+    def build(cls, words: Iterable[str | tuple[str, float]], directory: Path) -> "Lexicon":
+        """Build the index of a word list and save it to a directory.
+
+        Args:
+            words (Iterable[str | tuple[str, float]]): The words, optionally with scores. Words are uppercased and
+                stripped of non-letters, and words with letters outside A-Z are skipped. Duplicates keep their
+                highest score.
+            directory (Path): The directory to save the index to.
+
+        Returns:
+            Lexicon: The loaded index.
+        """
+        scores = {}
+        for word in words:
+            word, score = (word, 0.0) if isinstance(word, str) else word
+            word = filter_invalid_characters(word)
+            if word and all(letter in string.ascii_uppercase for letter in word):
+                scores[word] = max(score, scores.get(word, score))
+
+        by_length: dict[int, list[str]] = {}
+        for word in sorted(scores, key=lambda word: (-scores[word], word)):
+            by_length.setdefault(len(word), []).append(word)
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for length, group in by_length.items():
+            words = np.frombuffer("".join(group).encode("ascii"), dtype=np.uint8).reshape(len(group), length)
+            # Bitsets of the words with each letter at each position, of shape (length, 26, bytes).
+            codes = (words - ord("A")).T
+            bits = np.stack([np.packbits(codes == code, axis=1) for code in range(26)], axis=1)
+            np.save(directory / f"words_{length}.npy", words)
+            np.save(directory / f"bits_{length}.npy", bits)
+        with open(directory / MANIFEST_FILE, "w") as f:
+            json.dump({"sizes": {length: len(group) for length, group in sorted(by_length.items())}}, f)
+        return cls(directory)
+
+    def _index(self, length: int) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        if length not in self.sizes:
+            return None
+        if length not in self._words:
+            self._words[length] = np.load(self.directory / f"words_{length}.npy", mmap_mode="r")
+            self._bits[length] = np.load(self.directory / f"bits_{length}.npy", mmap_mode="r")
+        return self._words[length], self._bits[length]
+
+    def _mask(self, pattern: str) -> Optional[np.ndarray]:
+        """Packed bitset of the words matching a pattern, or None if no word can match."""
+        index = self._index(len(pattern))
+        if index is None:
+            return None
+        bits = index[1]
+        mask = np.full(bits.shape[2], 0xFF, dtype=np.uint8)
+        for pos, letter in enumerate(pattern.upper()):
+            if letter in WILDCARDS:
+                continue
+            if letter not in string.ascii_uppercase:
+                return None
+            mask &= bits[pos, ord(letter) - ord("A")]
+        return mask
+
+    def match(self, pattern: str, limit: Optional[int] = None) -> list[str]:
+        """Find the words matching a pattern, best scored first.
+
+        Args:
+            pattern (str): The pattern, with `?`, `_` or `.` for unknown letters.
+            limit (Optional[int], optional): The maximum number of words to return. Defaults to None.
+
+        Returns:
+            list[str]: The matching words.
+        """
+        mask = self._mask(pattern)
+        if mask is None:
+            return []
+        indices = np.flatnonzero(np.unpackbits(mask, count=self.sizes[len(pattern)]))[:limit]
+        words = self._words[len(pattern)]
+        return [words[i].tobytes().decode("ascii") for i in indices]
+
+    def count(self, pattern: str) -> int:
+        """Count the words matching a pattern.
+
+        Args:
+            pattern (str): The pattern, with `?`, `_` or `.` for unknown letters.
+
+        Returns:
+            int: The number of matching words.
+        """
+        mask = self._mask(pattern)
+        return 0 if mask is None else int(np.unpackbits(mask, count=self.sizes[len(pattern)]).sum())
+
+    def fill(
+        self, length: int, intersections: list[tuple[int, str]], exclude: list[str] = None, max_fills: int = MAX_FILLS
+    ) -> list[str]:
+        """Fill an answer from its known letters, if they narrow the lexicon down to a few words.
+
+        Args:
+            length (int): The length of the answer.
+            intersections (list[tuple[int, str]]): The letters at given positions of the answer.
+            exclude (list[str], optional): The words to leave out, e.g. the existing candidates. Defaults to None.
+            max_fills (int, optional): The maximum number of matching words. Defaults to `MAX_FILLS`.
+
+        Returns:
+            list[str]: The matching words that are not excluded, best scored first, or an empty list if no letter is
+                known or more than `max_fills` words match.
+        """
+        if not intersections:
+            return []
+        pattern = make_pattern(length, intersections)
+        if self.count(pattern) > max_fills:
+            return []
+        exclude = {filter_invalid_characters(word) for word in exclude or []}
+        return [word for word in self.match(pattern) if word not in exclude]
+
+    def __contains__(self, word: str) -> bool:
+        word = filter_invalid_characters(word)
+        return bool(word) and self.count(word) > 0
+
+    def __len__(self) -> int:
+        return sum(self.sizes.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the lexicon index of a word list.")
+    parser.add_argument(
+        "word_list", type=str, help="The word list, with one word per line optionally followed by ';<score>'."
+    )
+    parser.add_argument("output_dir", type=str, help="The directory to save the index to.")
+
+    args = parser.parse_args()
+
+    lexicon = Lexicon.build(read_word_list(Path(args.word_list)), Path(args.output_dir))
+    print(f"Indexed {len(lexicon)} words in {args.output_dir}.")
+
+
+if __name__ == "__main__":
+    main()
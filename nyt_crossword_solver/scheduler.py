@@ -0,0 +1,290 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import random
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional, Sequence, TypeVar
+
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage, ModelInfo, RequestUsage
+from pydantic import BaseModel
+
+from nyt_crossword_solver.tracing import get_metrics, get_tracer, record_usage
+
+T = TypeVar("T")
+
+PRIORITY_IMPROVEMENT = 0  # Calls made while improving a solution, which the solver is waiting on.
+PRIORITY_PREFETCH = 10  # Bulk calls, such as the initial candidates for every clue.
+
+_request_priority = contextvars.ContextVar("request_priority", default=PRIORITY_PREFETCH)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+@contextlib.contextmanager
+def request_priority(priority: int):
+    """Set the priority of the model calls made in the context. Lower values are served first.
+
+    Args:
+        priority (int): The priority, e.g. `PRIORITY_IMPROVEMENT` or `PRIORITY_PREFETCH`.
+    """
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+def get_request_priority() -> int:
+    """Get the priority of the model calls made in the current context."""
+    return _request_priority.get()
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Determine whether a failed model call is worth retrying, i.e. rate limits, timeouts and server errors.
+
+    Args:
+        error (BaseException): The error raised by the model call.
+
+    Returns:
+        bool: Whether to retry the call.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status_code in RETRYABLE_STATUS_CODES:
+        return True
+    # Connection and timeout errors of the OpenAI and Google clients do not carry a status code.
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class ModelLimits(BaseModel):
+    max_concurrency: int = 8
+    requests_per_second: Optional[float] = None
+    burst: int = 1
+
+
+class TokenBucket:
+    """Token bucket that refills at a fixed rate up to its capacity."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class PrioritySemaphore:
+    """Semaphore that wakes up waiters in order of priority, then arrival."""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: int):
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # The slot was handed over just before the cancellation.
+            else:
+                self._waiters = [waiter for waiter in self._waiters if waiter[2] is not future]
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+
+class ModelScheduler:
+    """Shared scheduler for model calls.
+
+    Every model has a concurrency limit, served in order of priority (see `request_priority`), and an optional token
+    bucket limiting the rate of requests. Calls that fail with retryable errors are retried with exponential backoff
+    and full jitter, releasing their slot while they wait.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, ModelLimits] = None,
+        default_limits: ModelLimits = ModelLimits(),
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        retryable: Callable[[BaseException], bool] = is_retryable,
+    ):
+        self.limits = limits or {}
+        self.default_limits = default_limits
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+        self.calls = 0
+        self.retries = 0
+        self._semaphores: dict[str, PrioritySemaphore] = {}
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def _limits(self, model: str) -> ModelLimits:
+        return self.limits.get(model, self.default_limits)
+
+    def _semaphore(self, model: str) -> PrioritySemaphore:
+        if model not in self._semaphores:
+            self._semaphores[model] = PrioritySemaphore(self._limits(model).max_concurrency)
+        return self._semaphores[model]
+
+    def _bucket(self, model: str) -> Optional[TokenBucket]:
+        limits = self._limits(model)
+        if limits.requests_per_second is None:
+            return None
+        if model not in self._buckets:
+            self._buckets[model] = TokenBucket(limits.requests_per_second, limits.burst)
+        return self._buckets[model]
+
+    @contextlib.asynccontextmanager
+    async def slot(self, model: str, priority: Optional[int] = None):
+        """Hold one of the concurrency slots of a model, after waiting for the rate limit.
+
+        Args:
+            model (str): The name of the model.
+            priority (Optional[int], optional): The priority of the call. Defaults to the priority of the context.
+        """
+        semaphore = self._semaphore(model)
+        await semaphore.acquire(get_request_priority() if priority is None else priority)
+        try:
+            bucket = self._bucket(model)
+            if bucket is not None:
+                await bucket.acquire()
+            yield
+        finally:
+            semaphore.release()
+
+    async def submit(self, model: str, call: Callable[[], Awaitable[T]], priority: Optional[int] = None) -> T:
+        """Run a model call within the limits of the model, retrying it on retryable errors.
+
+        Args:
+            model (str): The name of the model.
+            call (Callable[[], Awaitable[T]]): Creates the awaitable making the call. Called once per attempt.
+            priority (Optional[int], optional): The priority of the call. Defaults to the priority of the context.
+
+        Returns:
+            T: The result of the call.
+        """
+        metrics = get_metrics()
+        for attempt in itertools.count():
+            async with self.slot(model, priority):
+                self.calls += 1
+                metrics.increment("model_calls_total", model=model)
+                start = time.perf_counter()
+                try:
+                    return await call()
+                except Exception as error:
+                    metrics.increment("model_errors_total", model=model, error=type(error).__name__)
+                    if attempt >= self.max_retries or not self.retryable(error):
+                        raise
+                finally:
+                    metrics.observe("model_latency_seconds", time.perf_counter() - start, model=model)
+            self.retries += 1
+            metrics.increment("model_retries_total", model=model)
+            await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt)))
+
+
+_scheduler = ModelScheduler()
+
+
+def get_scheduler() -> ModelScheduler:
+    """Get the scheduler shared by all model calls."""
+    return _scheduler
+
+
+def set_scheduler(scheduler: ModelScheduler):
+    """Replace the scheduler shared by all model calls, e.g. to change limits or in tests.
+
+    Args:
+        scheduler (ModelScheduler): The new scheduler.
+    """
+    global _scheduler
+    _scheduler = scheduler
+
+
+class ScheduledChatCompletionClient(ChatCompletionClient):
+    """Chat completion client that routes the calls of another client through a scheduler.
+
+    Args:
+        client (ChatCompletionClient): The client making the calls.
+        model (str): The name of the model whose limits apply.
+        scheduler (ModelScheduler, optional): The scheduler. Defaults to the shared scheduler at the time of each call.
+        name (str, optional): The name of the agent using the client, used to label traces and metrics.
+            Defaults to None.
+    """
+
+    def __init__(self, client: ChatCompletionClient, model: str, scheduler: ModelScheduler = None, name: str = None):
+        self.client = client
+        self.model = model
+        self.scheduler = scheduler
+        self.name = name
+
+    def _scheduler(self) -> ModelScheduler:
+        return self.scheduler or get_scheduler()
+
+    async def create(self, messages: Sequence[LLMMessage], **kwargs: Any) -> CreateResult:
+        with get_tracer().span("model_call", model=self.model, agent=self.name) as span:
+            result = await self._scheduler().submit(self.model, lambda: self.client.create(messages, **kwargs))
+            record_usage(self.model, result.usage.prompt_tokens, result.usage.completion_tokens, agent=self.name)
+            span.set(prompt_tokens=result.usage.prompt_tokens, completion_tokens=result.usage.completion_tokens)
+        return result
+
+    async def create_stream(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> AsyncGenerator[str | CreateResult, None]:
+        # A stream holds its slot until it ends and is not retried, since chunks may already have been consumed.
+        async with self._scheduler().slot(self.model):
+            async for chunk in self.client.create_stream(messages, **kwargs):
+                yield chunk
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    def actual_usage(self) -> RequestUsage:
+        return self.client.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self.client.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], **kwargs: Any) -> int:
+        return self.client.count_tokens(messages, **kwargs)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], **kwargs: Any) -> int:
+        return self.client.remaining_tokens(messages, **kwargs)
+
+    @property
+    def capabilities(self):
+        return self.client.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self.client.model_info
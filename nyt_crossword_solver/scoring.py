@@ -0,0 +1,177 @@
+import math
+import string
+from typing import Sequence
+
+import numpy as np
+
+from nyt_crossword_solver.crossword import MiniCrossword, clue_score, filter_invalid_characters
+
+MAX_LETTERS = 63  # Letter codes must fit in a 64-bit mask, with code 0 reserved for a missing letter.
+
+
+class Alphabet:
+    """Maps letters to small integer codes, starting with A-Z as 1-26."""
+
+    def __init__(self):
+        self.codes = {letter: i + 1 for i, letter in enumerate(string.ascii_uppercase)}
+
+    def code(self, letter: str) -> int:
+        """Get the code of a letter, assigning a new one to letters outside A-Z (e.g. accented letters).
+
+        Args:
+            letter (str): The letter.
+
+        Returns:
+            int: The code of the letter.
+        """
+        if letter not in self.codes:
+            if len(self.codes) == MAX_LETTERS:
+                raise ValueError(f"Candidates use more than {MAX_LETTERS} distinct letters.")
+            self.codes[letter] = len(self.codes) + 1
+        return self.codes[letter]
+
+
+def encode_candidates(candidates: list[str], length: int, alphabet: Alphabet) -> np.ndarray:
+    """Encode a list of candidate answers as a matrix of letter codes.
+
+    Args:
+        candidates (list[str]): The candidate answers, already filtered with `filter_invalid_characters`.
+        length (int): The length of the clue.
+        alphabet (Alphabet): The alphabet used to encode letters.
+
+    Returns:
+        np.ndarray: A uint8 matrix of shape (len(candidates), length). Candidates shorter than the clue are padded
+            with 0 and longer ones are truncated, since only positions within the clue can cross another clue.
+    """
+    codes = np.zeros((len(candidates), length), dtype=np.uint8)
+    for i, candidate in enumerate(candidates):
+        for pos, letter in enumerate(candidate[:length]):
+            codes[i, pos] = alphabet.code(letter)
+    return codes
+
+
+class CrossingScorer:
+    """Vectorized consistency scoring of assignments of candidates to the clues of a crossword.
+
+    Clues are numbered as slots, across clues first. An assignment is an integer array with the index of the chosen
+    candidate of every slot, and a batch of assignments is a matrix with one assignment per row. For every crossing,
+    a boolean agreement matrix records which pairs of candidates of the across and down clue place the same letter
+    in the shared cell, so scoring only needs array indexing.
+    """
+
+    def __init__(self, crossword: MiniCrossword, across_candidates: list[list[str]], down_candidates: list[list[str]]):
+        clues = crossword.across + crossword.down
+        num_across = len(crossword.across)
+        self.crossword = crossword
+        self.num_slots = len(clues)
+        self.lengths = np.array([clue.length for clue in clues], dtype=np.int64)
+
+        self.alphabet = Alphabet()
+        self.candidates = [
+            [filter_invalid_characters(candidate) for candidate in candidates]
+            for candidates in across_candidates + down_candidates
+        ]
+        self.codes = [
+            encode_candidates(candidates, clue.length, self.alphabet)
+            for clue, candidates in zip(clues, self.candidates)
+        ]
+        self.valid = [
+            np.array([len(candidate) == clue.length for candidate in candidates], dtype=bool)
+            for clue, candidates in zip(clues, self.candidates)
+        ]
+
+        # (across slot, across position, down slot, down position) of every crossing.
+        self.crossings = np.array(
+            [
+                (across_idx, across_pos, num_across + down_idx, down_pos)
+                for _, across_idx, across_pos, down_idx, down_pos in crossword.crossings
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 4)
+        self.agreement = [self._agreement(*crossing) for crossing in self.crossings]
+
+        max_length = int(self.lengths.max(initial=0))
+        self.score_tables = np.zeros((self.num_slots, max_length + 1))
+        for slot, length in enumerate(self.lengths):
+            for num_matches in range(length + 1):
+                self.score_tables[slot, num_matches] = clue_score(num_matches, int(length))
+
+    def add_candidates(self, slot: int, candidates: list[str]):
+        """Append candidates to a slot, only recomputing the agreement matrices of the crossings of that slot.
+
+        Args:
+            slot (int): The slot of the clue.
+            candidates (list[str]): The new candidate answers. The indices of the existing candidates do not change.
+        """
+        candidates = [filter_invalid_characters(candidate) for candidate in candidates]
+        length = int(self.lengths[slot])
+        self.candidates[slot].extend(candidates)
+        self.codes[slot] = np.concatenate([self.codes[slot], encode_candidates(candidates, length, self.alphabet)])
+        self.valid[slot] = np.concatenate(
+            [self.valid[slot], np.array([len(candidate) == length for candidate in candidates], dtype=bool)]
+        )
+        for k, crossing in enumerate(self.crossings):
+            if slot in (crossing[0], crossing[2]):
+                self.agreement[k] = self._agreement(*crossing)
+
+    def _agreement(self, across_slot: int, across_pos: int, down_slot: int, down_pos: int) -> np.ndarray:
+        across_letters = self.codes[across_slot][:, across_pos]
+        down_letters = self.codes[down_slot][:, down_pos]
+        return (across_letters[:, None] == down_letters[None, :]) & (across_letters[:, None] != 0)
+
+    def match_counts(self, assignments: np.ndarray) -> np.ndarray:
+        """Count the crossings where each clue agrees with its crossing clue.
+
+        Args:
+            assignments (np.ndarray): A batch of assignments of shape (batch, num_slots).
+
+        Returns:
+            np.ndarray: The number of matching crossings of every slot, of shape (batch, num_slots).
+        """
+        counts = np.zeros(assignments.shape, dtype=np.int64)
+        for (across_slot, _, down_slot, _), agreement in zip(self.crossings, self.agreement):
+            matches = agreement[assignments[:, across_slot], assignments[:, down_slot]]
+            counts[:, across_slot] += matches
+            counts[:, down_slot] += matches
+        return counts
+
+    def score_batch(self, assignments: np.ndarray) -> np.ndarray:
+        """Calculate the consistency score of every clue for a batch of assignments.
+
+        Args:
+            assignments (np.ndarray): A batch of assignments of shape (batch, num_slots).
+
+        Returns:
+            np.ndarray: The consistency scores of shape (batch, num_slots), equal to `consistency_score` of each clue.
+        """
+        assignments = np.asarray(assignments, dtype=np.int64).reshape(-1, self.num_slots)
+        scores = self.score_tables[np.arange(self.num_slots), self.match_counts(assignments)]
+        for slot, valid in enumerate(self.valid):
+            scores[:, slot] *= valid[assignments[:, slot]]
+        return scores
+
+    def score(self, assignment: Sequence[int]) -> np.ndarray:
+        """Calculate the consistency score of every clue for a single assignment.
+
+        Args:
+            assignment (Sequence[int]): The index of the chosen candidate of every slot.
+
+        Returns:
+            np.ndarray: The consistency scores of the slots.
+        """
+        return self.score_batch(np.asarray(assignment).reshape(1, -1))[0]
+
+    def product_blocks(self, block_size: int = 1 << 16):
+        """Enumerate the Cartesian product of the candidate lists in blocks of assignments.
+
+        Args:
+            block_size (int, optional): The maximum number of assignments per block. Defaults to 65536.
+
+        Yields:
+            np.ndarray: Blocks of assignments of shape (batch, num_slots), in the order of `itertools.product`.
+        """
+        sizes = [len(candidates) for candidates in self.candidates]
+        total = math.prod(sizes)
+        for start in range(0, total, block_size):
+            flat = np.arange(start, min(start + block_size, total), dtype=np.int64)
+            yield np.stack(np.unravel_index(flat, sizes), axis=1)
@@ -0,0 +1,820 @@
+import os
+import time
+from concurrent.futures import Executor
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+from nyt_crossword_solver.candidates import candidate_confidences
+from nyt_crossword_solver.crossword import MiniCrossword
+from nyt_crossword_solver.scoring import CrossingScorer
+
+MIN_CONFIDENCE = 1e-6
+NEIGHBORHOOD_SIZE = 8  # Clues re-solved together by the neighborhood search.
+NEIGHBORHOOD_MAX_NODES = 2000  # Per neighborhood, so that one hard neighborhood does not use up the whole budget.
+PARTS_PER_WORKER = 4  # Parts of a parallel search per worker, so that workers that finish early take over others.
+
+
+def _log_likelihoods(confidences: dict[str, float]) -> np.ndarray:
+    return np.log(np.clip(np.fromiter(confidences.values(), dtype=float, count=len(confidences)), MIN_CONFIDENCE, 1))
+
+
+def _concatenate(arrays: list[np.ndarray], dtype: type) -> np.ndarray:
+    return np.concatenate(arrays).astype(dtype) if arrays else np.zeros(0, dtype=dtype)
+
+
+class Solution:
+    """Compact result of a search: the chosen candidate of every slot (across clues first), its consistency scores and
+    the log-likelihood of the chosen candidates under their confidences."""
+
+    __slots__ = ("assignment", "answers", "clue_scores", "score", "log_likelihood")
+
+    def __init__(
+        self,
+        assignment: tuple[int, ...],
+        answers: tuple[str, ...],
+        clue_scores: tuple[float, ...],
+        score: float,
+        log_likelihood: float = 0.0,
+    ):
+        self.assignment = assignment
+        self.answers = answers
+        self.clue_scores = clue_scores
+        self.score = score
+        self.log_likelihood = log_likelihood
+
+
+def build_crossword(crossword: MiniCrossword, solution: Solution) -> MiniCrossword:
+    """Build the crossword for a solution. The given crossword is left untouched.
+
+    Args:
+        crossword (MiniCrossword): The crossword puzzle.
+        solution (Solution): The solution.
+
+    Returns:
+        MiniCrossword: A copy of the crossword with answers and consistency scores filled in.
+    """
+    clues = [
+        clue.model_copy(update={"answer": answer, "consistency_score": score})
+        for clue, answer, score in zip(crossword.across + crossword.down, solution.answers, solution.clue_scores)
+    ]
+    num_across = len(crossword.across)
+    return crossword.model_copy(
+        update={"grid": list(crossword.grid), "across": clues[:num_across], "down": clues[num_across:]}
+    )
+
+
+class CrosswordSearch:
+    """Branch-and-bound search for the assignment of candidates that maximizes the total consistency score.
+
+    Every clue is a variable whose domain is its list of (distinct) candidates. Each node of the search keeps, for
+    every crossing, the set of letters the clue on either side can still place in the shared cell. A candidate can
+    only score a crossing if its letter is supported by the other side, which gives an upper bound on the score of
+    every candidate and therefore of every clue. Candidates that cannot beat the incumbent even with an optimistic
+    completion are removed and the removal is propagated to the crossing clues until a fixpoint is reached
+    (arc consistency), and subtrees whose bound does not beat the incumbent are pruned.
+
+    The candidates of all clues are laid out in one flat array, so a node is a boolean mask of the live candidates and
+    the sets of letters are 64-bit masks. Each propagation step is a handful of NumPy operations over all crossings.
+
+    Candidates can be added between searches with `add_candidates`, which keeps the optimum of the previous search so
+    that the next one only has to explore the assignments using the new candidates.
+    """
+
+    def __init__(
+        self,
+        crossword: MiniCrossword,
+        across_candidates: list[list[str] | dict[str, float]],
+        down_candidates: list[list[str] | dict[str, float]],
+    ):
+        self.crossword = crossword
+        self.nodes = 0
+        self.pruned = 0  # Subtrees whose bound could not beat the incumbent.
+        self.scored = 0  # Full assignments scored.
+        self.complete = False
+        across_confidences = [candidate_confidences(candidates) for candidates in across_candidates]
+        down_confidences = [candidate_confidences(candidates) for candidates in down_candidates]
+        self.scorer = CrossingScorer(
+            crossword,
+            [list(confidences) for confidences in across_confidences],
+            [list(confidences) for confidences in down_confidences],
+        )
+        self._log_likelihoods = [_log_likelihoods(confidences) for confidences in across_confidences + down_confidences]
+        # The crossings of every slot, and the slots crossing it, which do not change when candidates are added.
+        self._slot_crossings = [[] for _ in range(self.scorer.num_slots)]
+        self._neighbors = [[] for _ in range(self.scorer.num_slots)]
+        for k, (across_slot, _, down_slot, _) in enumerate(self.scorer.crossings):
+            self._slot_crossings[across_slot].append(k)
+            self._slot_crossings[down_slot].append(k)
+            self._neighbors[across_slot].append(int(down_slot))
+            self._neighbors[down_slot].append(int(across_slot))
+        self._solution = None
+        self._new_candidates = {}  # Slot -> index of the first candidate added since the last search.
+        self._shared = None  # Best scores of the workers of a parallel search, see `parallel_search`.
+        self._shared_index = 0
+        self._build()
+
+    def _build(self):
+        """Lay out the candidates of all clues in flat arrays."""
+        self._built = True
+        scorer = self.scorer
+        self._num_slots = scorer.num_slots
+
+        sizes = np.array([len(candidates) for candidates in scorer.candidates], dtype=np.int64)
+        self._sizes = sizes
+        self._offsets = np.cumsum(sizes) - sizes
+        self._slot_of = np.repeat(np.arange(self._num_slots), sizes)
+        self._degrees = np.zeros(self._num_slots, dtype=np.int64)
+
+        # Score (in hundredths) of every candidate for every possible number of matching crossings.
+        valid = _concatenate(scorer.valid, bool)
+        self._score_lookup = np.rint(scorer.score_tables[self._slot_of] * 100).astype(np.int64) * valid[:, None]
+
+        # Every crossing has two halves, one per clue. An entry is a candidate of the clue of a half together with the
+        # bit of the letter it places in the crossing cell. The entries of a half are contiguous.
+        entry_values, entry_bits, entry_mirrors, half_starts = [], [], [], []
+        self._halves = [[] for _ in range(self._num_slots)]
+        num_entries = 0
+        for k, (across_slot, across_pos, down_slot, down_pos) in enumerate(scorer.crossings):
+            halves = [(across_slot, across_pos, down_slot, down_pos), (down_slot, down_pos, across_slot, across_pos)]
+            for half, (slot, pos, other_slot, other_pos) in enumerate(halves):
+                letters = scorer.codes[slot][:, pos]
+                half_starts.append(num_entries)
+                num_entries += sizes[slot]
+                entry_values.append(self._offsets[slot] + np.arange(sizes[slot]))
+                entry_bits.append(np.where(letters > 0, np.left_shift(np.uint64(1), letters.astype(np.uint64)), 0))
+                entry_mirrors.append(np.full(sizes[slot], 2 * k + 1 - half))
+                self._halves[slot].append((letters, other_slot, scorer.codes[other_slot][:, other_pos]))
+                self._degrees[slot] += 1
+        self._entry_values = _concatenate(entry_values, np.int64)
+        self._entry_bits = _concatenate(entry_bits, np.uint64)
+        self._entry_mirrors = _concatenate(entry_mirrors, np.int64)
+        self._half_starts = np.array(half_starts, dtype=np.int64)
+
+    def add_candidates(self, slot: int, candidates: list[str] | dict[str, float]) -> int:
+        """Add candidates to a clue. The next search only explores the assignments that use one of them.
+
+        Args:
+            slot (int): The slot of the clue, counting across clues first.
+            candidates (list[str] | dict[str, float]): The new candidate answers, optionally with their confidence.
+                Candidates the clue already has are ignored.
+
+        Returns:
+            int: The number of candidates added.
+        """
+        existing = set(self.scorer.candidates[slot])
+        candidates = {
+            candidate: confidence
+            for candidate, confidence in candidate_confidences(candidates).items()
+            if candidate not in existing
+        }
+        if candidates:
+            self._new_candidates.setdefault(slot, len(self.scorer.candidates[slot]))
+            self.scorer.add_candidates(slot, list(candidates))
+            self._log_likelihoods[slot] = np.concatenate([self._log_likelihoods[slot], _log_likelihoods(candidates)])
+            # Laid out again by the next search, so that adding to many clues one at a time lays them out once.
+            self._built = False
+        return len(candidates)
+
+    def _ensure_built(self):
+        """Lay out the candidates again if candidates were added since they were last laid out."""
+        if not self._built:
+            self._build()
+
+    def _domain(self, alive: np.ndarray, slot: int) -> np.ndarray:
+        """View of the mask of live candidates of a slot."""
+        return alive[self._offsets[slot] : self._offsets[slot] + self._sizes[slot]]
+
+    def _propagate(self, alive: np.ndarray, best: int) -> Optional[tuple[np.ndarray, np.ndarray, int]]:
+        """Prune the live candidates against the incumbent until no more candidates can be removed.
+
+        Args:
+            alive (np.ndarray): The mask of live candidates. Not modified.
+            best (int): The score to beat.
+
+        Returns:
+            Optional[tuple[np.ndarray, np.ndarray, int]]: The pruned mask of live candidates, the upper bound on the
+                score of every candidate and the total upper bound, or None if the node cannot beat the incumbent.
+        """
+        num_values = len(alive)
+        while True:
+            if len(self._half_starts):
+                live_bits = np.where(alive[self._entry_values], self._entry_bits, np.uint64(0))
+                masks = np.bitwise_or.reduceat(live_bits, self._half_starts)
+                supported = (self._entry_bits & masks[self._entry_mirrors]) != 0
+                counts = np.bincount(self._entry_values, weights=supported, minlength=num_values).astype(np.int64)
+            else:
+                counts = np.zeros(num_values, dtype=np.int64)
+            scores = self._score_lookup[np.arange(num_values), counts]
+            upper_bounds = np.maximum.reduceat(np.where(alive, scores, -1), self._offsets)
+            if upper_bounds.min(initial=0) < 0:
+                self.pruned += 1
+                return None
+            total = int(upper_bounds.sum())
+            if total <= best:
+                self.pruned += 1
+                return None
+
+            thresholds = best - total + upper_bounds
+            kept = alive & (scores > thresholds[self._slot_of])
+            if np.array_equal(kept, alive):
+                return alive, scores, total
+            alive = kept
+
+    def _support(self, alive: np.ndarray, slot: int) -> np.ndarray:
+        """Fraction of the live crossing candidates that agree with each candidate of a slot, summed over crossings."""
+        support = np.zeros(self._sizes[slot])
+        for letters, other_slot, other_letters in self._halves[slot]:
+            other_alive = self._domain(alive, other_slot)
+            histogram = np.bincount(other_letters[other_alive], minlength=256).astype(float)
+            histogram[0] = 0  # Missing letters never agree.
+            support += histogram[letters] / max(other_alive.sum(), 1)
+        return support
+
+    def _evaluate(self, assignments: np.ndarray) -> np.ndarray:
+        """Exact scores (in hundredths) of a batch of full assignments."""
+        self.scored += len(assignments)
+        counts = self.scorer.match_counts(assignments)
+        return self._score_lookup[self._offsets + assignments, counts].sum(axis=1)
+
+    def _local_search(self, assignment: np.ndarray) -> tuple[np.ndarray, int]:
+        """Improve an assignment by changing one clue at a time until no single change increases the score."""
+        score = int(self._evaluate(assignment[None, :])[0])
+        improved = True
+        while improved:
+            improved = False
+            for slot in range(self._num_slots):
+                trials = np.tile(assignment, (self._sizes[slot], 1))
+                trials[:, slot] = np.arange(self._sizes[slot])
+                trial_scores = self._evaluate(trials)
+                best_trial = int(trial_scores.argmax())
+                if trial_scores[best_trial] > score:
+                    assignment, score = trials[best_trial], int(trial_scores[best_trial])
+                    improved = True
+        return assignment, score
+
+    def _check_budget(self):
+        self.nodes += 1
+        if self._max_nodes is not None and self.nodes > self._max_nodes:
+            raise TimeoutError(f"Search exceeded the node budget of {self._max_nodes} nodes.")
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise TimeoutError(f"Search exceeded the time budget of {self._time_limit} seconds.")
+
+    def _incumbent(self) -> int:
+        """The score to beat, which in a parallel search is the best score found by any worker."""
+        if self._shared is None:
+            return self._best_score
+        return max(self._best_score, int(self._shared.max()))
+
+    def _search(self, alive: np.ndarray):
+        self._check_budget()
+        result = self._propagate(alive, self._incumbent())
+        if result is None:
+            return
+        alive, scores, total = result
+
+        domain_sizes = np.add.reduceat(alive, self._offsets)
+        open_slots = np.flatnonzero(domain_sizes > 1)
+        if not len(open_slots):
+            self._best_score = total
+            self._best_assignment = np.flatnonzero(alive) - self._offsets
+            if self._shared is not None:
+                self._shared[self._shared_index] = total
+            return
+
+        # Branch on the most constrained slot, trying first the candidates with the best bound and, among those, the
+        # ones that agree with the most crossing candidates.
+        slot = int(open_slots[np.lexsort((-self._degrees[open_slots], domain_sizes[open_slots]))[0]])
+        values = np.flatnonzero(self._domain(alive, slot))
+        order = np.lexsort((-self._support(alive, slot)[values], -scores[self._offsets[slot] + values]))
+        for value in self._offsets[slot] + values[order]:
+            if not alive[value]:
+                continue
+            child = alive.copy()
+            self._domain(child, slot)[:] = False
+            child[value] = True
+            self._search(child)
+
+            # Continue with the candidate excluded, letting the tighter incumbent prune the rest of the domains.
+            alive = alive.copy()
+            alive[value] = False
+            self._check_budget()
+            result = self._propagate(alive, self._incumbent())
+            if result is None:
+                return
+            alive = result[0]
+
+    def _start(self) -> list[np.ndarray]:
+        """Seed the incumbent and split the space left to search into disjoint regions."""
+        alive = np.ones(int(self._sizes.sum()), dtype=bool)
+        if self.complete:
+            # The previous optimum is still the best assignment that only uses old candidates, so it is enough to
+            # search the assignments that use a new candidate. They are split into disjoint regions, one per clue with
+            # new candidates, where the earlier clues are restricted to their old candidates.
+            regions = []
+            restricted = alive.copy()
+            for slot, start in self._new_candidates.items():
+                region = restricted.copy()
+                self._domain(region, slot)[:start] = False
+                regions.append(region)
+                self._domain(restricted, slot)[start:] = False
+            start = np.array(self._solution.assignment, dtype=np.int64)
+        else:
+            regions = [alive]
+            if self._solution is None:
+                # Seed the incumbent with a local optimum around the best supported candidate of every clue so that
+                # there is always a solution to return and the bound prunes aggressively from the start.
+                start = np.array(
+                    [int(np.argmax(self._support(alive, slot))) for slot in range(self._num_slots)], dtype=np.int64
+                )
+            else:
+                start = np.array(self._solution.assignment, dtype=np.int64)
+        self._new_candidates = {}
+        self._best_assignment, self._best_score = self._local_search(start)
+        return regions
+
+    def search(
+        self, max_nodes: Optional[int] = None, time_limit: Optional[float] = None, anytime: bool = True
+    ) -> Optional[Solution]:
+        """Find the assignment of candidates with the highest total consistency score.
+
+        The search is incremental: if the previous search was complete (see `complete`), only the assignments that use
+        candidates added since then are explored, with the previous optimum as the incumbent. Otherwise the whole space
+        is searched again, starting from the previous best assignment.
+
+        Args:
+            max_nodes (Optional[int], optional): The maximum number of search nodes to explore. Defaults to None.
+            time_limit (Optional[float], optional): The maximum search time in seconds. Defaults to None.
+            anytime (bool, optional): Return the best solution found so far when the budget runs out instead of
+                raising a `TimeoutError`. Defaults to True.
+
+        Returns:
+            Optional[Solution]: The best solution, or None if some clue has no candidates.
+        """
+        self._ensure_built()
+        self.nodes = self.pruned = self.scored = 0
+        if (self._sizes == 0).any():
+            return None
+        if self.complete and not self._new_candidates:
+            return self._solution
+
+        self._max_nodes = max_nodes
+        self._time_limit = time_limit
+        self._deadline = None if time_limit is None else time.perf_counter() + time_limit
+        regions = self._start()
+        try:
+            for region in regions:
+                self._search(region)
+            self.complete = True
+        except TimeoutError:
+            self.complete = False
+            if not anytime:
+                raise
+        self._solution = self._make_solution(self._best_assignment)
+        return self._solution
+
+    def _split(self, regions: list[np.ndarray], num_parts: int) -> list[np.ndarray]:
+        """Split regions into disjoint parts that can beat the incumbent, at least `num_parts` if there are enough.
+
+        The part with the largest space is split on its most constrained clue, one part per candidate, like the first
+        branches of `_search`. The parts are returned by decreasing upper bound, so the most promising ones go first.
+        """
+        parts, leaves = [], []
+        for region in regions:
+            result = self._propagate(region, self._best_score)
+            if result is not None:
+                parts.append((result[2], result[0]))
+        while parts and len(parts) + len(leaves) < num_parts:
+            spaces = [np.log(np.add.reduceat(alive, self._offsets)).sum() for _, alive in parts]
+            bound, alive = parts.pop(int(np.argmax(spaces)))
+            domain_sizes = np.add.reduceat(alive, self._offsets)
+            open_slots = np.flatnonzero(domain_sizes > 1)
+            if not len(open_slots):
+                leaves.append((bound, alive))
+                continue
+            slot = int(open_slots[np.lexsort((-self._degrees[open_slots], domain_sizes[open_slots]))[0]])
+            for value in self._offsets[slot] + np.flatnonzero(self._domain(alive, slot)):
+                child = alive.copy()
+                self._domain(child, slot)[:] = False
+                child[value] = True
+                result = self._propagate(child, self._best_score)
+                if result is not None:
+                    parts.append((result[2], result[0]))
+        parts = sorted(parts + leaves, key=lambda part: -part[0])
+        return [alive for _, alive in parts]
+
+    def _neighborhood(self, seed: int, size: int) -> list[int]:
+        """The slots closest to a slot in the crossing graph, up to a given number, found by breadth-first search."""
+        neighborhood, seen = [seed], {seed}
+        for slot in neighborhood:
+            if len(neighborhood) >= size:
+                break
+            for neighbor in self._neighbors[slot]:
+                if neighbor not in seen and len(neighborhood) < size:
+                    seen.add(neighbor)
+                    neighborhood.append(neighbor)
+        return neighborhood
+
+    def _out_of_budget(self, max_nodes: Optional[int]) -> bool:
+        if max_nodes is not None and self.nodes > max_nodes:
+            return True
+        return self._deadline is not None and time.perf_counter() > self._deadline
+
+    def neighborhood_search(
+        self,
+        neighborhood_size: int = NEIGHBORHOOD_SIZE,
+        max_nodes: Optional[int] = None,
+        time_limit: Optional[float] = None,
+    ) -> Optional[Solution]:
+        """Improve the best known assignment by re-solving small neighborhoods of crossing clues exactly.
+
+        This scales to full-size grids, where the exhaustive `search` cannot finish. A neighborhood is a clue that
+        does not agree with all its crossings together with the clues closest to it. It is searched with the branch and
+        bound of `search` while all other clues keep their candidates, so every improvement is exact within the
+        neighborhood. Clues with candidates added since the last search are tried first. Passes over the inconsistent
+        clues are repeated until none of their neighborhoods can improve the score or the budget runs out. The result
+        is a local optimum, so `complete` is left False.
+
+        Args:
+            neighborhood_size (int, optional): The number of clues re-solved together. Defaults to
+                `NEIGHBORHOOD_SIZE`.
+            max_nodes (Optional[int], optional): The maximum number of search nodes to explore. Defaults to None.
+            time_limit (Optional[float], optional): The maximum search time in seconds. Defaults to None.
+
+        Returns:
+            Optional[Solution]: The best solution found, or None if some clue has no candidates.
+        """
+        self._ensure_built()
+        self.nodes = self.pruned = self.scored = 0
+        if (self._sizes == 0).any():
+            return None
+        self._time_limit = time_limit
+        self._deadline = None if time_limit is None else time.perf_counter() + time_limit
+        if self._solution is None:
+            alive = np.ones(int(self._sizes.sum()), dtype=bool)
+            start = np.array(
+                [int(np.argmax(self._support(alive, slot))) for slot in range(self._num_slots)], dtype=np.int64
+            )
+        else:
+            start = np.array(self._solution.assignment, dtype=np.int64)
+        new_slots = list(self._new_candidates)
+        self._new_candidates = {}
+        self.complete = False
+        self._best_assignment, self._best_score = self._local_search(start)
+
+        # Neighborhoods that cannot improve, with the slots whose change would make them worth searching again.
+        searched: dict[frozenset[int], set[int]] = {}
+        improved = True
+        while improved and not self._out_of_budget(max_nodes):
+            improved = False
+            scores = self.scorer.score(self._best_assignment)
+            seeds = new_slots + [int(slot) for slot in np.argsort(scores, kind="stable") if scores[slot] < 1]
+            new_slots = []
+            for seed in seeds:
+                neighborhood = frozenset(self._neighborhood(seed, neighborhood_size))
+                if neighborhood in searched:
+                    continue
+                previous = self._best_assignment
+                region = np.zeros(int(self._sizes.sum()), dtype=bool)
+                region[self._offsets + previous] = True
+                for slot in neighborhood:
+                    self._domain(region, slot)[:] = True
+                self._max_nodes = self.nodes + NEIGHBORHOOD_MAX_NODES
+                if max_nodes is not None:
+                    self._max_nodes = min(self._max_nodes, max_nodes)
+                try:
+                    self._search(region)
+                    searched[neighborhood] = neighborhood.union(*(self._neighbors[slot] for slot in neighborhood))
+                except TimeoutError:
+                    if self._out_of_budget(max_nodes):
+                        break
+                changed = set(np.flatnonzero(self._best_assignment != previous).tolist())
+                if changed:
+                    improved = True
+                    searched = {key: closure for key, closure in searched.items() if not closure & changed}
+        self._solution = self._make_solution(self._best_assignment)
+        return self._solution
+
+    def _make_solution(self, assignment: np.ndarray) -> Solution:
+        assignment = tuple(int(value) for value in assignment)
+        answers = tuple(candidates[value] for candidates, value in zip(self.scorer.candidates, assignment))
+        return Solution(
+            assignment,
+            answers,
+            tuple(self.scorer.score(assignment).tolist()),
+            int(self._evaluate(np.array([assignment], dtype=np.int64))[0]) / 100,
+            float(sum(log_likelihoods[value] for log_likelihoods, value in zip(self._log_likelihoods, assignment))),
+        )
+
+    def _beam_order(self) -> list[int]:
+        """Order the slots so that each one crosses as many earlier slots as possible, most constrained first."""
+        crossed = np.zeros(self._num_slots, dtype=np.int64)  # Number of crossings with the slots already ordered.
+        order, remaining = [], set(range(self._num_slots))
+        while remaining:
+            slot = min(remaining, key=lambda slot: (-crossed[slot], -self._degrees[slot], self._sizes[slot], slot))
+            order.append(slot)
+            remaining.remove(slot)
+            for neighbor in set(self._neighbors[slot]):
+                crossed[neighbor] += 1
+        return order
+
+    def beam_search(self, beam_width: int = 64, top_k: int = 1, confidence_weight: float = 1.0) -> list[Solution]:
+        """Find good assignments with a beam search that combines crossing agreement and candidate confidence.
+
+        Clues are assigned one at a time, each crossing as many assigned clues as possible. A partial assignment is
+        ranked by the consistency score its clues would get if all their open crossings agreed, plus
+        `confidence_weight` times the log-likelihood of its candidates, and only the best `beam_width` are kept. The
+        running time is bounded by the number of clues times the beam width times the number of candidates per clue,
+        whatever the size of the full candidate space. Unlike `search`, the result is not guaranteed to be optimal.
+
+        Args:
+            beam_width (int, optional): The number of partial assignments kept after each clue. Defaults to 64.
+            top_k (int, optional): The number of solutions to return. Defaults to 1.
+            confidence_weight (float, optional): The weight of the log-likelihood relative to the consistency score.
+                Defaults to 1.0.
+
+        Returns:
+            list[Solution]: Up to `top_k` distinct solutions, best first, or an empty list if some clue has no
+                candidates. Ties are broken by the consistency score, then by the order of the candidates.
+        """
+        self._ensure_built()
+        self.nodes = self.pruned = self.scored = 0
+        if (self._sizes == 0).any():
+            return []
+        beam_width = max(beam_width, top_k)
+        crossings = self.scorer.crossings
+        assigned = np.zeros(self._num_slots, dtype=bool)
+        assignments = np.zeros((1, self._num_slots), dtype=np.int64)
+        counts = np.zeros((1, self._num_slots), dtype=np.int64)
+        log_likelihoods = np.zeros(1)
+        for slot in self._beam_order():
+            size, beam = self._sizes[slot], len(assignments)
+            assignments = np.repeat(assignments, size, axis=0)
+            assignments[:, slot] = np.tile(np.arange(size), beam)
+            counts = np.repeat(counts, size, axis=0)
+            log_likelihoods = np.repeat(log_likelihoods, size) + np.tile(self._log_likelihoods[slot], beam)
+            for k in self._slot_crossings[slot]:
+                across_slot, _, down_slot, _ = crossings[k]
+                if assigned[down_slot if across_slot == slot else across_slot]:
+                    matches = self.scorer.agreement[k][assignments[:, across_slot], assignments[:, down_slot]]
+                    counts[:, across_slot] += matches
+                    counts[:, down_slot] += matches
+            assigned[slot] = True
+
+            # Crossings with unassigned clues are counted as agreeing, so the score is exact once all are assigned.
+            open_crossings = np.bincount(crossings[~assigned[crossings[:, 2]], 0], minlength=self._num_slots)
+            open_crossings += np.bincount(crossings[~assigned[crossings[:, 0]], 2], minlength=self._num_slots)
+            slots = np.flatnonzero(assigned)
+            consistency = self._score_lookup[
+                self._offsets[slots] + assignments[:, slots], counts[:, slots] + open_crossings[slots]
+            ].sum(axis=1)
+            values = consistency / 100 + confidence_weight * log_likelihoods
+            self.nodes += len(values)
+            self.pruned += max(len(values) - beam_width, 0)
+            keep = np.lexsort((np.arange(len(values)), -consistency, -values))[:beam_width]
+            assignments, counts, log_likelihoods = assignments[keep], counts[keep], log_likelihoods[keep]
+        return [self._make_solution(assignment) for assignment in assignments[:top_k]]
+
+    def run(
+        self, max_nodes: Optional[int] = None, time_limit: Optional[float] = None, anytime: bool = True
+    ) -> Optional[MiniCrossword]:
+        """Find the crossword with the highest total consistency score. See `search` for the arguments.
+
+        Returns:
+            Optional[MiniCrossword]: The best solution, or None if some clue has no candidates.
+        """
+        solution = self.search(max_nodes=max_nodes, time_limit=time_limit, anytime=anytime)
+        return None if solution is None else build_crossword(self.crossword, solution)
+
+
+def search_solution(
+    crossword: MiniCrossword,
+    across_candidates: list[list[str]],
+    down_candidates: list[list[str]],
+    max_nodes: Optional[int] = None,
+    time_limit: Optional[float] = None,
+    anytime: bool = True,
+) -> Optional[Solution]:
+    """Find the assignment of candidates with the highest total consistency score. Suitable for a process pool.
+
+    Args:
+        crossword (MiniCrossword): The crossword puzzle.
+        across_candidates (list[list[str]]): The candidate answers for the across clues.
+        down_candidates (list[list[str]]): The candidate answers for the down clues.
+        max_nodes (Optional[int], optional): The maximum number of search nodes to explore. Defaults to None.
+        time_limit (Optional[float], optional): The maximum search time in seconds. Defaults to None.
+        anytime (bool, optional): Return the best solution found so far when the budget runs out instead of raising a
+            `TimeoutError`. Defaults to True.
+
+    Returns:
+        Optional[Solution]: The best solution, or None if some clue has no candidates.
+    """
+    search = CrosswordSearch(crossword, across_candidates, down_candidates)
+    return search.search(max_nodes=max_nodes, time_limit=time_limit, anytime=anytime)
+
+
+def resume_search(
+    search: CrosswordSearch, max_nodes: Optional[int] = None, time_limit: Optional[float] = None, anytime: bool = True
+) -> tuple[Optional[Solution], CrosswordSearch]:
+    """Run an incremental search, e.g. in a process pool, returning the updated search state with the solution.
+
+    Args:
+        search (CrosswordSearch): The search state.
+        max_nodes (Optional[int], optional): The maximum number of search nodes to explore. Defaults to None.
+        time_limit (Optional[float], optional): The maximum search time in seconds. Defaults to None.
+        anytime (bool, optional): Return the best solution found so far when the budget runs out instead of raising a
+            `TimeoutError`. Defaults to True.
+
+    Returns:
+        tuple[Optional[Solution], CrosswordSearch]: The best solution and the search state to continue from.
+    """
+    return search.search(max_nodes=max_nodes, time_limit=time_limit, anytime=anytime), search
+
+
+def resume_beam_search(
+    search: CrosswordSearch, beam_width: int = 64, top_k: int = 1, confidence_weight: float = 1.0
+) -> tuple[list[Solution], CrosswordSearch]:
+    """Run a beam search, e.g. in a process pool, returning the search with its counters along with the solutions.
+
+    Args:
+        search (CrosswordSearch): The search state.
+        beam_width (int, optional): The number of partial assignments kept after each clue. Defaults to 64.
+        top_k (int, optional): The number of solutions to return. Defaults to 1.
+        confidence_weight (float, optional): The weight of the log-likelihood relative to the consistency score.
+            Defaults to 1.0.
+
+    Returns:
+        tuple[list[Solution], CrosswordSearch]: The solutions, best first, and the search state.
+    """
+    return search.beam_search(beam_width=beam_width, top_k=top_k, confidence_weight=confidence_weight), search
+
+
+def resume_neighborhood_search(
+    search: CrosswordSearch,
+    neighborhood_size: int = NEIGHBORHOOD_SIZE,
+    max_nodes: Optional[int] = None,
+    time_limit: Optional[float] = None,
+) -> tuple[Optional[Solution], CrosswordSearch]:
+    """Run a neighborhood search, e.g. in a process pool, returning the updated search state with the solution.
+
+    Args:
+        search (CrosswordSearch): The search state.
+        neighborhood_size (int, optional): The number of clues re-solved together. Defaults to `NEIGHBORHOOD_SIZE`.
+        max_nodes (Optional[int], optional): The maximum number of search nodes to explore. Defaults to None.
+        time_limit (Optional[float], optional): The maximum search time in seconds. Defaults to None.
+
+    Returns:
+        tuple[Optional[Solution], CrosswordSearch]: The best solution and the search state to continue from.
+    """
+    solution = search.neighborhood_search(
+        neighborhood_size=neighborhood_size, max_nodes=max_nodes, time_limit=time_limit
+    )
+    return solution, search
+
+
+def _search_part(
+    search: CrosswordSearch,
+    part: np.ndarray,
+    shared_name: str,
+    num_parts: int,
+    index: int,
+    max_nodes: Optional[int],
+    time_limit: Optional[float],
+    deadline: Optional[float],
+) -> tuple[Optional[np.ndarray], int, int, int, int, bool]:
+    """Search a part of a parallel search in a worker process, publishing its best score to the other workers.
+
+    Returns:
+        tuple[Optional[np.ndarray], int, int, int, int, bool]: The best assignment of the part if it beats the
+            incumbent the part started with, its score, the node, pruned and scored counts and whether the part was
+            searched completely.
+    """
+    memory = shared_memory.SharedMemory(name=shared_name)
+    try:
+        search._shared = np.ndarray((num_parts,), dtype=np.int64, buffer=memory.buf)
+        search._shared_index = index
+        search.nodes = search.pruned = search.scored = 0
+        search._best_assignment = None
+        search._max_nodes = max_nodes
+        search._time_limit = time_limit
+        # The deadline is in wall-clock time, which unlike `time.perf_counter` is comparable across processes.
+        search._deadline = None if deadline is None else time.perf_counter() + deadline - time.time()
+        complete = True
+        try:
+            search._search(part)
+        except TimeoutError:
+            complete = False
+        return search._best_assignment, search._best_score, search.nodes, search.pruned, search.scored, complete
+    finally:
+        search._shared = None  # Release the buffer, which cannot be closed while an array uses it.
+        memory.close()
+
+
+def parallel_search(
+    search: CrosswordSearch,
+    executor: Executor,
+    num_parts: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    time_limit: Optional[float] = None,
+    anytime: bool = True,
+) -> tuple[Optional[Solution], CrosswordSearch]:
+    """Run an incremental search split across the workers of a process pool, like `resume_search`.
+
+    The space left to search is split into disjoint parts on the candidates of the most constrained clues and the
+    parts are searched in parallel. Every worker publishes the best score it finds in shared memory and prunes against
+    the best score of all workers, so a good assignment found by one worker speeds up the others. The best assignment
+    of all parts is the same optimum as that of `CrosswordSearch.search`. The parts are submitted from the calling
+    thread, which waits for them, so call it in a thread from an event loop.
+
+    Args:
+        search (CrosswordSearch): The search state, updated in place.
+        executor (Executor): The process pool to search the parts in.
+        num_parts (Optional[int], optional): The minimum number of parts to split the space into. Defaults to None, in
+            which case there are `PARTS_PER_WORKER` parts per CPU.
+        max_nodes (Optional[int], optional): The maximum number of search nodes to explore in each part. Defaults to
+            None.
+        time_limit (Optional[float], optional): The maximum search time in seconds. Defaults to None.
+        anytime (bool, optional): Return the best solution found so far when the budget runs out instead of raising a
+            `TimeoutError`. Defaults to True.
+
+    Returns:
+        tuple[Optional[Solution], CrosswordSearch]: The best solution and the search state to continue from.
+    """
+    search._ensure_built()
+    search.nodes = search.pruned = search.scored = 0
+    if (search._sizes == 0).any():
+        return None, search
+    if search.complete and not search._new_candidates:
+        return search._solution, search
+
+    deadline = None if time_limit is None else time.time() + time_limit
+    parts = search._split(search._start(), num_parts or PARTS_PER_WORKER * (os.cpu_count() or 1))
+    results = []
+    if parts:
+        memory = shared_memory.SharedMemory(create=True, size=len(parts) * np.dtype(np.int64).itemsize)
+        try:
+            np.ndarray((len(parts),), dtype=np.int64, buffer=memory.buf)[:] = search._best_score
+            futures = [
+                executor.submit(
+                    _search_part, search, part, memory.name, len(parts), index, max_nodes, time_limit, deadline
+                )
+                for index, part in enumerate(parts)
+            ]
+            results = [future.result() for future in futures]
+        finally:
+            memory.close()
+            memory.unlink()
+
+    search.complete = True
+    for assignment, score, nodes, pruned, scored, complete in results:
+        search.nodes += nodes
+        search.pruned += pruned
+        search.scored += scored
+        search.complete &= complete
+        if assignment is not None and score > search._best_score:
+            search._best_assignment, search._best_score = assignment, score
+    search._solution = search._make_solution(search._best_assignment)
+    if not search.complete and not anytime:
+        raise TimeoutError(f"Parallel search exceeded its budget in {sum(not result[5] for result in results)} parts.")
+    return search._solution, search
+
+
+def parallel_neighborhood_search(
+    search: CrosswordSearch,
+    executor: Executor,
+    neighborhood_sizes: list[int],
+    max_nodes: Optional[int] = None,
+    time_limit: Optional[float] = None,
+) -> tuple[Optional[Solution], CrosswordSearch]:
+    """Run neighborhood searches with different neighborhood sizes in a process pool and keep the best one.
+
+    Each neighborhood size leads the local search to a different local optimum, so the starts are a portfolio whose
+    best result is at least as good as that of the first size alone.
+
+    Args:
+        search (CrosswordSearch): The search state.
+        executor (Executor): The process pool to run the searches in.
+        neighborhood_sizes (list[int]): The neighborhood size of every search.
+        max_nodes (Optional[int], optional): The maximum number of search nodes to explore in each search. Defaults to
+            None.
+        time_limit (Optional[float], optional): The maximum search time in seconds. Defaults to None.
+
+    Returns:
+        tuple[Optional[Solution], CrosswordSearch]: The best solution and the search state it was found with, which
+            counts the nodes of all searches. Ties go to the earlier neighborhood size.
+    """
+    search._ensure_built()  # Once here rather than in every worker.
+    futures = [
+        executor.submit(resume_neighborhood_search, search, size, max_nodes=max_nodes, time_limit=time_limit)
+        for size in neighborhood_sizes
+    ]
+    results = [future.result() for future in futures]
+    best_solution, best_search = results[0]
+    for solution, state in results[1:]:
+        if solution is not None and solution.score > best_solution.score:
+            best_solution, best_search = solution, state
+    best_search.nodes = sum(state.nodes for _, state in results)
+    best_search.pruned = sum(state.pruned for _, state in results)
+    best_search.scored = sum(state.scored for _, state in results)
+    return best_solution, best_search
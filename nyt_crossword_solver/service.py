@@ -0,0 +1,422 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from pydantic import ValidationError
+
+from nyt_crossword_solver.cache import CandidateCache
+from nyt_crossword_solver.crossword import MiniCrossword
+from nyt_crossword_solver.lexicon import Lexicon
+from nyt_crossword_solver.solve import add_solver_arguments, solve_crossword
+from nyt_crossword_solver.tracing import Tracer, get_metrics, get_tracer, set_tracer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_QUEUED = 16  # Requests waiting for a free solver before new ones are turned away.
+MAX_REQUEST_BYTES = 1 << 20
+RETRY_AFTER = 5  # Seconds that callers turned away are told to wait.
+HEARTBEAT_INTERVAL = 5.0  # Seconds without events after which a blank line checks that the caller is still there.
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class SolveJob:
+    """A queued solve request, with the progress events it produced that have not been sent yet."""
+
+    def __init__(self, crossword: MiniCrossword, max_improvements: int):
+        self.crossword = crossword
+        self.max_improvements = max_improvements
+        self.events: asyncio.Queue[Optional[dict]] = asyncio.Queue()  # None once the job is over.
+        self.cancelled = False
+        self.task: Optional[asyncio.Task] = None  # Set once a solver takes the job.
+
+    def emit(self, event: dict):
+        """Queue a progress event to be sent to the caller."""
+        self.events.put_nowait(event)
+
+    def cancel(self):
+        """Cancel the job, e.g. because the caller went away. A queued job is skipped and a running one stopped."""
+        self.cancelled = True
+        if self.task is not None:
+            self.task.cancel()
+
+
+class SolverService:
+    """Long-running solver that takes puzzles over a local HTTP API and streams the progress of their solves.
+
+    Requests are queued and solved by `max_concurrency` solvers on one event loop. Once `max_queued` requests are
+    waiting, new ones are turned away with a 503 and a Retry-After header instead of piling up. All solves share the
+    warm state of the process: the model clients and agent pools, the scheduler and its rate limits, the memo of the
+    oracle, and the candidate cache, lexicon and search processes given here.
+
+    The API has three endpoints:
+        - `POST /solve[?max_improvements=<n>]` takes a puzzle in the `MiniCrossword` JSON schema and answers with
+          newline-delimited JSON events as they happen: "queued", "started", the events of `solve_crossword` and
+          finally "solved" (with the "solution" and its total "score") or "error". Blank lines are sent while there
+          are no events, to notice callers that hung up.
+        - `GET /health` reports the number of queued and running requests.
+        - `GET /metrics` renders the metrics of the process in the Prometheus text format.
+
+    Args:
+        max_improvements (int, optional): The default maximum number of improvement steps per puzzle. Defaults to 10.
+        max_concurrency (int, optional): The maximum number of puzzles solved at once. Defaults to 4.
+        max_queued (int, optional): The maximum number of requests waiting to be solved. Defaults to `MAX_QUEUED`.
+        cache (CandidateCache, optional): The candidate cache shared by all solves. Defaults to None.
+        lexicon (Lexicon, optional): The lexicon shared by all solves. Defaults to None.
+        executor (Executor, optional): The executor the searches of all solves run in. Defaults to None, in which
+            case the searches run on the event loop and hold up the other requests.
+        solver_options (dict[str, Any], optional): Other keyword arguments of `solve_crossword`, used for every
+            puzzle. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        max_improvements: int = 10,
+        max_concurrency: int = 4,
+        max_queued: int = MAX_QUEUED,
+        cache: CandidateCache = None,
+        lexicon: Lexicon = None,
+        executor: Executor = None,
+        solver_options: dict[str, Any] = None,
+    ):
+        self.max_improvements = max_improvements
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.lexicon = lexicon
+        self.executor = executor
+        self.solver_options = solver_options or {}
+        self.running = 0
+        self._queue: asyncio.Queue[SolveJob] = asyncio.Queue(max_queued)
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        """Start the solvers. Must be called on the event loop of the service."""
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.max_concurrency)]
+
+    async def stop(self):
+        """Stop the solvers, cancelling the running solves."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, crossword: MiniCrossword, max_improvements: int = None) -> SolveJob:
+        """Queue a puzzle to be solved.
+
+        Args:
+            crossword (MiniCrossword): The crossword puzzle.
+            max_improvements (int, optional): The maximum number of improvement steps. Defaults to None, in which
+                case the default of the service is used.
+
+        Raises:
+            asyncio.QueueFull: If `max_queued` requests are already waiting.
+
+        Returns:
+            SolveJob: The job, whose events report the progress and result of the solve.
+        """
+        job = SolveJob(crossword, self.max_improvements if max_improvements is None else max_improvements)
+        self._queue.put_nowait(job)
+        get_metrics().increment("service_requests_total", outcome="accepted")
+        job.emit({"event": "queued", "position": self._queue.qsize()})
+        return job
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            if job.cancelled:
+                continue
+            self.running += 1
+            try:
+                # The solve runs in its own task so that cancelling it does not stop this solver.
+                job.task = asyncio.create_task(self._solve(job))
+                await asyncio.wait([job.task])
+            finally:
+                job.task.cancel()  # Only has an effect if the service is stopping.
+                self.running -= 1
+
+    async def _solve(self, job: SolveJob):
+        job.emit({"event": "started"})
+        outcome = "cancelled"
+        try:
+            solved = await solve_crossword(
+                job.crossword,
+                job.max_improvements,
+                cache=self.cache,
+                executor=self.executor,
+                lexicon=self.lexicon,
+                listener=job.emit,
+                **self.solver_options,
+            )
+            score = round(sum(clue.consistency_score for clue in solved.across + solved.down), 2)
+            job.emit({"event": "solved", "score": score, "solution": solved.model_dump()})
+            outcome = "solved"
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            job.emit({"event": "error", "error": "".join(traceback.format_exception_only(error)).strip()})
+            outcome = "failed"
+        finally:
+            get_metrics().increment("service_solves_total", outcome=outcome)
+            job.events.put_nowait(None)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one HTTP request on a connection, see `asyncio.start_server`."""
+        try:
+            await self._handle(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # The caller went away.
+        finally:
+            writer.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        request_line = (await reader.readline()).decode("latin-1").split()
+        headers = {}
+        while line := (await reader.readline()).decode("latin-1").strip():
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if len(request_line) != 3:
+            return await _respond(writer, 400, {"error": "Malformed request line."})
+        method, target, _ = request_line
+        url = urlsplit(target)
+
+        if url.path == "/health":
+            return await _respond(writer, 200, {"queued": self.queued, "running": self.running})
+        if url.path == "/metrics":
+            return await _respond(writer, 200, get_metrics().render(), content_type="text/plain; version=0.0.4")
+        if url.path != "/solve":
+            return await _respond(writer, 404, {"error": f"No endpoint {url.path}."})
+        if method != "POST":
+            return await _respond(writer, 405, {"error": "Puzzles must be POSTed."})
+
+        length = headers.get("content-length", "0")
+        if not length.isdigit():
+            return await _respond(writer, 400, {"error": "Puzzles need a Content-Length."})
+        length = int(length)
+        if length > MAX_REQUEST_BYTES:
+            return await _respond(writer, 413, {"error": f"Puzzles are limited to {MAX_REQUEST_BYTES} bytes."})
+        body = await reader.readexactly(length)
+        try:
+            crossword = MiniCrossword.model_validate_json(body)
+            max_improvements = parse_qs(url.query).get("max_improvements")
+            max_improvements = None if max_improvements is None else int(max_improvements[0])
+        except (ValidationError, ValueError) as error:
+            return await _respond(writer, 400, {"error": str(error)})
+        try:
+            job = self.submit(crossword, max_improvements)
+        except asyncio.QueueFull:
+            get_metrics().increment("service_requests_total", outcome="rejected")
+            return await _respond(
+                writer, 503, {"error": "Too many queued puzzles."}, headers={"Retry-After": str(RETRY_AFTER)}
+            )
+
+        writer.write(_head(200, "application/x-ndjson", {"Transfer-Encoding": "chunked"}))
+        # The end of the request stream may only be a half-close, so a caller that hung up is noticed when writing to
+        # it fails. While its puzzle is queued or quiet, blank lines are written to find out.
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(job.events.get(), HEARTBEAT_INTERVAL)
+                except TimeoutError:
+                    data = b"\n"
+                else:
+                    if event is None:
+                        break
+                    data = (json.dumps(event) + "\n").encode()
+                writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                await writer.drain()
+                if writer.transport.is_closing():
+                    raise ConnectionResetError("The caller hung up.")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            job.cancel()
+            raise
+
+
+def _head(status: int, content_type: str, headers: dict[str, str] = None) -> bytes:
+    lines = [f"HTTP/1.1 {status} {_REASONS[status]}", f"Content-Type: {content_type}", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+async def _respond(
+    writer: asyncio.StreamWriter,
+    status: int,
+    body: dict | str,
+    content_type: str = "application/json",
+    headers: dict[str, str] = None,
+):
+    data = (body if isinstance(body, str) else json.dumps(body)).encode()
+    writer.write(_head(status, content_type, {"Content-Length": str(len(data)), **(headers or {})}) + data)
+    await writer.drain()
+
+
+async def serve(service: SolverService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_socket: str = None):
+    """Run a solver service until cancelled.
+
+    Args:
+        service (SolverService): The service.
+        host (str, optional): The address to listen on. Defaults to `DEFAULT_HOST`.
+        port (int, optional): The port to listen on. Defaults to `DEFAULT_PORT`.
+        unix_socket (str, optional): If given, listen on this Unix socket instead of a TCP port. Defaults to None.
+    """
+    if unix_socket is not None:
+        server = await asyncio.start_unix_server(service.handle, path=unix_socket)
+    else:
+        server = await asyncio.start_server(service.handle, host=host, port=port)
+    service.start()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+async def stream_solve(
+    crossword: MiniCrossword,
+    max_improvements: int = None,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    unix_socket: str = None,
+) -> AsyncIterator[dict]:
+    """Solve a puzzle with a running solver service, yielding its progress events as they arrive.
+
+    Args:
+        crossword (MiniCrossword): The crossword puzzle.
+        max_improvements (int, optional): The maximum number of improvement steps. Defaults to None, in which case
+            the default of the service is used.
+        host (str, optional): The address of the service. Defaults to `DEFAULT_HOST`.
+        port (int, optional): The port of the service. Defaults to `DEFAULT_PORT`.
+        unix_socket (str, optional): If given, connect to this Unix socket instead of a TCP port. Defaults to None.
+
+    Raises:
+        RuntimeError: If the service turns the request away, e.g. because its queue is full.
+
+    Yields:
+        dict: The events of the solve, ending with "solved" or "error".
+    """
+    if unix_socket is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_socket)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        target = "/solve" if max_improvements is None else f"/solve?max_improvements={max_improvements}"
+        body = crossword.model_dump_json().encode()
+        writer.write(
+            f"POST {target} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while line := (await reader.readline()).decode("latin-1").strip():
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if status != 200:
+            raise RuntimeError(f"The service answered {status}: {(await reader.read()).decode()}")
+        buffer = b""
+        while size := int((await reader.readline()).strip(), 16):
+            buffer += (await reader.readexactly(size + 2))[:-2]
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():  # Blank lines only keep the connection alive.
+                    yield json.loads(line)
+    finally:
+        writer.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run the crossword solver as a service, or send a puzzle to one.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Solve puzzles posted to a local HTTP API.")
+    solve_parser = subparsers.add_parser("solve", help="Solve a puzzle with a running service, printing its progress.")
+    for subparser in (serve_parser, solve_parser):
+        subparser.add_argument("--host", type=str, default=DEFAULT_HOST, help="The address of the service.")
+        subparser.add_argument("--port", type=int, default=DEFAULT_PORT, help="The port of the service.")
+        subparser.add_argument(
+            "--unix_socket", type=str, default=None, help="Use this Unix socket instead of a TCP port."
+        )
+    serve_parser.add_argument(
+        "--max_improvements", type=int, default=10, help="The default maximum number of improvements per puzzle."
+    )
+    serve_parser.add_argument(
+        "--max_concurrency", type=int, default=4, help="The maximum number of puzzles solved at once."
+    )
+    serve_parser.add_argument(
+        "--max_queued",
+        type=int,
+        default=MAX_QUEUED,
+        help="The maximum number of puzzles waiting to be solved before new ones are turned away.",
+    )
+    serve_parser.add_argument(
+        "--workers", type=int, default=None, help="The number of search processes. Defaults to the number of CPUs."
+    )
+    add_solver_arguments(serve_parser)
+    solve_parser.add_argument("puzzle_path", type=str, help="The path to the crossword puzzle JSON file.")
+    solve_parser.add_argument(
+        "--max_improvements", type=int, default=None, help="The maximum number of improvements to make."
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "solve":
+        with open(Path(args.puzzle_path)) as f:
+            crossword = MiniCrossword(**json.load(f))
+        async for event in stream_solve(crossword, args.max_improvements, args.host, args.port, args.unix_socket):
+            print(json.dumps(event), flush=True)
+        return
+
+    cache = None if args.no_cache else CandidateCache(args.cache_dir, ttl=args.cache_ttl, offline=args.offline)
+    lexicon = None if args.lexicon is None else Lexicon(args.lexicon)
+    if args.trace is not None:
+        set_tracer(Tracer())
+    # Worker processes are spawned so that they do not inherit the event loop and open clients of this process.
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        service = SolverService(
+            max_improvements=args.max_improvements,
+            max_concurrency=args.max_concurrency,
+            max_queued=args.max_queued,
+            cache=cache,
+            lexicon=lexicon,
+            executor=executor,
+            solver_options={
+                "max_in_flight": args.max_in_flight,
+                "search_time_limit": args.search_time_limit,
+                "beam_width": args.beam_width,
+                "confidence_weight": args.confidence_weight,
+                "top_k": args.top_k,
+                "batch_clues": args.batch_clues,
+                "neighborhood_size": args.neighborhood_size,
+                "improvements_per_round": args.improvements_per_round,
+                "search_workers": args.search_workers,
+                "max_candidates": args.max_candidates,
+            },
+        )
+        address = args.unix_socket or f"http://{args.host}:{args.port}"
+        print(f"Serving the solver on {address}.", flush=True)
+        try:
+            await serve(service, args.host, args.port, args.unix_socket)
+        finally:
+            if args.trace is not None:
+                get_tracer().dump(args.trace, metrics=get_metrics())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
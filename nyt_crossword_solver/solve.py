@@ -1,179 +1,797 @@
 import argparse
 import asyncio
+import functools
 import json
-from copy import deepcopy
-from itertools import product
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
 from pathlib import Path
+from typing import Callable
 
-from autogen_agentchat.agents import UserProxyAgent
 from autogen_agentchat.messages import TextMessage
-from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_core import CancellationToken
 from tqdm import trange
 
-from nyt_crossword_solver.agents import candidates_generator_factory, context_agent_factory, correctness_agent_factory
-from nyt_crossword_solver.crossword import MiniCrossword, consistency_score, get_intersecting_clues
-from nyt_crossword_solver.tools import filter_invalid_characters
+from nyt_crossword_solver.agents import (
+    batch_candidates_generators,
+    candidates_generators,
+    context_agents,
+    correctness_agents,
+)
+from nyt_crossword_solver.archive import PuzzleArchive
+from nyt_crossword_solver.cache import DEFAULT_CACHE_DIR, CandidateCache, candidates_key
+from nyt_crossword_solver.candidates import (
+    DEFAULT_CONFIDENCE,
+    MAX_CANDIDATES,
+    CandidateStore,
+    candidate_confidences,
+)
+from nyt_crossword_solver.crossword import MiniCrossword, fill_grid, filter_invalid_characters, get_spanning_cells
+from nyt_crossword_solver.lexicon import Lexicon
+from nyt_crossword_solver.scheduler import PRIORITY_IMPROVEMENT, request_priority
+from nyt_crossword_solver.search import (
+    NEIGHBORHOOD_SIZE,
+    PARTS_PER_WORKER,
+    CrosswordSearch,
+    Solution,
+    build_crossword,
+    parallel_neighborhood_search,
+    parallel_search,
+    resume_beam_search,
+    resume_neighborhood_search,
+    resume_search,
+)
+from nyt_crossword_solver.tracing import Tracer, get_metrics, get_tracer, set_tracer
 
+LEXICON_CONFIDENCE = 0.5  # Lexicon fills agree with the crossings, but nothing says that they answer the clue.
+SETTLED_LETTER_SHARE = 0.75  # Of the confidence of the candidates of a clue, to pass one of their letters as a hint.
+MAX_EXACT_SEARCH_CLUES = 24  # Larger puzzles use the neighborhood search unless a search is chosen explicitly.
 
-async def generate_candidates(
+
+def describe_clue(
     clue: str, length: int, exclude: list[str] = None, intersections: list[tuple[int, str]] = None
-) -> list[str]:
-    """Generate candidate answers for a crossword clue.
+) -> str:
+    """Describe a clue, its length and hints to a candidates generator.
 
     Args:
         clue (str): The crossword clue.
         length (int): The length of the answer.
         exclude (list[str], optional): The list of candidates to exclude. Defaults to None.
+        intersections (list[tuple[int, str]], optional): The likely characters at given positions of the answer.
+            Defaults to None.
 
     Returns:
-        list[str]: The candidate answers.
+        str: The description.
     """
-    instruction = f"""Clue: {clue}, Length: {length}."""
+    description = f"""Clue: {clue}, Length: {length}."""
     if intersections:
         for intersection in intersections:
-            instruction += (
+            description += (
                 f""" The character at position {intersection[0] + 1} in the answer is likely to be {intersection[1]}."""
             )
     if exclude:
-        instruction += f""" Exclude the following candidates: {", ".join(exclude)}."""
-    instruction_agent = UserProxyAgent(
-        name="instruction_agent",
-        input_func=lambda _: instruction,
+        description += f""" Exclude the following candidates: {", ".join(exclude)}."""
+    return description
+
+
+def parse_candidates(candidates: list[dict], length: int = None) -> dict[str, float]:
+    """Read the candidates returned by a candidates generator.
+
+    Args:
+        candidates (list[dict]): The candidates, each with an answer and a confidence.
+        length (int, optional): If given, drop the candidates whose letters do not add up to this length.
+            Defaults to None.
+
+    Returns:
+        dict[str, float]: The candidate answers and their confidence between 0 and 1.
+    """
+    return candidate_confidences(
+        {
+            candidate["answer"]: min(max(candidate["confidence"], 0.0), 1.0)
+            for candidate in candidates
+            if length is None or len(filter_invalid_characters(candidate["answer"])) == length
+        }
+    )
+
+
+async def generate_candidates(
+    clue: str,
+    length: int,
+    exclude: list[str] = None,
+    intersections: list[tuple[int, str]] = None,
+    cache: CandidateCache = None,
+) -> dict[str, float]:
+    """Generate candidate answers for a crossword clue, with the confidence of the model in each of them.
+
+    Args:
+        clue (str): The crossword clue.
+        length (int): The length of the answer.
+        exclude (list[str], optional): The list of candidates to exclude. Defaults to None.
+        intersections (list[tuple[int, str]], optional): The likely characters at given positions of the answer.
+            Defaults to None.
+        cache (CandidateCache, optional): The cache to look up and store the candidates in. Defaults to None.
+
+    Returns:
+        dict[str, float]: The candidate answers and their confidence between 0 and 1.
+    """
+    if cache is not None:
+        key = candidates_key(clue, length, exclude=exclude, intersections=intersections)
+        candidates = cache.get(key)
+        if candidates is not None:
+            return candidate_confidences(candidates)  # Entries cached before confidences were added are lists.
+
+    instruction = describe_clue(clue, length, exclude=exclude, intersections=intersections)
+    # The instruction goes to the context agent, and the instruction and the context to the candidates generator.
+    message = TextMessage(content=instruction, source="instruction_agent")
+    with get_tracer().span("generate_candidates", clue=clue, length=length) as span:
+        async with context_agents.acquire() as context_agent:
+            context = await context_agent.on_messages([message], cancellation_token=CancellationToken())
+        async with candidates_generators.acquire() as candidates_generator:
+            response = await candidates_generator.on_messages(
+                [message, context.chat_message], cancellation_token=CancellationToken()
+            )
+        candidates = parse_candidates(json.loads(response.chat_message.content)["candidates"])
+        span.set(num_candidates=len(candidates))
+    get_metrics().increment("candidates_generated_total", len(candidates))
+    if cache is not None:
+        cache.put(key, candidates)
+    return candidates
+
+
+async def generate_candidates_batch(clues: list[tuple[str, int, list[tuple[int, str]]]]) -> list[dict[str, float]]:
+    """Generate candidate answers for several crossword clues in a single model call.
+
+    Unlike `generate_candidates`, the model gets no context from the oracle and no tools, and the lengths of the
+    candidates are checked here instead.
+
+    Args:
+        clues (list[tuple[str, int, list[tuple[int, str]]]]): The clues, the lengths of their answers and the likely
+            characters at given positions of the answers.
+
+    Returns:
+        list[dict[str, float]]: The candidate answers of each clue and their confidence between 0 and 1. Clues that
+            the model skipped or only gave candidates of the wrong length for get no candidates.
+    """
+    instruction = "\n".join(
+        f"{idx + 1}. " + describe_clue(clue, length, intersections=intersections)
+        for idx, (clue, length, intersections) in enumerate(clues)
     )
-    context_agent = context_agent_factory()
-    candidates_generator = candidates_generator_factory()
-    team = RoundRobinGroupChat([instruction_agent, context_agent, candidates_generator], max_turns=3)
-    result = await team.run()
-    candidates = json.loads(result.messages[-1].content)["candidates"]
-    return [filter_invalid_characters(candidate) for candidate in candidates]
+    message = TextMessage(content=instruction, source="instruction_agent")
+    with get_tracer().span("generate_candidates_batch", clues=len(clues)) as span:
+        async with batch_candidates_generators.acquire() as candidates_generator:
+            response = await candidates_generator.on_messages([message], cancellation_token=CancellationToken())
+        answered = {
+            item["id"].strip().rstrip("."): item["candidates"]
+            for item in json.loads(response.chat_message.content)["clues"]
+        }
+        candidates = [
+            parse_candidates(answered.get(str(idx + 1), []), length=length) for idx, (_, length, _) in enumerate(clues)
+        ]
+        span.set(num_candidates=sum(len(clue_candidates) for clue_candidates in candidates))
+    get_metrics().increment("candidates_generated_total", sum(len(clue_candidates) for clue_candidates in candidates))
+    return candidates
+
+
+class SettledLetters:
+    """Letters of the grid settled by the clues whose candidates have already arrived.
+
+    A crossing cell is settled once the candidates of the correct length of an arrived clue that place the same letter
+    in it hold at least `SETTLED_LETTER_SHARE` of the confidence of all of them. Settled letters are passed as
+    intersection hints to the crossing clues that have not been queried yet.
+    """
+
+    def __init__(self, crossword: MiniCrossword):
+        self.crossword = crossword
+        self.cells: dict[tuple[int, int], str] = {}
+
+    def add(self, orientation: str, idx: int, candidates: dict[str, float]):
+        """Record the candidates of a clue.
+
+        Args:
+            orientation (str): The orientation of the clue.
+            idx (int): The index of the clue.
+            candidates (dict[str, float]): The candidates of the clue and their confidence.
+        """
+        clue = getattr(self.crossword, orientation)[idx]
+        candidates = {candidate: conf for candidate, conf in candidates.items() if len(candidate) == clue.length}
+        total = sum(candidates.values())
+        if total <= 0:
+            return
+        cells = get_spanning_cells(clue, orientation)
+        for pos, _, _ in self.crossword.clue_crossings[orientation][idx]:
+            weights = {}
+            for candidate, confidence in candidates.items():
+                weights[candidate[pos]] = weights.get(candidate[pos], 0.0) + confidence
+            letter, weight = max(weights.items(), key=lambda item: item[1])
+            if weight >= SETTLED_LETTER_SHARE * total:
+                self.cells[cells[pos]] = letter
+
+    def hints(self, orientation: str, idx: int) -> list[tuple[int, str]]:
+        """Get the settled letters of a clue.
+
+        Args:
+            orientation (str): The orientation of the clue.
+            idx (int): The index of the clue.
+
+        Returns:
+            list[tuple[int, str]]: The positions in the answer and the settled letters.
+        """
+        cells = get_spanning_cells(getattr(self.crossword, orientation)[idx], orientation)
+        return [(pos, self.cells[cell]) for pos, cell in enumerate(cells) if cell in self.cells]
+
+
+async def generate_all_candidates(
+    crossword: MiniCrossword,
+    cache: CandidateCache = None,
+    max_in_flight: int = None,
+    batch_clues: int = None,
+    listener: Callable[[dict], None] = None,
+    on_candidates: Callable[[str, int, dict[str, float]], None] = None,
+) -> tuple[list[dict[str, float]], list[dict[str, float]]]:
+    """Generate candidate answers for all clues of a crossword at once.
+
+    Across and down clues are queried together. With `max_in_flight`, the clues waiting for a free slot are passed the
+    letters settled by the candidates that arrived meanwhile as hints.
+
+    Args:
+        crossword (MiniCrossword): The crossword puzzle.
+        cache (CandidateCache, optional): The cache to look up and store the candidates in. Defaults to None.
+        max_in_flight (int, optional): The maximum number of requests made at the same time. Defaults to None, in
+            which case all clues are queried at once and only the per-model limits of the scheduler throttle them.
+        batch_clues (int, optional): If given, ask for the candidates of up to this many clues in a single request
+            with `generate_candidates_batch`. Clues left without candidates are then asked for one by one. Defaults
+            to None.
+        listener (Callable[[dict], None], optional): If given, called with a "candidates" event as the candidates of
+            each clue arrive, see `solve_crossword`. Defaults to None.
+        on_candidates (Callable[[str, int, dict[str, float]], None], optional): If given, called with the orientation,
+            the index and the candidates of each clue as they arrive. Defaults to None.
+
+    Returns:
+        tuple[list[dict[str, float]], list[dict[str, float]]]: The candidate answers and their confidence for the
+            across and down clues.
+    """
+    settled = SettledLetters(crossword)
+    results: dict[tuple[str, int], dict[str, float]] = {}
+
+    def arrived(slot: tuple[str, int], candidates: dict[str, float]):
+        settled.add(*slot, candidates)
+        results[slot] = candidates
+        if on_candidates is not None:
+            on_candidates(*slot, candidates)
+        if listener is not None:
+            clue = getattr(crossword, slot[0])[slot[1]]
+            listener(
+                {
+                    "event": "candidates",
+                    "orientation": slot[0],
+                    "index": slot[1],
+                    "clue": clue.clue,
+                    "num_candidates": len(candidates),
+                }
+            )
+
+    def store(slot: tuple[str, int], candidates: dict[str, float]):
+        clue = getattr(crossword, slot[0])[slot[1]]
+        if cache is not None:
+            # Cached without hints, since the hints depend on the order in which the other clues happen to arrive.
+            cache.put(candidates_key(clue.clue, clue.length), candidates)
+        arrived(slot, candidates)
+
+    async def generate(orientation: str, idx: int):
+        clue = getattr(crossword, orientation)[idx]
+        async with gate:
+            # Read once the request gets its slot, so that a clue that had to wait gets the letters settled meanwhile.
+            hints = settled.hints(orientation, idx)
+            candidates = await generate_candidates(clue.clue, clue.length, intersections=hints or None)
+        store((orientation, idx), candidates)
+
+    async def generate_batch(slots: list[tuple[str, int]]):
+        async with gate:
+            clues = [getattr(crossword, orientation)[idx] for orientation, idx in slots]
+            requests = [(clue.clue, clue.length, settled.hints(*slot)) for slot, clue in zip(slots, clues)]
+            batch = await generate_candidates_batch(requests)
+        missing = []
+        for slot, candidates in zip(slots, batch):
+            if candidates:
+                store(slot, candidates)
+            else:
+                missing.append(slot)
+        await asyncio.gather(*(generate(*slot) for slot in missing))
+
+    slots = [("across", idx) for idx in range(len(crossword.across))] + [
+        ("down", idx) for idx in range(len(crossword.down))
+    ]
+    for slot in slots:
+        clue = getattr(crossword, slot[0])[slot[1]]
+        candidates = None if cache is None else cache.get(candidates_key(clue.clue, clue.length))
+        if candidates is not None:
+            arrived(slot, candidate_confidences(candidates))
+    # Clues with the most crossings get the first slots, since they settle the most letters for the others.
+    slots = [slot for slot in slots if slot not in results]
+    slots.sort(key=lambda slot: -len(crossword.clue_crossings[slot[0]][slot[1]]))
+    gate = asyncio.Semaphore(max(len(slots), 1) if max_in_flight is None else max_in_flight)
+    with get_tracer().span("generate_all_candidates", clues=len(slots)):
+        if batch_clues is None:
+            await asyncio.gather(*(generate(*slot) for slot in slots))
+        else:
+            await asyncio.gather(
+                *(generate_batch(slots[start : start + batch_clues]) for start in range(0, len(slots), batch_clues))
+            )
+    across_candidates = [results["across", idx] for idx in range(len(crossword.across))]
+    down_candidates = [results["down", idx] for idx in range(len(crossword.down))]
+    return across_candidates, down_candidates
 
 
 def best_solution(
-    crossword: MiniCrossword, across_candidates: list[list[str]], down_candidates: list[list[str]]
+    crossword: MiniCrossword,
+    across_candidates: list[list[str] | dict[str, float]],
+    down_candidates: list[list[str] | dict[str, float]],
+    max_nodes: int = None,
+    time_limit: float = None,
+    anytime: bool = True,
 ) -> MiniCrossword:
     """Find the best solution for a crossword puzzle.
 
     Args:
         crossword (MiniCrossword): The crossword puzzle.
-        across_candidates (list[list[str]]): The candidate answers for the across clues.
-        down_candidates (list[list[str]]): The candidate answers for the down clues.
+        across_candidates (list[list[str] | dict[str, float]]): The candidate answers for the across clues,
+            optionally with their confidence.
+        down_candidates (list[list[str] | dict[str, float]]): The candidate answers for the down clues, optionally
+            with their confidence.
+        max_nodes (int, optional): The maximum number of search nodes to explore. Defaults to None.
+        time_limit (float, optional): The maximum search time in seconds. Defaults to None.
+        anytime (bool, optional): Return the best solution found so far when the budget runs out instead of raising
+            a `TimeoutError`. Defaults to True.
 
     Returns:
         MiniCrossword: The best solution for the crossword puzzle.
     """
-    best_score = 0
-    best_crossword = None
-    for sample_across_candidates in product(*across_candidates):
-        for sample_down_candidates in product(*down_candidates):
-            score = 0
-            for i, clue in enumerate(crossword.across):
-                clue.answer = filter_invalid_characters(sample_across_candidates[i])
-            for i, clue in enumerate(crossword.down):
-                clue.answer = filter_invalid_characters(sample_down_candidates[i])
-            for i, clue in enumerate(crossword.across):
-                clue_consistency_score = consistency_score(crossword, "across", i)
-                clue.consistency_score = clue_consistency_score
-                score += clue_consistency_score
-            for i, clue in enumerate(crossword.down):
-                clue_consistency_score = consistency_score(crossword, "down", i)
-                clue.consistency_score = clue_consistency_score
-                score += clue_consistency_score
-            if score > best_score:
-                best_score = score
-                best_crossword = deepcopy(crossword)
-    return best_crossword
+    search = CrosswordSearch(crossword, across_candidates, down_candidates)
+    return search.run(max_nodes=max_nodes, time_limit=time_limit, anytime=anytime)
 
 
-async def main():
-    parser = argparse.ArgumentParser(description="Generate candidate answers for a crossword clue.")
-    parser.add_argument("puzzle_path", type=str, help="The path to the crossword puzzle JSON file.")
-    parser.add_argument("max_improvements", type=int, help="The maximum number of improvements to make.")
+def add_solver_arguments(parser: argparse.ArgumentParser):
+    """Add the options shared by the solver entry points to an argument parser.
 
-    args = parser.parse_args()
+    Args:
+        parser (argparse.ArgumentParser): The argument parser.
+    """
+    parser.add_argument(
+        "--search_time_limit",
+        type=float,
+        default=None,
+        help="The maximum time in seconds to spend searching for the best solution in each improvement step.",
+    )
+    parser.add_argument(
+        "--cache_dir", type=str, default=str(DEFAULT_CACHE_DIR), help="The directory of the candidate cache."
+    )
+    parser.add_argument("--cache_ttl", type=float, default=None, help="The lifetime of cached candidates in seconds.")
+    parser.add_argument("--no_cache", action="store_true", help="Always query the models for candidates.")
+    parser.add_argument(
+        "--max_in_flight",
+        type=int,
+        default=None,
+        help=(
+            "The maximum number of clues queried for candidates at once. Defaults to no limit other than the "
+            "per-model limits of the scheduler."
+        ),
+    )
+    parser.add_argument("--offline", action="store_true", help="Only use cached candidates and fail on a cache miss.")
+    parser.add_argument(
+        "--batch_clues",
+        type=int,
+        default=None,
+        help="Ask for the initial candidates of up to this many clues per request, without the context agent.",
+    )
+    parser.add_argument(
+        "--lexicon", type=str, default=None, help="The directory of a lexicon index built with lexicon.py."
+    )
+    parser.add_argument(
+        "--trace", type=str, default=None, help="Write a JSON trace of the solve, with its metrics, to this path."
+    )
+    parser.add_argument(
+        "--beam_width",
+        type=int,
+        default=None,
+        help="Use a beam search of this width that also weighs candidate confidences, instead of the exact search.",
+    )
+    parser.add_argument(
+        "--top_k",
+        type=int,
+        default=1,
+        help="The number of best grids kept by the beam search, reported as alternatives to the best one.",
+    )
+    parser.add_argument(
+        "--neighborhood_size",
+        type=int,
+        default=None,
+        help=(
+            "Use a neighborhood search that re-solves this many crossing clues at a time, instead of the exact search. "
+            f"Used with {NEIGHBORHOOD_SIZE} clues for puzzles with more than {MAX_EXACT_SEARCH_CLUES} clues."
+        ),
+    )
+    parser.add_argument(
+        "--improvements_per_round",
+        type=int,
+        default=1,
+        help="The number of the least consistent clues improved in parallel in each improvement step.",
+    )
+    parser.add_argument(
+        "--search_workers",
+        type=int,
+        default=None,
+        help=(
+            "Split each exact search across this many search processes, or run this many neighborhood searches with "
+            "different neighborhood sizes and keep the best."
+        ),
+    )
+    parser.add_argument(
+        "--confidence_weight",
+        type=float,
+        default=1.0,
+        help="The weight of the log-likelihood of the candidates in the beam search.",
+    )
+    parser.add_argument(
+        "--max_candidates",
+        type=int,
+        default=MAX_CANDIDATES,
+        help="The maximum number of candidates kept per clue, the most confident ones first.",
+    )
+
+
+async def solve_crossword(
+    crossword: MiniCrossword,
+    max_improvements: int,
+    cache: CandidateCache = None,
+    max_in_flight: int = None,
+    search_time_limit: float = None,
+    executor: Executor = None,
+    timings: dict[str, float] = None,
+    progress: bool = False,
+    lexicon: Lexicon = None,
+    beam_width: int = None,
+    confidence_weight: float = 1.0,
+    top_k: int = 1,
+    batch_clues: int = None,
+    neighborhood_size: int = None,
+    improvements_per_round: int = 1,
+    search_workers: int = None,
+    max_candidates: int = MAX_CANDIDATES,
+    listener: Callable[[dict], None] = None,
+) -> MiniCrossword:
+    """Solve a crossword puzzle.
+
+    Args:
+        crossword (MiniCrossword): The crossword puzzle.
+        max_improvements (int): The maximum number of improvement steps to make.
+        cache (CandidateCache, optional): The cache to look up and store candidates in. Defaults to None.
+        max_in_flight (int, optional): The maximum number of clues queried for candidates at once. Defaults to None,
+            in which case only the per-model limits of the scheduler apply, see `generate_all_candidates`.
+        search_time_limit (float, optional): The maximum time in seconds to spend searching for the best solution in
+            each improvement step. Defaults to None.
+        executor (Executor, optional): The executor to run the search in, e.g. a process pool. Defaults to None, in
+            which case the search runs in the calling thread.
+        timings (dict[str, float], optional): If given, the seconds spent generating candidates ("candidates"),
+            searching ("search") and querying models to improve the solution ("improvements") are added to it.
+            Defaults to None.
+        progress (bool, optional): Whether to show a progress bar. Defaults to False.
+        lexicon (Lexicon, optional): The lexicon used to check answers built from crossings and to fill answers whose
+            crossings leave few words, instead of asking a model. Defaults to None.
+        beam_width (int, optional): If given, use a beam search of this width that also weighs the confidence of the
+            candidates, instead of the exact search. Defaults to None.
+        confidence_weight (float, optional): The weight of the log-likelihood of the candidates in the beam search.
+            Defaults to 1.0.
+        top_k (int, optional): The number of best grids kept by the beam search. The best one is solved and the others
+            are reported to `listener` as "alternatives". Defaults to 1.
+        batch_clues (int, optional): If given, ask for the initial candidates of up to this many clues in a single
+            request. Defaults to None.
+        neighborhood_size (int, optional): If given, use a neighborhood search that re-solves this many crossing clues
+            at a time, instead of the exact search. Defaults to None, in which case puzzles with more than
+            `MAX_EXACT_SEARCH_CLUES` clues use `NEIGHBORHOOD_SIZE` unless `beam_width` is given.
+        improvements_per_round (int, optional): The number of the least consistent clues improved concurrently in
+            each improvement step. Defaults to 1.
+        search_workers (int, optional): If given, split each exact search into parts searched by this many processes
+            of `executor`, or run this many neighborhood searches with increasing neighborhood sizes in it and keep
+            the best. The beam search is not split. Defaults to None.
+        max_candidates (int, optional): The maximum number of candidates kept per clue, see `CandidateStore`. Clues
+            that reach it are no longer improved. Defaults to `MAX_CANDIDATES`.
+        listener (Callable[[dict], None], optional): If given, called on the event loop with the progress of the
+            solve, as dicts with an "event" key: "candidates" when the candidates of a clue arrive (with its
+            "orientation", "index", "clue" and "num_candidates"), "solution" after every search (with the number of
+            improvement steps made before it as "step", the total "score", the "grid" filled with the answers and the
+            other "alternatives" kept by the beam search, each with its "score", "grid" and "answers", across clues
+            first, since the grid hides down answers that disagree with the across ones) and
+            "improvement" after every improved clue (with its "orientation", "index", "clue", the "outcome" and the
+            number of "new_candidates"). Defaults to None.
+
+    Returns:
+        MiniCrossword: The solved crossword puzzle.
+    """
+    if search_workers is not None and executor is None:
+        raise ValueError("A parallel search needs an executor to run in.")
+    if top_k > 1 and beam_width is None:
+        raise ValueError("Only the beam search keeps more than one grid.")
+    num_clues = len(crossword.across) + len(crossword.down)
+    with get_tracer().span("solve", clues=num_clues):
+        timings = {} if timings is None else timings
+        for phase in ("candidates", "search", "improvements"):
+            timings.setdefault(phase, 0.0)
 
-    puzzle_path = Path(args.puzzle_path)
-
-    with open(puzzle_path) as f:
-        puzzle = json.load(f)
-    crossword = MiniCrossword(**puzzle)
-
-    print("Generating candidate answers for the crossword clues...", end="", flush=True)
-    across_tasks = [generate_candidates(clue.clue, clue.length) for clue in crossword.across]
-    across_candidates = await asyncio.gather(*across_tasks)
-    down_tasks = [generate_candidates(clue.clue, clue.length) for clue in crossword.down]
-    down_candidates = await asyncio.gather(*down_tasks)
-    print(" Done.")
-
-    for i in trange(args.max_improvements, desc="Improving solution"):
-        best_crossword = best_solution(crossword, across_candidates, down_candidates)
-
-        worst_score = 1
-        worst_clue_orientation = None
-        worst_clue_idx = None
-
-        for i, clue in enumerate(best_crossword.across):
-            if clue.consistency_score < worst_score:
-                worst_score = clue.consistency_score
-                worst_clue_orientation = "across"
-                worst_clue_idx = i
-        for i, clue in enumerate(best_crossword.down):
-            if clue.consistency_score < worst_score:
-                worst_score = clue.consistency_score
-                worst_clue_orientation = "down"
-                worst_clue_idx = i
-
-        if worst_score == 1:
-            break
+        if beam_width is None and neighborhood_size is None and num_clues > MAX_EXACT_SEARCH_CLUES:
+            neighborhood_size = NEIGHBORHOOD_SIZE
+        if beam_width is not None:
+            mode = "beam"
         else:
-            intersections = get_intersecting_clues(best_crossword, worst_clue_orientation, worst_clue_idx)
+            mode = "exact" if neighborhood_size is None else "neighborhood"
+
+        async def search() -> Solution:
+            # The search state is kept across improvement steps, so each step only explores the new candidates.
+            nonlocal crossword_search, alternatives
+            start = time.perf_counter()
+            with get_tracer().span("search", mode=mode) as span:
+                if mode == "beam":
+                    call = functools.partial(
+                        resume_beam_search,
+                        crossword_search,
+                        beam_width,
+                        top_k=top_k,
+                        confidence_weight=confidence_weight,
+                    )
+                elif mode == "neighborhood" and search_workers is not None:
+                    sizes = [neighborhood_size + i for i in range(search_workers)]
+                    call = functools.partial(
+                        parallel_neighborhood_search, crossword_search, executor, sizes, time_limit=search_time_limit
+                    )
+                elif mode == "neighborhood":
+                    call = functools.partial(
+                        resume_neighborhood_search, crossword_search, neighborhood_size, time_limit=search_time_limit
+                    )
+                elif search_workers is not None:
+                    call = functools.partial(
+                        parallel_search,
+                        crossword_search,
+                        executor,
+                        num_parts=PARTS_PER_WORKER * search_workers,
+                        time_limit=search_time_limit,
+                    )
+                else:
+                    call = functools.partial(resume_search, crossword_search, time_limit=search_time_limit)
+                if executor is None:
+                    solution, crossword_search = call()
+                elif search_workers is not None and mode != "beam":
+                    # The call hands its parts to the executor and waits for them, so it runs in a thread.
+                    solution, crossword_search = await asyncio.to_thread(call)
+                else:
+                    solution, crossword_search = await asyncio.get_running_loop().run_in_executor(executor, call)
+                if mode == "beam":
+                    solution, alternatives = (solution[0], solution[1:]) if solution else (None, [])
+                span.set(
+                    nodes=crossword_search.nodes,
+                    pruned=crossword_search.pruned,
+                    scored=crossword_search.scored,
+                    complete=crossword_search.complete,
+                )
+            elapsed = time.perf_counter() - start
+            timings["search"] += elapsed
+            metrics = get_metrics()
+            metrics.observe("search_seconds", elapsed, mode=mode)
+            metrics.increment("search_nodes_total", crossword_search.nodes, mode=mode)
+            metrics.increment("search_pruned_total", crossword_search.pruned, mode=mode)
+            metrics.increment("search_scored_total", crossword_search.scored, mode=mode)
+            return solution
+
+        def finish_step(start: float, slot: int, outcome: str, num_new: int):
+            get_tracer().record("improvement_step", start, clue=clues[slot].clue, outcome=outcome)
+            get_metrics().increment("improvement_steps_total", outcome=outcome)
+            if listener is not None:
+                orientation, idx = ("across", slot) if slot < num_across else ("down", slot - num_across)
+                listener(
+                    {
+                        "event": "improvement",
+                        "orientation": orientation,
+                        "index": idx,
+                        "clue": clues[slot].clue,
+                        "outcome": outcome,
+                        "new_candidates": num_new,
+                    }
+                )
+
+        def report(step: int, solution: Solution):
+            if listener is not None and solution is not None:
+                listener(
+                    {
+                        "event": "solution",
+                        "step": step,
+                        "score": round(sum(solution.clue_scores), 2),
+                        "grid": fill_grid(build_crossword(crossword, solution)),
+                        "alternatives": [
+                            {
+                                "score": round(sum(other.clue_scores), 2),
+                                "grid": fill_grid(build_crossword(crossword, other)),
+                                "answers": list(other.answers),
+                            }
+                            for other in alternatives
+                        ],
+                    }
+                )
+
+        clues = crossword.across + crossword.down
+        num_across = len(crossword.across)
+        # The ids of the candidates in the stores are their indices in the search.
+        stores = [CandidateStore(clue.length, max_candidates=max_candidates) for clue in clues]
+        crossword_search = CrosswordSearch(crossword, [[] for _ in crossword.across], [[] for _ in crossword.down])
+        # The runners-up of the last beam search, best first.
+        alternatives = []
+
+        def receive(orientation: str, idx: int, candidates: dict[str, float]):
+            # Candidates go into the search as they arrive, so that only the layout is left once the last one does.
+            slot = idx if orientation == "across" else num_across + idx
+            crossword_search.add_candidates(slot, stores[slot].add(candidates))
+
+        start = time.perf_counter()
+        await generate_all_candidates(
+            crossword,
+            cache=cache,
+            max_in_flight=max_in_flight,
+            batch_clues=batch_clues,
+            listener=listener,
+            on_candidates=receive,
+        )
+        timings["candidates"] += time.perf_counter() - start
+
+        async def improve(solution: Solution, slot: int):
+            start = time.perf_counter()
+            answers = solution.answers
+            if slot < num_across:
+                intersections = crossword.clue_crossings["across"][slot]
+                other_offset = num_across
+            else:
+                intersections = crossword.clue_crossings["down"][slot - num_across]
+                other_offset = 0
             intersections_to_consider = []
-            for intersection in intersections:
-                if intersection[2].consistency_score > 0.5:
-                    try:
-                        intersections_to_consider.append((intersection[0], intersection[2].answer[intersection[1]]))
-                    except IndexError:  # Other answer is too short
-                        pass
+            for pos, other_pos, other_idx in intersections:
+                other_slot = other_offset + other_idx
+                # Skip other answers that are too short
+                if solution.clue_scores[other_slot] > 0.5 and other_pos < len(answers[other_slot]):
+                    intersections_to_consider.append((pos, answers[other_slot][other_pos]))
             if len(intersections_to_consider) == len(intersections):
-                # All intersections are consistent, so it is likely that we can construct a correct answer
-                # for this clue using the intersections
+                # All intersections are consistent, so it is likely that we can construct a correct answer for this
+                # clue using the intersections
                 new_candidate = "".join(intersection[1] for intersection in intersections_to_consider)
-                correctness_agent = correctness_agent_factory()
-                is_correct = await correctness_agent.on_messages(
-                    [
-                        TextMessage(
-                            content=f"Clue: {best_crossword.across[worst_clue_idx].clue} Candidate: {new_candidate}",
-                            source="User",
+                confidence = DEFAULT_CONFIDENCE
+                if lexicon is not None and new_candidate in lexicon:
+                    # A real word that agrees with every crossing is accepted without asking a model, but like a
+                    # lexicon fill it is not known to answer the clue.
+                    is_correct = True
+                    confidence = LEXICON_CONFIDENCE
+                else:
+                    async with correctness_agents.acquire() as correctness_agent:
+                        is_correct = await correctness_agent.on_messages(
+                            [
+                                TextMessage(
+                                    content=f"Clue: {clues[slot].clue} Candidate: {new_candidate}", source="User"
+                                )
+                            ],
+                            cancellation_token=CancellationToken(),
                         )
-                    ],
-                    cancellation_token=CancellationToken(),
-                )
-                is_correct = json.loads(is_correct.chat_message.content)["is_correct"]
+                    is_correct = json.loads(is_correct.chat_message.content)["is_correct"]
                 if is_correct:
-                    if worst_clue_orientation == "across":
-                        across_candidates[worst_clue_idx].append(new_candidate)
-                    else:
-                        down_candidates[worst_clue_idx].append(new_candidate)
-                    continue
-            if worst_clue_orientation == "across":
-                candidates = await generate_candidates(
-                    best_crossword.across[worst_clue_idx].clue,
-                    best_crossword.across[worst_clue_idx].length,
-                    exclude=across_candidates[worst_clue_idx],
-                    intersections=intersections_to_consider,
+                    added = crossword_search.add_candidates(slot, stores[slot].add({new_candidate: confidence}))
+                    finish_step(start, slot, "crossing_answer", added)
+                    return
+            new_candidates = []
+            if lexicon is not None:
+                new_candidates = dict.fromkeys(
+                    lexicon.fill(clues[slot].length, intersections_to_consider, exclude=list(stores[slot])),
+                    LEXICON_CONFIDENCE,
                 )
-                across_candidates[worst_clue_idx].extend(candidates)
-            else:
-                candidates = await generate_candidates(
-                    best_crossword.down[worst_clue_idx].clue,
-                    best_crossword.down[worst_clue_idx].length,
-                    exclude=down_candidates[worst_clue_idx],
+            outcome = "lexicon_fill"
+            if not new_candidates:
+                outcome = "generated"
+                new_candidates = await generate_candidates(
+                    clues[slot].clue,
+                    clues[slot].length,
+                    exclude=list(stores[slot]),
                     intersections=intersections_to_consider,
+                    cache=cache,
                 )
-                down_candidates[worst_clue_idx].extend(candidates)
+            added = crossword_search.add_candidates(slot, stores[slot].add(new_candidates))
+            finish_step(start, slot, outcome, added)
+
+        num_steps = 0
+        for _ in trange(max_improvements, desc="Improving solution", disable=not progress):
+            solution = await search()
+            report(num_steps, solution)
+            # The weakest clues are improved together, each against the crossings of the same solution.
+            weak_slots = sorted(
+                (slot for slot, score in enumerate(solution.clue_scores) if score < 1 and not stores[slot].full),
+                key=lambda slot: solution.clue_scores[slot],
+            )[:improvements_per_round]
+            if not weak_slots:
+                break
+            # The solver is waiting on these calls, so they are served before any bulk prefetching.
+            start = time.perf_counter()
+            with request_priority(PRIORITY_IMPROVEMENT):
+                await asyncio.gather(*(improve(solution, slot) for slot in weak_slots))
+            timings["improvements"] += time.perf_counter() - start
+            num_steps += 1
+
+        get_metrics().increment("candidates_dropped_total", sum(store.dropped for store in stores))
+        # Only the final winner is turned into a crossword with answers and scores.
+        solution = await search()
+        report(num_steps, solution)
+        return build_crossword(crossword, solution)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Generate candidate answers for a crossword clue.")
+    parser.add_argument(
+        "puzzle_path",
+        type=str,
+        help="The path to the crossword puzzle JSON file, or the id of the puzzle with --archive.",
+    )
+    parser.add_argument("max_improvements", type=int, help="The maximum number of improvements to make.")
+    parser.add_argument("--archive", type=str, default=None, help="Read the puzzle from this puzzle archive.")
+    add_solver_arguments(parser)
+
+    args = parser.parse_args()
+
+    if args.archive is not None:
+        crossword = PuzzleArchive(Path(args.archive))[args.puzzle_path]
+    else:
+        with open(Path(args.puzzle_path)) as f:
+            puzzle = json.load(f)
+        crossword = MiniCrossword(**puzzle)
+    cache = None if args.no_cache else CandidateCache(args.cache_dir, ttl=args.cache_ttl, offline=args.offline)
+    lexicon = None if args.lexicon is None else Lexicon(args.lexicon)
+    if args.trace is not None:
+        set_tracer(Tracer())
+
+    executor = None
+    if args.search_workers is not None:
+        executor = ProcessPoolExecutor(args.search_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    # The last solution event carries the other grids kept by the beam search.
+    last_solution = {}
+
+    def listen(event: dict):
+        if event["event"] == "solution":
+            last_solution.update(event)
 
+    print("Solving the crossword...", flush=True)
+    try:
+        best_crossword = await solve_crossword(
+            crossword,
+            args.max_improvements,
+            cache=cache,
+            max_in_flight=args.max_in_flight,
+            search_time_limit=args.search_time_limit,
+            executor=executor,
+            progress=True,
+            lexicon=lexicon,
+            beam_width=args.beam_width,
+            confidence_weight=args.confidence_weight,
+            top_k=args.top_k,
+            batch_clues=args.batch_clues,
+            neighborhood_size=args.neighborhood_size,
+            improvements_per_round=args.improvements_per_round,
+            search_workers=args.search_workers,
+            max_candidates=args.max_candidates,
+            listener=listen,
+        )
+    finally:
+        if executor is not None:
+            executor.shutdown()
     for clue in best_crossword.across + best_crossword.down:
         print(f"Clue: {clue.clue} -------- Answer: {clue.answer} -------- Consistency Score: {clue.consistency_score}")
+    for rank, alternative in enumerate(last_solution.get("alternatives", []), start=2):
+        print(f"Alternative {rank} (score {alternative['score']}):")
+        print("\n".join(alternative["grid"]))
+    if cache is not None:
+        print(f"Candidate cache: {cache.hits} hits, {cache.misses} misses.")
+    if args.trace is not None:
+        get_tracer().dump(args.trace, metrics=get_metrics())
 
 
-asyncio.run(main())
+if __name__ == "__main__":
+    asyncio.run(main())
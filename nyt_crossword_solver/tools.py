@@ -1,14 +1,19 @@
+import asyncio
 import functools
 import os
+from collections import OrderedDict
 
 from autogen_core.tools import FunctionTool
-from google import genai
-from google.genai import types as genai_types
 
-_google_genai_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-_google_generate_content_config = genai_types.GenerateContentConfig(
-    tools=[genai_types.Tool(google_search=genai_types.GoogleSearch())], response_modalities=["TEXT"]
-)
+from nyt_crossword_solver.clients import get_client, register_client
+from nyt_crossword_solver.crossword import filter_invalid_characters
+from nyt_crossword_solver.scheduler import get_scheduler
+from nyt_crossword_solver.tracing import get_metrics, get_tracer, record_usage
+
+ORACLE_MODEL = "gemini-2.0-flash"
+ORACLE_MEMO_SIZE = 1024
+_oracle_memo: OrderedDict[str, str] = OrderedDict()
+_oracle_in_flight: dict[str, asyncio.Task] = {}
 
 
 def nyt_crossword_tool(fn: callable):
@@ -16,23 +21,13 @@ def nyt_crossword_tool(fn: callable):
 
     @functools.wraps(fn)
     async def wrapper(*args, **kwargs):
-        return await fn(*args, **kwargs)
+        get_metrics().increment("tool_calls_total", tool=fn.__name__)
+        with get_tracer().span("tool", tool=fn.__name__):
+            return await fn(*args, **kwargs)
 
     return FunctionTool(wrapper, description=description, strict=True)
 
 
-def filter_invalid_characters(answer: str) -> str:
-    """Filter out invalid characters from a candidate answer.
-
-    Args:
-        answer (str): The candidate answer.
-
-    Returns:
-        str: The filtered candidate answer.
-    """
-    return "".join(char.upper() for char in answer if char.isalpha())
-
-
 @nyt_crossword_tool
 async def answer_len(answer: str) -> int:
     """Return the length of answer to a clue. Does not count special characters including spaces.
@@ -60,9 +55,29 @@ async def get_nth_character(answer: str, n: int) -> str:
     return filter_invalid_characters(answer)[n]
 
 
-@nyt_crossword_tool
-async def ask_oracle(query: str) -> str:
-    """Find accurate answers to a query.
+def _make_oracle_client():
+    """Create the Google GenAI client of the oracle."""
+    # Imported here since the SDK is slow to import and only needed once the oracle is asked.
+    from google import genai
+
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+register_client("oracle", _make_oracle_client)
+
+
+@functools.cache
+def _oracle_config():
+    """The generation config of the oracle, which grounds its answers in Google Search."""
+    from google.genai import types as genai_types
+
+    return genai_types.GenerateContentConfig(
+        tools=[genai_types.Tool(google_search=genai_types.GoogleSearch())], response_modalities=["TEXT"]
+    )
+
+
+async def _query_oracle(query: str) -> str:
+    """Send a query to the oracle model without blocking the event loop.
 
     Args:
         query (str): The query to search the for.
@@ -74,9 +89,55 @@ async def ask_oracle(query: str) -> str:
         f"""Always search the web and answer the following question."""
         f"""ONLY give the answer WITHOUT any exta details in as few words as possible:\nQuery: {query}"""
     )
-    response = _google_genai_client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt,
-        config=_google_generate_content_config,
+    client, config = get_client("oracle"), _oracle_config()
+    response = await get_scheduler().submit(
+        ORACLE_MODEL,
+        lambda: client.aio.models.generate_content(model=ORACLE_MODEL, contents=prompt, config=config),
     )
+    usage = response.usage_metadata
+    if usage is not None:
+        record_usage(ORACLE_MODEL, usage.prompt_token_count or 0, usage.candidates_token_count or 0, agent="oracle")
     return response.candidates[0].content.parts[-1].text
+
+
+def _remember_oracle_answer(key: str, task: asyncio.Task):
+    """Move a finished oracle request from the in-flight table to the memo."""
+    _oracle_in_flight.pop(key, None)
+    if task.cancelled() or task.exception() is not None:
+        return
+    _oracle_memo[key] = task.result()
+    _oracle_memo.move_to_end(key)
+    while len(_oracle_memo) > ORACLE_MEMO_SIZE:
+        _oracle_memo.popitem(last=False)
+
+
+def clear_oracle_memo():
+    """Forget the memoized oracle answers and the requests in flight, e.g. after replacing the oracle client."""
+    _oracle_memo.clear()
+    _oracle_in_flight.clear()
+
+
+@nyt_crossword_tool
+async def ask_oracle(query: str) -> str:
+    """Find accurate answers to a query.
+
+    Args:
+        query (str): The query to search the for.
+
+    Returns:
+        str: The answer to the query.
+    """
+    # Answers are memoized and concurrent identical queries share a single request.
+    key = " ".join(query.split())
+    if key in _oracle_memo:
+        _oracle_memo.move_to_end(key)
+        get_metrics().increment("oracle_queries_total", outcome="memo")
+        return _oracle_memo[key]
+    task = _oracle_in_flight.get(key)
+    get_metrics().increment("oracle_queries_total", outcome="new" if task is None else "coalesced")
+    if task is None:
+        task = asyncio.ensure_future(_query_oracle(query))
+        task.add_done_callback(functools.partial(_remember_oracle_answer, key))
+        _oracle_in_flight[key] = task
+    # Shield the shared request so that cancelling one caller does not cancel it for the others.
+    return await asyncio.shield(task)
@@ -0,0 +1,315 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Optional
+
+# USD per million prompt and completion tokens.
+MODEL_PRICES = {"gpt-4o": (2.50, 10.00), "gemini-2.0-flash": (0.10, 0.40)}
+MAX_SPANS = 100_000  # Spans kept by a tracer, so that tracing a long-running service does not use up the memory.
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation, nested in the span that was current when it started."""
+
+    __slots__ = ("name", "span_id", "parent_id", "lane", "start", "end", "attributes")
+
+    def __init__(self, name: str, span_id: int, parent_id: Optional[int], lane: int, attributes: dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.lane = lane
+        self.start = time.perf_counter()
+        self.end = None
+        self.attributes = attributes
+
+    def set(self, **attributes: Any):
+        """Add attributes to the span."""
+        self.attributes.update(attributes)
+
+
+class _NoopSpan:
+    def set(self, **attributes: Any):
+        pass
+
+
+_NOOP_CONTEXT = contextlib.nullcontext(_NoopSpan())
+
+
+class Tracer:
+    """Records spans and exports them in the Chrome trace event format (viewable in Perfetto or chrome://tracing).
+
+    A disabled tracer hands out a shared no-op span, so instrumented code costs a function call when tracing is off.
+    Spans of different asyncio tasks are put on different lanes, and the lane of a task is handed to a later task
+    once it is done. Only the last `max_spans` finished spans are kept.
+
+    Args:
+        enabled (bool, optional): Whether to record spans. Defaults to True.
+        max_spans (int, optional): The maximum number of spans kept, dropping the oldest ones. Defaults to
+            `MAX_SPANS`.
+    """
+
+    def __init__(self, enabled: bool = True, max_spans: int = MAX_SPANS):
+        self.enabled = enabled
+        self.spans: deque[Span] = deque(maxlen=max_spans)
+        self.dropped = 0  # Spans dropped to stay under `max_spans`.
+        self._ids = itertools.count(1)
+        self._lanes: dict[int, int] = {}
+        self._free_lanes: list[int] = []  # Heap of the lanes released by finished tasks.
+        self._num_lanes = 0
+        self._origin = time.perf_counter()
+
+    def _lane(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        # Threads are few and long-lived (e.g. the default executor), so their lanes are never released.
+        key = threading.get_ident() if task is None else id(task)
+        lane = self._lanes.get(key)
+        if lane is None:
+            if self._free_lanes:
+                lane = heapq.heappop(self._free_lanes)
+            else:
+                self._num_lanes += 1
+                lane = self._num_lanes
+            self._lanes[key] = lane
+            if task is not None:
+                # Task ids are reused once a task is gone, so the entry must not outlive the task.
+                task.add_done_callback(lambda _: self._release_lane(key))
+        return lane
+
+    def _release_lane(self, key: int):
+        lane = self._lanes.pop(key, None)
+        if lane is not None:
+            heapq.heappush(self._free_lanes, lane)
+
+    def _finish(self, span: Span):
+        if len(self.spans) == self.spans.maxlen:
+            self.dropped += 1
+        self.spans.append(span)
+
+    def _new_span(self, name: str, attributes: dict[str, Any]) -> Span:
+        parent = _current_span.get()
+        return Span(name, next(self._ids), None if parent is None else parent.span_id, self._lane(), attributes)
+
+    def span(self, name: str, **attributes: Any) -> contextlib.AbstractContextManager:
+        """Time the enclosed block as a span, which becomes the parent of the spans started within it.
+
+        Args:
+            name (str): The name of the span.
+            **attributes: The attributes of the span.
+
+        Returns:
+            contextlib.AbstractContextManager: A context manager yielding the span, to which attributes can be added.
+        """
+        if not self.enabled:
+            return _NOOP_CONTEXT
+        return self._span(name, attributes)
+
+    @contextlib.contextmanager
+    def _span(self, name: str, attributes: dict[str, Any]):
+        span = self._new_span(name, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.set(error=type(error).__name__)
+            raise
+        finally:
+            span.end = time.perf_counter()
+            self._finish(span)
+            with contextlib.suppress(ValueError):  # The block may end in another context, e.g. a closed generator.
+                _current_span.reset(token)
+
+    def record(self, name: str, start: float, **attributes: Any):
+        """Record a span that started earlier and ends now, for operations that cannot be wrapped in a block.
+
+        Args:
+            name (str): The name of the span.
+            start (float): The start time from `time.perf_counter`.
+            **attributes: The attributes of the span.
+        """
+        if not self.enabled:
+            return
+        span = self._new_span(name, attributes)
+        span.start = start
+        span.end = time.perf_counter()
+        self._finish(span)
+
+    def to_chrome_trace(self) -> dict:
+        """Export the finished spans as Chrome trace events.
+
+        Returns:
+            dict: The trace, with times in microseconds since the tracer was created.
+        """
+        pid = os.getpid()
+        events = [
+            {
+                "name": span.name,
+                "ph": "X",
+                "ts": (span.start - self._origin) * 1e6,
+                "dur": (span.end - span.start) * 1e6,
+                "pid": pid,
+                "tid": span.lane,
+                "args": {"span_id": span.span_id, "parent_id": span.parent_id, **span.attributes},
+            }
+            for span in sorted(self.spans, key=lambda span: span.start)
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: Path, metrics: Optional["MetricsRegistry"] = None):
+        """Write the trace to a JSON file.
+
+        Args:
+            path (Path): The path to the trace file.
+            metrics (Optional[MetricsRegistry], optional): Metrics to include in the file. Defaults to None.
+        """
+        trace = self.to_chrome_trace()
+        if self.dropped:
+            trace["dropped_spans"] = self.dropped
+        if metrics is not None:
+            trace["metrics"] = metrics.snapshot()
+        with open(path, "w") as f:
+            json.dump(trace, f, default=str)
+
+
+class MetricsRegistry:
+    """In-process counters and summaries (count, sum, min and max of observed values), keyed by name and labels."""
+
+    def __init__(self):
+        self._counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+        self._summaries: dict[tuple[str, tuple[tuple[str, str], ...]], list[float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, Any]) -> tuple[str, tuple[tuple[str, str], ...]]:
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items() if value is not None))
+
+    def increment(self, name: str, value: float = 1, **labels: Any):
+        """Add to a counter.
+
+        Args:
+            name (str): The name of the counter.
+            value (float, optional): The amount to add. Defaults to 1.
+            **labels: The labels of the counter. Labels set to None are left out.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any):
+        """Record a value in a summary.
+
+        Args:
+            name (str): The name of the summary.
+            value (float): The value.
+            **labels: The labels of the summary. Labels set to None are left out.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                self._summaries[key] = [1, value, value, value]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                summary[2] = min(summary[2], value)
+                summary[3] = max(summary[3], value)
+
+    def counter(self, name: str, **labels: Any) -> float:
+        """Get the value of a counter, or 0 if it was never incremented."""
+        return self._counters.get(self._key(name, labels), 0)
+
+    def snapshot(self) -> dict:
+        """Get the current values of all metrics.
+
+        Returns:
+            dict: The counters and summaries, each with their name, labels and values.
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            summaries = [
+                {"name": name, "labels": dict(labels), "count": count, "sum": total, "min": low, "max": high}
+                for (name, labels), (count, total, low, high) in sorted(self._summaries.items())
+            ]
+        return {"counters": counters, "summaries": summaries}
+
+    def render(self) -> str:
+        """Render the metrics in the Prometheus text format, for scraping.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+
+        def sample(name: str, labels: dict[str, str], value: float) -> str:
+            if not labels:
+                return f"{name} {value}"
+            rendered = ",".join(f'{label}="{value}"' for label, value in labels.items())
+            return f"{name}{{{rendered}}} {value}"
+
+        snapshot = self.snapshot()
+        lines = [sample(counter["name"], counter["labels"], counter["value"]) for counter in snapshot["counters"]]
+        for summary in snapshot["summaries"]:
+            lines.append(sample(f"{summary['name']}_count", summary["labels"], summary["count"]))
+            lines.append(sample(f"{summary['name']}_sum", summary["labels"], summary["sum"]))
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+
+_tracer = Tracer(enabled=False)
+_metrics = MetricsRegistry()
+
+
+def get_tracer() -> Tracer:
+    """Get the tracer shared by all instrumented code. Disabled unless replaced with `set_tracer`."""
+    return _tracer
+
+
+def set_tracer(tracer: Tracer):
+    """Replace the tracer shared by all instrumented code, e.g. to enable tracing.
+
+    Args:
+        tracer (Tracer): The new tracer.
+    """
+    global _tracer
+    _tracer = tracer
+
+
+def get_metrics() -> MetricsRegistry:
+    """Get the metrics registry shared by all instrumented code."""
+    return _metrics
+
+
+def record_usage(model: str, prompt_tokens: int, completion_tokens: int, agent: Optional[str] = None):
+    """Count the tokens of a model call and their cost.
+
+    Args:
+        model (str): The name of the model.
+        prompt_tokens (int): The number of prompt tokens.
+        completion_tokens (int): The number of completion tokens.
+        agent (Optional[str], optional): The agent that made the call. Defaults to None.
+    """
+    metrics = get_metrics()
+    metrics.increment("model_tokens_total", prompt_tokens, model=model, agent=agent, kind="prompt")
+    metrics.increment("model_tokens_total", completion_tokens, model=model, agent=agent, kind="completion")
+    if model in MODEL_PRICES:
+        prompt_price, completion_price = MODEL_PRICES[model]
+        cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+        metrics.increment("model_cost_usd_total", cost, model=model, agent=agent)
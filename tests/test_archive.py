@@ -0,0 +1,64 @@
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from nyt_crossword_solver.archive import PuzzleArchive, find_puzzles, read_puzzles
+from nyt_crossword_solver.benchmark import make_puzzle, synthetic_crossword
+
+EXTRACTED_DIR = Path(__file__).parent.parent / "puzzles" / "extracted"
+
+
+@pytest.fixture(scope="module")
+def puzzles():
+    """The extracted puzzles, and synthetic rectangular grids solved with scores, some clues left unanswered."""
+    puzzles = dict(read_puzzles(find_puzzles([str(EXTRACTED_DIR)])))
+    rng = random.Random(0)
+    for rows, cols in ((5, 5), (7, 9), (15, 15)):
+        crossword = synthetic_crossword((rows, cols), seed=rows)
+        answers = make_puzzle(f"{rows}x{cols}", crossword, seed=0).answers
+        for clue in crossword.across + crossword.down:
+            if rng.random() < 0.8:
+                clue.answer = answers[clue.clue]
+                clue.consistency_score = rng.random()
+        puzzles[f"synthetic-{rows}x{cols}"] = crossword
+    return puzzles
+
+
+def test_random_access_round_trip(puzzles, tmp_path):
+    PuzzleArchive.build(puzzles.items(), tmp_path)
+    archive = PuzzleArchive(tmp_path)
+    assert len(archive) == len(puzzles)
+    assert archive.ids == list(puzzles)
+    ids = list(puzzles)
+    random.Random(1).shuffle(ids)
+    for puzzle_id in ids:
+        assert puzzle_id in archive
+        assert archive[puzzle_id].model_dump() == puzzles[puzzle_id].model_dump()
+    assert "missing" not in archive
+    with pytest.raises(KeyError):
+        archive["missing"]
+
+
+def test_items_across_chunks(puzzles, tmp_path, monkeypatch):
+    monkeypatch.setattr("nyt_crossword_solver.archive.LOAD_CHUNK_SIZE", 2)
+    archive = PuzzleArchive.build(puzzles.items(), tmp_path)
+    assert [(puzzle_id, crossword.model_dump()) for puzzle_id, crossword in archive.items()] == [
+        (puzzle_id, crossword.model_dump()) for puzzle_id, crossword in puzzles.items()
+    ]
+
+
+def test_build_from_results_and_export(puzzles, tmp_path):
+    solved_id = "synthetic-7x9"
+    results = tmp_path / "results.jsonl"
+    with open(results, "w") as f:
+        f.write(json.dumps({"puzzle": solved_id, "solution": puzzles[solved_id].model_dump(), "error": None}) + "\n")
+        f.write(json.dumps({"puzzle": "failed", "solution": None, "error": "TimeoutError"}) + "\n")
+    archive = PuzzleArchive.build(read_puzzles(find_puzzles([str(EXTRACTED_DIR), str(results)])), tmp_path / "archive")
+    assert sorted(archive.ids) == sorted([path.stem for path in EXTRACTED_DIR.glob("*.json")] + [solved_id])
+
+    paths = archive.export_json(tmp_path / "exported", ids=[solved_id])
+    assert [path.name for path in paths] == [f"{solved_id}.json"]
+    with open(paths[0]) as f:
+        assert json.load(f) == puzzles[solved_id].model_dump(mode="json")
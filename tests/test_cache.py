@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from nyt_crossword_solver.benchmark import FakeModelBackend, install_fake_backend
+from nyt_crossword_solver.cache import CandidateCache, candidates_key
+from nyt_crossword_solver.solve import generate_candidates
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr("nyt_crossword_solver.cache.time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_key_ignores_order_and_duplicates_of_hints():
+    assert candidates_key("clue", 5, exclude=["B", "A", "A"], intersections=[(2, "C"), (0, "D")]) == candidates_key(
+        "clue", 5, exclude=["A", "B"], intersections=[(0, "D"), (2, "C")]
+    )
+    assert candidates_key("clue", 5) != candidates_key("clue", 6)
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = CandidateCache(tmp_path, ttl=60)
+    cache.put("key", {"ANSWER": 0.5})
+    clock.now += 59
+    assert cache.get("key") == {"ANSWER": 0.5}
+    clock.now += 2
+    assert cache.get("key") is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = CandidateCache(tmp_path, max_entries=2)
+    cache.put("first", ["A"])
+    clock.now += 1
+    cache.put("second", ["B"])
+    clock.now += 1
+    assert cache.get("first") == ["A"]  # Now more recently used than "second".
+    clock.now += 1
+    cache.put("third", ["C"])
+    assert len(cache) == 2
+    assert cache.get("second") is None
+    assert cache.get("first") == ["A"]
+    assert cache.get("third") == ["C"]
+
+
+def test_entries_persist_across_instances(tmp_path):
+    CandidateCache(tmp_path).put("key", {"ANSWER": 0.5})
+    assert CandidateCache(tmp_path).get("key") == {"ANSWER": 0.5}
+
+
+def test_offline_cache_serves_hits_and_raises_on_misses(tmp_path):
+    CandidateCache(tmp_path).put(candidates_key("cached clue", 6), {"ANSWER": 0.5})
+    cache = CandidateCache(tmp_path, offline=True)
+    assert cache.get(candidates_key("cached clue", 6)) == {"ANSWER": 0.5}
+    with pytest.raises(LookupError):
+        cache.get(candidates_key("new clue", 6))
+
+    backend = FakeModelBackend({})
+    uninstall = install_fake_backend(backend)
+    try:
+        assert asyncio.run(generate_candidates("cached clue", 6, cache=cache)) == {"ANSWER": 0.5}
+        with pytest.raises(LookupError):
+            asyncio.run(generate_candidates("new clue", 6, cache=cache))
+    finally:
+        uninstall()
+    # Neither lookup reached a model, and nothing was written to the cache.
+    assert backend.num_calls == 0
+    assert len(cache) == 1
@@ -0,0 +1,41 @@
+from nyt_crossword_solver.candidates import DEFAULT_CONFIDENCE, CandidateStore, candidate_confidences
+
+
+def test_candidates_are_normalized_and_deduplicated():
+    assert candidate_confidences({"new york": 0.4, "NEW-YORK": 0.9, "Maine": 0.2}) == {"NEWYORK": 0.9, "MAINE": 0.2}
+    assert candidate_confidences(["a b", "AB"]) == {"AB": DEFAULT_CONFIDENCE}
+
+    store = CandidateStore(5, {"apple": 0.3, "Ap-ple": 0.6, "maple": 0.5})
+    assert store.items() == {"APPLE": 0.6, "MAPLE": 0.5}
+    # Candidates the store already has are not added again, whatever their confidence.
+    assert store.add({"apple": 0.9, "ample": 0.4}) == {"AMPLE": 0.4}
+    assert store.items() == {"APPLE": 0.6, "MAPLE": 0.5, "AMPLE": 0.4}
+    assert store.ids == {"APPLE": 0, "MAPLE": 1, "AMPLE": 2}
+    assert "a.m.p.l.e" in store
+    assert store.dropped == 0
+
+
+def test_wrong_lengths_are_dropped():
+    store = CandidateStore(5, {"apples": 0.9, "apple": 0.5, "app": 0.7})
+    assert list(store) == ["APPLE"]
+    assert store.dropped == 2
+
+
+def test_clue_without_fitting_candidates_keeps_the_most_confident():
+    store = CandidateStore(5, {"apples": 0.4, "app": 0.7})
+    assert list(store) == ["APP"]
+    assert store.dropped == 1
+    # Once a clue has a candidate, candidates of the wrong length are dropped again.
+    assert store.add(["pear"]) == {}
+    assert store.add(["maple"]) == {"MAPLE": DEFAULT_CONFIDENCE}
+    assert list(store) == ["APP", "MAPLE"]
+
+
+def test_most_confident_candidates_are_kept_in_their_order():
+    store = CandidateStore(5, {"apple": 0.2}, max_candidates=3)
+    assert store.add({"maple": 0.1, "ample": 0.9, "amble": 0.5, "angle": 0.3}) == {"AMPLE": 0.9, "AMBLE": 0.5}
+    assert list(store) == ["APPLE", "AMPLE", "AMBLE"]
+    assert store.full
+    assert store.dropped == 2
+    assert store.add({"ankle": 1.0}) == {}
+    assert len(store) == 3
@@ -0,0 +1,33 @@
+import asyncio
+
+from PIL import Image as PILImage
+
+from nyt_crossword_solver.archive import PuzzleArchive, find_puzzles, read_puzzles
+from nyt_crossword_solver.benchmark import FakeModelBackend, install_fake_backend
+from nyt_crossword_solver.ingest import ingest_images
+
+GRID_STRUCTURE = "___/_#_/___"
+
+
+def test_archive_builds_from_ingested_directory(tmp_path):
+    images = []
+    for name, color in (("first", 0), ("second", 255)):
+        images.append(tmp_path / f"{name}.png")
+        PILImage.new("RGB", (64, 64), (color, color, color)).save(images[-1])
+    output_dir = tmp_path / "extracted"
+    uninstall = install_fake_backend(FakeModelBackend({}))
+    try:
+        counts = asyncio.run(
+            ingest_images(images, {"first": GRID_STRUCTURE, "second": GRID_STRUCTURE}, output_dir, max_concurrency=2)
+        )
+        assert counts == {"ingested": 2, "skipped": 0, "failed": 0}
+        # A second run finds both images in the manifest.
+        counts = asyncio.run(ingest_images(images, {"first": GRID_STRUCTURE, "second": GRID_STRUCTURE}, output_dir))
+        assert counts == {"ingested": 0, "skipped": 2, "failed": 0}
+    finally:
+        uninstall()
+
+    # The manifest of the ingested images must not be read as a puzzle.
+    archive = PuzzleArchive.build(read_puzzles(find_puzzles([str(output_dir)])), tmp_path / "archive")
+    assert sorted(puzzle_id for puzzle_id, _ in archive.items()) == ["first", "second"]
+    assert archive["first"].grid == ["___", "_#_", "___"]
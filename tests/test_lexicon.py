@@ -0,0 +1,50 @@
+import pytest
+
+from nyt_crossword_solver.lexicon import Lexicon, make_pattern, read_word_list
+
+WORDS = [("apple", 5.0), ("ample", 3.0), ("maple", 4.0), ("Amble", 1.0), ("angle", 2.0), "cat", "cot", "it's", "naïve"]
+
+
+@pytest.fixture(scope="module")
+def lexicon(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("lexicon")
+    Lexicon.build(WORDS, directory)
+    return Lexicon(directory)  # Loaded again, as from a directory built earlier.
+
+
+def test_match_ranks_by_score(lexicon):
+    assert lexicon.match("A?PLE") == ["APPLE", "AMPLE"]
+    assert lexicon.match("?????") == ["APPLE", "MAPLE", "AMPLE", "ANGLE", "AMBLE"]
+    assert lexicon.match("?????", limit=2) == ["APPLE", "MAPLE"]
+    assert lexicon.match("a_p.e") == ["APPLE", "AMPLE"]
+    assert lexicon.match("C?T") == ["CAT", "COT"]
+    assert lexicon.match("ZZZ") == []
+    assert lexicon.match("??????") == []
+    assert lexicon.count("???") == 3  # "it's" is indexed as ITS.
+
+
+def test_fill_returns_few_words_only(lexicon):
+    assert lexicon.fill(5, [(1, "M"), (2, "P")]) == ["AMPLE"]
+    assert lexicon.fill(5, [(0, "A")], exclude=["apple"]) == ["AMPLE", "ANGLE", "AMBLE"]
+    assert lexicon.fill(5, [(0, "A")], max_fills=3) == []  # Too many words for the lexicon to pick from.
+    assert lexicon.fill(5, []) == []
+
+
+def test_contains(lexicon):
+    assert "APPLE" in lexicon
+    assert "maple" in lexicon
+    assert "it's" in lexicon
+    assert "APPLES" not in lexicon
+    assert "NAIVE" not in lexicon  # Skipped, since it has a letter outside A-Z.
+    assert "" not in lexicon
+    assert len(lexicon) == 8
+
+
+def test_read_word_list(tmp_path):
+    path = tmp_path / "words.txt"
+    path.write_text("apple;50\nmaple\t30\n\ncat\n")
+    assert read_word_list(path) == [("apple", 50.0), ("maple", 30.0), ("cat", 0.0)]
+
+
+def test_make_pattern():
+    assert make_pattern(5, [(0, "A"), (3, "L"), (7, "X")]) == "A??L?"
@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from nyt_crossword_solver.scheduler import (
+    PRIORITY_IMPROVEMENT,
+    PRIORITY_PREFETCH,
+    ModelLimits,
+    ModelScheduler,
+    is_retryable,
+    request_priority,
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """The bounds of the jittered backoff delays drawn by the scheduler, which then waits for none of them."""
+    delays = []
+
+    def uniform(low: float, high: float) -> float:
+        delays.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr("nyt_crossword_solver.scheduler.random", SimpleNamespace(uniform=uniform))
+    return delays
+
+
+def failing_call(errors: list[Exception], result: str = "result"):
+    """A call that raises the given errors on its first attempts and then returns the result."""
+    attempts = []
+
+    async def call():
+        attempts.append(len(attempts))
+        if len(attempts) <= len(errors):
+            raise errors[len(attempts) - 1]
+        return result
+
+    return call, attempts
+
+
+def test_waiting_calls_are_served_by_priority():
+    async def run() -> list[str]:
+        scheduler = ModelScheduler(default_limits=ModelLimits(max_concurrency=1))
+        release, order = asyncio.Event(), []
+
+        async def record(name: str):
+            order.append(name)
+
+        blocker = asyncio.create_task(scheduler.submit("model", release.wait))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(scheduler.submit("model", lambda: record("prefetch"), priority=PRIORITY_PREFETCH)),
+            asyncio.create_task(scheduler.submit("model", lambda: record("middle"), priority=5)),
+        ]
+        with request_priority(PRIORITY_IMPROVEMENT):
+            # The task copies the context, so it keeps the priority after the block ends.
+            tasks.append(asyncio.create_task(scheduler.submit("model", lambda: record("improvement"))))
+        for _ in range(3):
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    assert asyncio.run(run()) == ["improvement", "middle", "prefetch"]
+
+
+def test_retryable_errors_are_retried_with_jittered_backoff(delays):
+    scheduler = ModelScheduler(base_delay=1.0, max_delay=3.0)
+    call, attempts = failing_call([TimeoutError(), StatusError(429), StatusError(503)])
+    assert asyncio.run(scheduler.submit("model", call)) == "result"
+    assert len(attempts) == 4
+    assert scheduler.retries == 3
+    # Full jitter up to an exponentially growing delay, capped at `max_delay`.
+    assert delays == [(0, 1.0), (0, 2.0), (0, 3.0)]
+
+
+def test_retries_give_up_after_max_retries(delays):
+    scheduler = ModelScheduler(max_retries=2)
+    call, attempts = failing_call([StatusError(500)] * 5)
+    with pytest.raises(StatusError):
+        asyncio.run(scheduler.submit("model", call))
+    assert len(attempts) == 3
+    assert scheduler.retries == 2
+
+
+def test_other_errors_are_raised_at_once(delays):
+    scheduler = ModelScheduler()
+    call, attempts = failing_call([StatusError(400)])
+    with pytest.raises(StatusError):
+        asyncio.run(scheduler.submit("model", call))
+    call, _ = failing_call([ValueError("bad response")])
+    with pytest.raises(ValueError):
+        asyncio.run(scheduler.submit("model", call))
+    assert len(attempts) == 1
+    assert scheduler.retries == 0
+    assert delays == []
+
+
+def test_is_retryable():
+    assert is_retryable(TimeoutError())
+    assert is_retryable(ConnectionError())
+    assert is_retryable(StatusError(429))
+    assert is_retryable(type("APIConnectionError", (Exception,), {})())
+    assert not is_retryable(StatusError(401))
+    assert not is_retryable(ValueError())
@@ -0,0 +1,114 @@
+import itertools
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from nyt_crossword_solver.crossword import Clue, MiniCrossword, get_clue_slots, score_assignment
+from nyt_crossword_solver.search import CrosswordSearch, parallel_search, resume_search
+
+MAX_ASSIGNMENTS = 20_000  # Keeps the brute force below a second per instance.
+
+
+def random_instance(seed: int) -> tuple[MiniCrossword, list[list[str]], list[list[str]]]:
+    """A random small grid with a few candidates per clue over a small alphabet, so that many crossings agree."""
+    rng = random.Random(seed)
+    while True:
+        height, width = rng.randint(3, 5), rng.randint(3, 5)
+        grid = ["".join("#" if rng.random() < 0.15 else "_" for _ in range(width)) for _ in range(height)]
+        across_slots, down_slots = get_clue_slots(grid)
+        if not across_slots or not down_slots:
+            continue
+        crossword = MiniCrossword(
+            grid=grid,
+            across=[
+                Clue(position=position, clue=f"a{i}", length=length)
+                for i, (position, length) in enumerate(across_slots)
+            ],
+            down=[
+                Clue(position=position, clue=f"d{i}", length=length) for i, (position, length) in enumerate(down_slots)
+            ],
+        )
+        candidates = []
+        for clue in crossword.across + crossword.down:
+            clue_candidates = []
+            for _ in range(rng.randint(1, 4)):
+                # Some candidates have the wrong length, which the search must score 0 like `score_assignment` does.
+                length = clue.length + (rng.choice([-1, 1]) if rng.random() < 0.1 else 0)
+                clue_candidates.append("".join(rng.choices("ABC", k=length)))
+            candidates.append(clue_candidates)
+        num_assignments = 1
+        for clue_candidates in candidates:
+            num_assignments *= len(set(clue_candidates))
+        if num_assignments <= MAX_ASSIGNMENTS:
+            num_across = len(crossword.across)
+            return crossword, candidates[:num_across], candidates[num_across:]
+
+
+def brute_force_score(crossword: MiniCrossword, across_candidates: list[list[str]], down_candidates: list[list[str]]):
+    """The best total consistency score over all assignments of candidates."""
+    best = 0.0
+    for across_answers in itertools.product(*across_candidates):
+        for down_answers in itertools.product(*down_candidates):
+            across_scores, down_scores = score_assignment(crossword, list(across_answers), list(down_answers))
+            best = max(best, sum(across_scores) + sum(down_scores))
+    return best
+
+
+def total_score(crossword: MiniCrossword) -> float:
+    return sum(clue.consistency_score for clue in crossword.across + crossword.down)
+
+
+def split_candidates(candidates: list[list[str]]) -> tuple[list[list[str]], list[list[str]]]:
+    """Split the candidates of every clue into a first batch (never empty) and the candidates added later."""
+    return [clue_candidates[: (len(clue_candidates) + 1) // 2] for clue_candidates in candidates], [
+        clue_candidates[(len(clue_candidates) + 1) // 2 :] for clue_candidates in candidates
+    ]
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("spawn")) as executor:
+        yield executor
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_search_matches_brute_force(seed):
+    crossword, across_candidates, down_candidates = random_instance(seed)
+    solved = CrosswordSearch(crossword, across_candidates, down_candidates).run()
+    assert total_score(solved) == pytest.approx(brute_force_score(crossword, across_candidates, down_candidates))
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_incremental_search_matches_brute_force(seed):
+    crossword, across_candidates, down_candidates = random_instance(seed)
+    across_first, across_later = split_candidates(across_candidates)
+    down_first, down_later = split_candidates(down_candidates)
+    search = CrosswordSearch(crossword, across_first, down_first)
+    solution, search = resume_search(search)
+    assert sum(solution.clue_scores) == pytest.approx(brute_force_score(crossword, across_first, down_first))
+
+    for slot, later in enumerate(across_later + down_later):
+        search.add_candidates(slot, later)
+    solution, search = resume_search(search)
+    assert search.complete
+    assert sum(solution.clue_scores) == pytest.approx(brute_force_score(crossword, across_candidates, down_candidates))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_parallel_search_matches_brute_force(seed, executor):
+    crossword, across_candidates, down_candidates = random_instance(seed)
+    solution, search = parallel_search(
+        CrosswordSearch(crossword, across_candidates, down_candidates), executor, num_parts=4
+    )
+    assert sum(solution.clue_scores) == pytest.approx(brute_force_score(crossword, across_candidates, down_candidates))
+
+    # Adding candidates after a parallel search only searches the assignments that use them.
+    across_first, across_later = split_candidates(across_candidates)
+    down_first, down_later = split_candidates(down_candidates)
+    solution, search = parallel_search(CrosswordSearch(crossword, across_first, down_first), executor, num_parts=4)
+    for slot, later in enumerate(across_later + down_later):
+        search.add_candidates(slot, later)
+    solution, search = parallel_search(search, executor, num_parts=4)
+    assert sum(solution.clue_scores) == pytest.approx(brute_force_score(crossword, across_candidates, down_candidates))
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from nyt_crossword_solver.benchmark import FakeModelBackend, install_fake_backend, make_puzzle
+from nyt_crossword_solver.crossword import MiniCrossword
+from nyt_crossword_solver.service import RETRY_AFTER, SolverService, serve, stream_solve
+
+PUZZLE_PATH = Path(__file__).parent.parent / "puzzles" / "extracted" / "puzzle-2025-02-17.json"
+
+
+@pytest.fixture
+def puzzle():
+    with open(PUZZLE_PATH) as f:
+        return make_puzzle(PUZZLE_PATH.stem, MiniCrossword(**json.load(f)), seed=0)
+
+
+async def start_service(service: SolverService, unix_socket: Path) -> asyncio.Task:
+    task = asyncio.create_task(serve(service, unix_socket=str(unix_socket)))
+    while not unix_socket.exists():
+        await asyncio.sleep(0.01)
+    return task
+
+
+async def stop_service(task: asyncio.Task):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def request(unix_socket: Path, head: str, body: bytes = b"") -> tuple[int, dict[str, str], bytes]:
+    """Make an HTTP request, returning the status, the headers and the body of the response."""
+    reader, writer = await asyncio.open_unix_connection(str(unix_socket))
+    writer.write(f"{head}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while line := (await reader.readline()).decode("latin-1").strip():
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.read()
+    writer.close()
+    return status, headers, body
+
+
+def test_solve_over_unix_socket(puzzle, tmp_path):
+    async def run() -> list[dict]:
+        task = await start_service(SolverService(max_improvements=2), tmp_path / "service.sock")
+        try:
+            return [event async for event in stream_solve(puzzle.crossword, unix_socket=str(tmp_path / "service.sock"))]
+        finally:
+            await stop_service(task)
+
+    uninstall = install_fake_backend(FakeModelBackend(puzzle.answers))
+    try:
+        events = asyncio.run(run())
+    finally:
+        uninstall()
+
+    assert [event["event"] for event in events[:2]] == ["queued", "started"]
+    clues = puzzle.crossword.across + puzzle.crossword.down
+    assert sum(event["event"] == "candidates" for event in events) == len(clues)
+    assert any(event["event"] == "solution" for event in events)
+    assert events[-1]["event"] == "solved"
+    solution = MiniCrossword(**events[-1]["solution"])
+    assert events[-1]["score"] == pytest.approx(
+        sum(clue.consistency_score for clue in solution.across + solution.down), abs=0.01
+    )
+
+
+def test_overloaded_service_turns_requests_away(puzzle, tmp_path, monkeypatch):
+    unix_socket = tmp_path / "service.sock"
+    # The service notices that the callers hung up at their next heartbeat, which the shutdown waits for.
+    monkeypatch.setattr("nyt_crossword_solver.service.HEARTBEAT_INTERVAL", 0.1)
+
+    async def run() -> tuple[dict, dict, tuple[int, dict[str, str], bytes]]:
+        task = await start_service(SolverService(max_concurrency=1, max_queued=1), unix_socket)
+        running = stream_solve(puzzle.crossword, unix_socket=str(unix_socket))
+        queued = stream_solve(puzzle.crossword, unix_socket=str(unix_socket))
+        try:
+            assert [(await anext(running))["event"] for _ in range(2)] == ["queued", "started"]
+            queued_event = await anext(queued)
+            health = json.loads((await request(unix_socket, "GET /health HTTP/1.1"))[2])
+            rejected = await request(unix_socket, "POST /solve HTTP/1.1", puzzle.crossword.model_dump_json().encode())
+            return health, queued_event, rejected
+        finally:
+            await running.aclose()
+            await queued.aclose()
+            await stop_service(task)
+
+    # Slow models keep the first puzzle running while the others arrive.
+    uninstall = install_fake_backend(FakeModelBackend(puzzle.answers, latency=1.0))
+    try:
+        health, queued_event, (status, headers, body) = asyncio.run(run())
+    finally:
+        uninstall()
+
+    assert health == {"queued": 1, "running": 1}
+    assert queued_event == {"event": "queued", "position": 1}
+    assert status == 503
+    assert headers["retry-after"] == str(RETRY_AFTER)
+    assert "error" in json.loads(body)
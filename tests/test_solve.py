@@ -0,0 +1,110 @@
+import asyncio
+import re
+
+import pytest
+
+from nyt_crossword_solver.benchmark import FakeModelBackend, install_fake_backend
+from nyt_crossword_solver.crossword import Clue, MiniCrossword
+from nyt_crossword_solver.solve import generate_all_candidates, solve_crossword
+
+ACROSS_ANSWERS = ["CAT", "ORE", "WED"]
+DOWN_ANSWERS = ["COW", "ARE", "TED"]
+
+
+class RecordingBackend(FakeModelBackend):
+    """Fake backend that records the clue lines sent to the candidates generators."""
+
+    def __init__(self, answers: dict[str, str]):
+        # Only the answer, so that every letter of an answered clue is settled.
+        super().__init__(answers, num_candidates=1, accuracy=1.0)
+        self.requests: list[str] = []
+
+    def respond(self, role, messages):
+        if role in ("candidates_generator", "batch_candidates_generator"):
+            for message in messages:
+                if isinstance(message.content, str):
+                    self.requests.extend(re.findall(r"Clue: .*", message.content))
+        return super().respond(role, messages)
+
+
+def make_crossword() -> tuple[MiniCrossword, dict[str, str]]:
+    crossword = MiniCrossword(
+        grid=["___", "___", "___"],
+        across=[Clue(position=(row, 0), clue=f"across {row}", length=3) for row in range(3)],
+        down=[Clue(position=(0, col), clue=f"down {col}", length=3) for col in range(3)],
+    )
+    answers = {f"across {i}": answer for i, answer in enumerate(ACROSS_ANSWERS)}
+    answers.update({f"down {i}": answer for i, answer in enumerate(DOWN_ANSWERS)})
+    return crossword, answers
+
+
+def generate(max_in_flight: int, batch_clues: int) -> RecordingBackend:
+    crossword, answers = make_crossword()
+    backend = RecordingBackend(answers)
+    uninstall = install_fake_backend(backend)
+    try:
+        across_candidates, down_candidates = asyncio.run(
+            generate_all_candidates(crossword, max_in_flight=max_in_flight, batch_clues=batch_clues)
+        )
+    finally:
+        uninstall()
+    assert [list(candidates) for candidates in across_candidates] == [[answer] for answer in ACROSS_ANSWERS]
+    assert [list(candidates) for candidates in down_candidates] == [[answer] for answer in DOWN_ANSWERS]
+    return backend
+
+
+@pytest.mark.parametrize("batch_clues", [None, 3])
+def test_waiting_clues_get_letters_of_earlier_ones(batch_clues):
+    # One request at a time, across clues first, so every down clue is asked with all of its letters.
+    backend = generate(max_in_flight=1, batch_clues=batch_clues)
+    for col, answer in enumerate(DOWN_ANSWERS):
+        [request] = [request for request in backend.requests if request.startswith(f"Clue: down {col},")]
+        for pos, letter in enumerate(answer):
+            assert f"position {pos + 1} in the answer is likely to be {letter}." in request
+    for row in range(3):
+        [request] = [request for request in backend.requests if request.startswith(f"Clue: across {row},")]
+        assert "likely" not in request
+
+
+@pytest.mark.parametrize("batch_clues", [None, 3])
+def test_all_clues_are_queried_at_once_without_a_limit(batch_clues):
+    backend = generate(max_in_flight=None, batch_clues=batch_clues)
+    assert len(backend.requests) == 6
+    assert not any("likely" in request for request in backend.requests)
+
+
+def test_solve_builds_the_search_from_arriving_candidates():
+    crossword, answers = make_crossword()
+    uninstall = install_fake_backend(RecordingBackend(answers))
+    try:
+        solved = asyncio.run(solve_crossword(crossword, max_improvements=2))
+    finally:
+        uninstall()
+    assert [clue.answer for clue in solved.across + solved.down] == ACROSS_ANSWERS + DOWN_ANSWERS
+    assert all(clue.consistency_score == 1 for clue in solved.across + solved.down)
+
+
+def test_beam_search_reports_the_top_k_grids():
+    crossword, answers = make_crossword()
+    events = []
+    uninstall = install_fake_backend(FakeModelBackend(answers, num_candidates=3, accuracy=1.0))
+    try:
+        solved = asyncio.run(
+            solve_crossword(crossword, max_improvements=0, beam_width=16, top_k=3, listener=events.append)
+        )
+    finally:
+        uninstall()
+    [event] = [event for event in events if event["event"] == "solution"]
+    assert event["grid"] == ACROSS_ANSWERS
+    assert [clue.answer for clue in solved.across] == ACROSS_ANSWERS
+    assert len(event["alternatives"]) == 2
+    alternatives = [tuple(alternative["answers"]) for alternative in event["alternatives"]]
+    assert len(set(alternatives)) == 2
+    assert tuple(ACROSS_ANSWERS + DOWN_ANSWERS) not in alternatives
+    assert all(alternative["score"] <= event["score"] for alternative in event["alternatives"])
+
+
+def test_top_k_needs_the_beam_search():
+    crossword, _ = make_crossword()
+    with pytest.raises(ValueError):
+        asyncio.run(solve_crossword(crossword, max_improvements=0, top_k=2))